@@ -1,19 +1,6 @@
 from dotenv import find_dotenv, load_dotenv
 import os
 import pandas as pd
-from datasets import Dataset
-from langchain_openai.chat_models import AzureChatOpenAI
-from langchain_openai.embeddings import AzureOpenAIEmbeddings
-from ragas import evaluate
-
-from ragas.metrics import (
-    answer_similarity,
-    answer_relevancy,
-    faithfulness,
-)
-
-
-load_dotenv(find_dotenv())
 
 
 def ragas_evaluate(
@@ -22,6 +9,20 @@ def ragas_evaluate(
     evaluation_model=None,
     azure_embeddings=None,
 ):
+    # ragas, datasets and langchain are slow to import, so only load them
+    # when an evaluation actually runs
+    from datasets import Dataset
+    from langchain_openai.chat_models import AzureChatOpenAI
+    from langchain_openai.embeddings import AzureOpenAIEmbeddings
+    from ragas import evaluate
+
+    from ragas.metrics import (
+        answer_similarity,
+        answer_relevancy,
+        faithfulness,
+    )
+
+    load_dotenv(find_dotenv())
 
     dataset = Dataset.from_pandas(df)
 
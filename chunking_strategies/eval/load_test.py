@@ -0,0 +1,287 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+def make_rag_query(index, client, model, embedding_function=None, top_k=5):
+    """
+    Build the query function that `run_load_test` replays.
+
+    Parameters
+    ----------
+    index : chromadb.Collection or rag.sharding.ShardedIndex
+        The index to search.
+    client : openai.AzureOpenAI
+        The client to generate with.
+    model : str
+        The generation deployment.
+    embedding_function : callable, optional
+        Embeds the question as its own stage. If not given, the index embeds
+        it and the embedding time is counted as search time.
+    top_k : int
+        The number of chunks to retrieve.
+
+    Returns
+    -------
+    callable
+        Takes a question and returns a dict of stage durations in seconds
+        (``embed``, ``search``, ``prompt``, ``ttft``, ``generate``).
+    """
+    from helper.openai_utils import StreamMetrics, collect_stream, stream_prompt
+    from rag.augmentation import contruct_prompt
+
+    def query(question):
+        timings = {}
+        start = time.perf_counter()
+        if embedding_function is not None:
+            embeddings = embedding_function([question])
+            timings["embed"] = time.perf_counter() - start
+            start = time.perf_counter()
+            results = index.query(query_embeddings=embeddings, n_results=top_k)
+        else:
+            timings["embed"] = 0.0
+            results = index.query(query_texts=[question], n_results=top_k)
+        timings["search"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prompt = contruct_prompt(results["documents"][0], question)
+        timings["prompt"] = time.perf_counter() - start
+
+        metrics = StreamMetrics(model=model)
+        collect_stream(stream_prompt(client, prompt, model=model, metrics=metrics))
+        timings["ttft"] = metrics.ttft_s
+        timings["generate"] = metrics.latency_s
+        return timings
+
+    return query
+
+
+def _record(query_fn, question, scheduled):
+    started = time.perf_counter()
+    record = {"question": question, "queued": started - scheduled, "error": None}
+    try:
+        record.update(query_fn(question))
+    except Exception as error:
+        record["error"] = f"{type(error).__name__}: {error}"
+    finished = time.perf_counter()
+    record["service"] = finished - started
+    record["latency"] = finished - scheduled
+    record["finished"] = finished
+    return record
+
+
+def run_load_test(
+    questions,
+    query_fn,
+    concurrency=8,
+    rate=None,
+    num_requests=None,
+    duration_s=None,
+    seed=0,
+):
+    """
+    Replay questions against a query function under load.
+
+    Parameters
+    ----------
+    questions : list of str
+        The questions, replayed in a shuffled cycle.
+    query_fn : callable
+        Takes a question and returns a dict of stage durations, e.g. from
+        `make_rag_query`. Exceptions are recorded as errors.
+    concurrency : int
+        The number of workers. Closed-loop, each worker sends its next
+        request as soon as the previous one finishes.
+    rate : float, optional
+        If given, run open-loop instead: requests arrive as a Poisson process
+        at this many per second and queue for the `concurrency` workers.
+    num_requests : int, optional
+        The number of requests to send. Defaults to one per question.
+    duration_s : float, optional
+        Stop sending new requests after this many seconds.
+    seed : int
+        The random seed for the question order and arrival times.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per request with the stage durations, ``queued`` (waiting
+        for a worker), ``service``, ``latency`` (queued + service),
+        ``finished`` and ``error``. ``attrs["wall_s"]`` holds the duration of
+        the test.
+    """
+    if not questions:
+        raise ValueError("No questions to replay")
+    rng = np.random.default_rng(seed)
+    num_requests = num_requests or len(questions)
+    order = [questions[i % len(questions)] for i in range(num_requests)]
+    rng.shuffle(order)
+
+    start = time.perf_counter()
+    deadline = None if duration_s is None else start + duration_s
+    records = []
+
+    if rate is None:
+        lock = threading.Lock()
+        pending = iter(order)
+
+        def worker():
+            while deadline is None or time.perf_counter() < deadline:
+                with lock:
+                    question = next(pending, None)
+                if question is None:
+                    return
+                record = _record(query_fn, question, time.perf_counter())
+                with lock:
+                    records.append(record)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        arrivals = start + np.cumsum(rng.exponential(1 / rate, size=num_requests))
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            for question, arrival in zip(order, arrivals):
+                if deadline is not None and arrival > deadline:
+                    break
+                time.sleep(max(arrival - time.perf_counter(), 0))
+                futures.append(executor.submit(_record, query_fn, question, arrival))
+            records = [future.result() for future in futures]
+
+    results = pd.DataFrame(records)
+    results.attrs["wall_s"] = time.perf_counter() - start
+    results.attrs["concurrency"] = concurrency
+    results.attrs["rate"] = rate
+    return results
+
+
+def summarise(results):
+    """
+    Summarise a load test.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per stage (plus ``queued``, ``service`` and ``latency``) with
+        the mean and p50/p95/p99 in milliseconds and each stage's share of
+        the mean service time. ``attrs`` holds the request count, error rate
+        and throughput in successful requests per second.
+    """
+    ok = results[results["error"].isna()] if len(results) else results
+    columns = [
+        column
+        for column in results.columns
+        if column not in ("question", "error", "finished")
+    ]
+    rows = []
+    for column in columns:
+        values = ok[column].dropna().to_numpy(dtype=float) * 1000
+        row = {"stage": column, "mean_ms": values.mean() if len(values) else np.nan}
+        for percentile in PERCENTILES:
+            row[f"p{percentile}_ms"] = (
+                np.percentile(values, percentile) if len(values) else np.nan
+            )
+        rows.append(row)
+
+    summary = pd.DataFrame(rows).set_index("stage")
+    service = summary.loc["service", "mean_ms"] if "service" in summary.index else 0
+    stages = [c for c in columns if c not in ("queued", "service", "latency", "ttft")]
+    summary["share"] = np.nan
+    if service:
+        summary.loc[stages, "share"] = summary.loc[stages, "mean_ms"] / service
+
+    wall = results.attrs.get("wall_s") or np.nan
+    summary.attrs.update(
+        {
+            "requests": len(results),
+            "error_rate": 1 - len(ok) / len(results) if len(results) else np.nan,
+            "throughput_rps": len(ok) / wall,
+        }
+    )
+    return summary
+
+
+def saturation_curve(
+    questions, query_fn, concurrencies=(1, 2, 4, 8, 16, 32), num_requests=None, seed=0
+):
+    """
+    Measure throughput and latency at increasing concurrency.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per concurrency level with the throughput, error rate and
+        p50/p95/p99 end-to-end latency. Throughput that stops rising while
+        latency keeps growing marks the saturation point.
+    """
+    rows = []
+    for concurrency in concurrencies:
+        results = run_load_test(
+            questions,
+            query_fn,
+            concurrency=concurrency,
+            num_requests=num_requests or max(len(questions), 4 * concurrency),
+            seed=seed,
+        )
+        summary = summarise(results)
+        row = {"concurrency": concurrency, **summary.attrs}
+        for percentile in PERCENTILES:
+            row[f"p{percentile}_ms"] = summary.loc["latency", f"p{percentile}_ms"]
+        rows.append(row)
+        logger.info(
+            f"Concurrency {concurrency}: {row['throughput_rps']:.1f} req/s, "
+            f"p95 {row['p95_ms']:.0f} ms"
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG query path")
+    parser.add_argument("--questions", default="data/qa_pairs.csv")
+    parser.add_argument("--path", default="./data/chroma_db")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--model", required=True, help="The generation deployment")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rate", type=float, help="Open-loop arrivals per second")
+    parser.add_argument("--requests", type=int)
+    args = parser.parse_args()
+
+    from chromadb import PersistentClient
+    from helper.openai_utils import create_client
+    from rag.retrieval import get_openai_embedding_function
+
+    embedding_function = get_openai_embedding_function()
+    index = PersistentClient(path=args.path).get_collection(
+        name=args.collection, embedding_function=embedding_function
+    )
+    query_fn = make_rag_query(
+        index, create_client(), args.model, embedding_function, args.top_k
+    )
+    questions = pd.read_csv(args.questions)["question"].tolist()
+
+    if args.rate is not None:
+        results = run_load_test(
+            questions, query_fn, args.concurrency[-1], args.rate, args.requests
+        )
+        summary = summarise(results)
+        print(summary.round(1).to_string())
+        print(summary.attrs)
+    else:
+        curve = saturation_curve(questions, query_fn, args.concurrency, args.requests)
+        print(curve.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
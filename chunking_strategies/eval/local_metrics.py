@@ -0,0 +1,329 @@
+import ast
+import hashlib
+import os
+import re
+from collections import Counter
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+from rag.compression import normalize
+
+logger = get_logger(__name__)
+
+LEXICAL_METRICS = ("rouge_l", "token_f1", "context_token_recall", "answer_grounding")
+EMBEDDING_METRICS = ("answer_similarity", "context_similarity")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase a text and split it into word tokens."""
+    return _TOKEN.findall(str(text).lower())
+
+
+class EmbeddingCache:
+    """
+    Embeds texts in bulk, remembering every embedding it has computed.
+
+    Parameters
+    ----------
+    embedding_function : callable
+        Maps a list of strings to a list of embeddings, e.g. a
+        `rag.embedding.LocalEmbedder` or
+        `rag.retrieval.get_openai_embedding_function()`.
+    path : str, optional
+        An ``.npz`` file to load the cache from and `save` it to.
+    batch_size : int
+        The maximum number of texts per call to `embedding_function`.
+    """
+
+    def __init__(self, embedding_function, path=None, batch_size=256):
+        self.embedding_function = embedding_function
+        self.path = path
+        self.batch_size = batch_size
+        self._rows = {}
+        self._vectors = []
+        if path is not None and os.path.exists(path):
+            saved = np.load(path)
+            self._rows = {key: row for row, key in enumerate(saved["keys"].tolist())}
+            self._vectors = list(saved["vectors"])
+            logger.info(f"Loaded {len(self._rows)} cached embeddings from {path}")
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def embed(self, texts):
+        """
+        Return the L2-normalised float32 embeddings of a list of texts.
+
+        Only texts not already cached are sent to the embedding function,
+        each distinct text once.
+        """
+        texts = [str(text) for text in texts]
+        keys = [self.key(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._rows and key not in missing:
+                missing[key] = text
+
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(texts)} texts")
+            new_keys, new_texts = list(missing), list(missing.values())
+            for offset in range(0, len(new_texts), self.batch_size):
+                vectors = np.asarray(
+                    self.embedding_function(
+                        new_texts[offset : offset + self.batch_size]
+                    ),
+                    dtype=np.float32,
+                )
+                for key, vector in zip(
+                    new_keys[offset : offset + self.batch_size], normalize(vectors)
+                ):
+                    self._rows[key] = len(self._vectors)
+                    self._vectors.append(vector)
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([self._vectors[self._rows[key]] for key in keys])
+
+    def save(self, path=None):
+        """Write the cache to an ``.npz`` file."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the embedding cache to")
+        keys = sorted(self._rows, key=self._rows.get)
+        np.savez(
+            path,
+            keys=np.array(keys, dtype=str),
+            vectors=np.stack(self._vectors) if self._vectors else np.empty((0, 0)),
+        )
+
+
+def cosine_similarity_matrix(a, b):
+    """The ``(len(a), len(b))`` cosine similarities between two sets of vectors."""
+    return (
+        normalize(np.asarray(a, dtype=np.float32))
+        @ normalize(np.asarray(b, dtype=np.float32)).T
+    )
+
+
+def answer_similarity(answers, ground_truths, embedding_cache):
+    """
+    The cosine similarity between each answer and its ground truth.
+
+    Returns
+    -------
+    numpy.ndarray
+        One similarity per pair.
+    """
+    embeddings = embedding_cache.embed(list(answers) + list(ground_truths))
+    answers, ground_truths = np.split(embeddings, 2)
+    return np.einsum("ij,ij->i", answers, ground_truths)
+
+
+def _lcs_length(a, b):
+    # Bit-parallel LCS (Allison and Dix): bit i of `row` is cleared once a[i]
+    # has been matched, so one big-integer update handles a whole row of the
+    # dynamic programming table.
+    if not a or not b:
+        return 0
+    matches = {}
+    for position, token in enumerate(a):
+        matches[token] = matches.get(token, 0) | (1 << position)
+    mask = (1 << len(a)) - 1
+    row = mask
+    for token in b:
+        hits = row & matches.get(token, 0)
+        row = ((row + hits) | (row - hits)) & mask
+    return len(a) - bin(row).count("1")
+
+
+def rouge_l(candidates, references):
+    """
+    ROUGE-L F-measure between each candidate and its reference.
+
+    Parameters
+    ----------
+    candidates, references : list of str
+        The generated answers and the ground truths.
+
+    Returns
+    -------
+    numpy.ndarray
+        One score per pair, 0 when either text has no tokens.
+    """
+    scores = np.zeros(len(candidates))
+    for row, (candidate, reference) in enumerate(zip(candidates, references)):
+        candidate, reference = tokenize(candidate), tokenize(reference)
+        lcs = _lcs_length(candidate, reference)
+        if lcs:
+            precision, recall = lcs / len(candidate), lcs / len(reference)
+            scores[row] = 2 * precision * recall / (precision + recall)
+    return scores
+
+
+def token_f1(candidates, references):
+    """
+    SQuAD-style token F1 between each candidate and its reference.
+
+    Returns
+    -------
+    numpy.ndarray
+        One score per pair, 0 when either text has no tokens.
+    """
+    scores = np.zeros(len(candidates))
+    for row, (candidate, reference) in enumerate(zip(candidates, references)):
+        candidate = Counter(tokenize(candidate))
+        reference = Counter(tokenize(reference))
+        common = sum((candidate & reference).values())
+        if common:
+            precision = common / sum(candidate.values())
+            recall = common / sum(reference.values())
+            scores[row] = 2 * precision * recall / (precision + recall)
+    return scores
+
+
+def _token_coverage(texts, contexts):
+    # The share of each text's distinct tokens found in its contexts
+    scores = np.full(len(texts), np.nan)
+    for row, (text, passages) in enumerate(zip(texts, contexts)):
+        tokens = set(tokenize(text))
+        if tokens:
+            found = set().union(*(tokenize(passage) for passage in passages))
+            scores[row] = len(tokens & found) / len(tokens)
+    return scores
+
+
+def context_token_recall(ground_truths, contexts):
+    """
+    The share of each ground truth's distinct tokens present in its contexts.
+
+    A lexical stand-in for ragas' ``context_recall``.
+
+    Returns
+    -------
+    numpy.ndarray
+        One score per row, NaN when the ground truth has no tokens.
+    """
+    return _token_coverage(ground_truths, contexts)
+
+
+def answer_grounding(answers, contexts):
+    """
+    The share of each answer's distinct tokens present in its contexts.
+
+    A lexical proxy for ``faithfulness``: answers that introduce many words
+    the retrieved contexts do not contain score low.
+
+    Returns
+    -------
+    numpy.ndarray
+        One score per row, NaN when the answer has no tokens.
+    """
+    return _token_coverage(answers, contexts)
+
+
+def context_similarity(ground_truths, contexts, embedding_cache):
+    """
+    The best cosine similarity between each ground truth and its contexts.
+
+    Every ground truth and context passage is embedded in one bulk call.
+
+    Returns
+    -------
+    numpy.ndarray
+        One score per row, NaN when a row has no contexts.
+    """
+    ground_truths = list(ground_truths)
+    passages = [passage for row in contexts for passage in row]
+    owners = np.repeat(np.arange(len(ground_truths)), [len(row) for row in contexts])
+    embeddings = embedding_cache.embed(ground_truths + passages)
+    truths, passages = (
+        embeddings[: len(ground_truths)],
+        embeddings[len(ground_truths) :],
+    )
+
+    scores = np.full(len(ground_truths), np.nan)
+    if len(passages):
+        similarities = np.einsum("ij,ij->i", passages, truths[owners])
+        np.fmax.at(scores, owners, similarities)
+    return scores
+
+
+def _as_list(contexts):
+    # Results read back from CSV hold the context lists as their repr
+    if isinstance(contexts, str):
+        return ast.literal_eval(contexts) if contexts.startswith("[") else [contexts]
+    if contexts is None or (isinstance(contexts, float) and np.isnan(contexts)):
+        return []
+    return list(contexts)
+
+
+def local_evaluate(df, embedding_cache=None, metrics=None):
+    """
+    Score RAG results without any LLM calls.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The results, with ``ground_truth``, ``answer`` and ``contexts``
+        columns as for `eval.evaluate.ragas_evaluate`. ``contexts`` may hold
+        lists or their string representation.
+    embedding_cache : EmbeddingCache, optional
+        Required for the embedding metrics.
+    metrics : list of str, optional
+        Any of `LEXICAL_METRICS` and `EMBEDDING_METRICS`. Defaults to the
+        lexical metrics, plus the embedding metrics when `embedding_cache` is
+        given.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A copy of `df` with a column per metric, ready for
+        `eval.results_store.ResultsStore.append_run`.
+    """
+    if metrics is None:
+        metrics = list(LEXICAL_METRICS)
+        if embedding_cache is not None:
+            metrics += list(EMBEDDING_METRICS)
+    unknown = set(metrics) - set(LEXICAL_METRICS) - set(EMBEDDING_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    if embedding_cache is None and set(metrics) & set(EMBEDDING_METRICS):
+        raise ValueError("embedding_cache is required for the embedding metrics")
+
+    for column in ("ground_truth", "answer", "contexts"):
+        if column not in df.columns:
+            raise ValueError(f"The dataset must have a '{column}' column")
+
+    answers = df["answer"].fillna("").astype(str).tolist()
+    ground_truths = df["ground_truth"].fillna("").astype(str).tolist()
+    contexts = [[str(passage) for passage in _as_list(row)] for row in df["contexts"]]
+
+    scores = df.copy()
+    if "rouge_l" in metrics:
+        scores["rouge_l"] = rouge_l(answers, ground_truths)
+    if "token_f1" in metrics:
+        scores["token_f1"] = token_f1(answers, ground_truths)
+    if "context_token_recall" in metrics:
+        scores["context_token_recall"] = context_token_recall(ground_truths, contexts)
+    if "answer_grounding" in metrics:
+        scores["answer_grounding"] = answer_grounding(answers, contexts)
+    if "answer_similarity" in metrics:
+        scores["answer_similarity"] = answer_similarity(
+            answers, ground_truths, embedding_cache
+        )
+    if "context_similarity" in metrics:
+        scores["context_similarity"] = context_similarity(
+            ground_truths, contexts, embedding_cache
+        )
+
+    logger.info(
+        "Local metrics: "
+        + ", ".join(f"{metric}={scores[metric].mean():.3f}" for metric in metrics)
+    )
+    return scores
@@ -0,0 +1,304 @@
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Columns of an evaluated results frame that are never metrics
+NON_METRIC_COLUMNS = ("question", "ground_truth", "answer", "contexts", "doc_id")
+
+# The number of resampling weights generated at a time by the bootstrap
+BOOTSTRAP_CHUNK_SIZE = 1 << 22
+
+
+def _dataset(path):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Declare run_id as a string, or an all-digit id would be read as an int
+    partitioning = ds.partitioning(pa.schema([("run_id", pa.string())]), flavor="hive")
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+
+def _question_matrix(scores):
+    """
+    Pivot one metric's long-format scores to a question x run matrix.
+
+    Raises
+    ------
+    ValueError
+        If a run has more than one score for a question, rather than
+        silently averaging them.
+    """
+    duplicated = scores.duplicated(["run_id", "question"], keep=False)
+    if duplicated.any():
+        examples = scores.loc[duplicated, ["run_id", "question"]].drop_duplicates()
+        raise ValueError(
+            f"{len(examples)} questions have more than one score in a run, e.g. "
+            f"{examples.head(3).to_dict('records')}"
+        )
+    return scores.pivot(index="question", columns="run_id", values="score")
+
+
+def _filter(run_ids=None, metrics=None):
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, values in (("run_id", run_ids), ("metric", metrics)):
+        if values is not None:
+            condition = ds.field(column).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+class ResultsStore:
+    """
+    Append and compare evaluation runs.
+
+    Each run's long-format scores and its configuration are written to
+    ``scores/run_id=<id>/`` and ``runs/run_id=<id>/`` Parquet partitions, so
+    reads filtered by run and metric only touch the files they need.
+
+    Parameters
+    ----------
+    root : str
+        The directory holding the ``runs`` and ``scores`` datasets.
+    """
+
+    def __init__(self, root="data/results"):
+        self.root = root
+        self.runs_path = os.path.join(root, "runs")
+        self.scores_path = os.path.join(root, "scores")
+
+    def append_run(self, results, config=None, run_name=None, metrics=None):
+        """
+        Store the per-question scores and configuration of a run.
+
+        Parameters
+        ----------
+        results : pandas.DataFrame
+            One row per question with a ``question`` column and one column per
+            metric, e.g. the ``-evaluated.csv`` output of `ragas_evaluate`.
+        config : dict, optional
+            The run parameters (chunk size, top_k, models, ...). Stored as JSON.
+        run_name : str, optional
+            A readable name, e.g. the notebook's ``experiment_name``.
+        metrics : list of str, optional
+            The metric columns. Defaults to every numeric column.
+
+        Returns
+        -------
+        str
+            The id of the new run.
+        """
+        if "question" not in results.columns:
+            raise ValueError("The results must have a 'question' column")
+        duplicated = results["question"][results["question"].duplicated()]
+        if not duplicated.empty:
+            raise ValueError(
+                f"{duplicated.nunique()} questions appear more than once, e.g. "
+                f"{duplicated.unique()[:3].tolist()}"
+            )
+        if metrics is None:
+            metrics = [
+                column
+                for column in results.select_dtypes("number").columns
+                if column not in NON_METRIC_COLUMNS
+            ]
+        if not metrics:
+            raise ValueError("The results have no metric columns")
+
+        run_id = uuid.uuid4().hex[:12]
+        scores = results.melt(
+            id_vars="question",
+            value_vars=list(metrics),
+            var_name="metric",
+            value_name="score",
+        )
+        scores["score"] = scores["score"].astype("float64")
+
+        run = pd.DataFrame(
+            {
+                "run_name": [run_name or run_id],
+                "created_at": [datetime.now(timezone.utc).isoformat()],
+                "config": [json.dumps(config or {}, sort_keys=True, default=str)],
+            }
+        )
+
+        for path, frame in ((self.scores_path, scores), (self.runs_path, run)):
+            partition = os.path.join(path, f"run_id={run_id}")
+            os.makedirs(partition, exist_ok=True)
+            frame.to_parquet(os.path.join(partition, "part-0.parquet"), index=False)
+
+        logger.info(
+            f"Stored run {run_id} ({run_name}): {len(results)} questions, "
+            f"{len(metrics)} metrics"
+        )
+        return run_id
+
+    def import_csv(self, path, config=None, run_name=None, metrics=None):
+        """Store an existing ``-evaluated.csv`` file as a run (see `append_run`)."""
+        if run_name is None:
+            run_name = os.path.splitext(os.path.basename(path))[0]
+        return self.append_run(pd.read_csv(path), config, run_name, metrics)
+
+    def runs(self):
+        """
+        Return one row per run with its name, creation time and configuration
+        (one column per config key).
+        """
+        if not os.path.exists(self.runs_path):
+            return pd.DataFrame(columns=["run_id", "run_name", "created_at"])
+        runs = _dataset(self.runs_path).to_table().to_pandas()
+        configs = pd.json_normalize([json.loads(config) for config in runs["config"]])
+        configs.index = runs.index
+        runs = pd.concat([runs.drop(columns="config"), configs], axis=1)
+        return runs.sort_values("created_at", ignore_index=True)
+
+    def scores(self, run_ids=None, metrics=None):
+        """Return the long-format scores, filtered by run and metric."""
+        if not os.path.exists(self.scores_path):
+            return pd.DataFrame(columns=["question", "metric", "score", "run_id"])
+        table = _dataset(self.scores_path).to_table(filter=_filter(run_ids, metrics))
+        return table.to_pandas()
+
+    def score_matrix(self, metric, run_ids=None):
+        """Return a question x run matrix of one metric's scores."""
+        matrix = _question_matrix(self.scores(run_ids, [metric]))
+        if run_ids is not None:
+            matrix = matrix.reindex(columns=list(run_ids))
+        return matrix
+
+    def compare(
+        self,
+        baseline,
+        run_ids=None,
+        metrics=None,
+        n_bootstrap=10_000,
+        confidence=0.95,
+        seed=0,
+    ):
+        """
+        Compare runs with a baseline run, question by question.
+
+        For every run and metric, the scores are paired with the baseline's on
+        the questions both runs scored. The mean difference gets a percentile
+        bootstrap confidence interval and a Wilcoxon signed-rank p-value. The
+        bootstrap is vectorised: one set of resampling weights is shared by
+        every run of a metric and applied with a matrix product. The weights
+        are generated in chunks of about `BOOTSTRAP_CHUNK_SIZE` values, so
+        memory does not grow with ``n_bootstrap``.
+
+        Parameters
+        ----------
+        baseline : str
+            The run id of the baseline.
+        run_ids : list of str, optional
+            The runs to compare. Defaults to every other run.
+        metrics : list of str, optional
+            The metrics to compare. Defaults to every stored metric.
+        n_bootstrap : int
+            The number of bootstrap resamples.
+        confidence : float
+            The confidence level of the intervals.
+        seed : int
+            The random seed for the bootstrap.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per run and metric, with the run names, the number of
+            paired questions, both means, the mean difference, its confidence
+            interval and p-value, and the rank of the run by mean difference
+            within the metric (1 is best).
+        """
+        from scipy.stats import wilcoxon
+
+        scores = self.scores(None if run_ids is None else [baseline, *run_ids], metrics)
+        if run_ids is None:
+            run_ids = sorted(set(scores["run_id"]) - {baseline})
+        run_ids = [run_id for run_id in run_ids if run_id != baseline]
+        names = self.runs().set_index("run_id")["run_name"]
+
+        rng = np.random.default_rng(seed)
+        alpha = (1 - confidence) / 2
+        rows = []
+        for metric, metric_scores in scores.groupby("metric", sort=True):
+            matrix = _question_matrix(metric_scores).reindex(
+                columns=[baseline, *run_ids]
+            )
+            matrix = matrix[matrix[baseline].notna()]
+            if matrix.empty:
+                continue
+
+            base = matrix[baseline].to_numpy()
+            current = matrix[run_ids].to_numpy()
+            differences = current - base[:, None]
+            paired = ~np.isnan(differences)
+            counts = paired.sum(axis=0)
+
+            n = len(base)
+            filled = np.where(paired, differences, 0)
+            chunk = max(1, BOOTSTRAP_CHUNK_SIZE // n)
+            boot = np.empty((n_bootstrap, len(run_ids)))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                for start in range(0, n_bootstrap, chunk):
+                    size = min(chunk, n_bootstrap - start)
+                    # weights[b, q] is how often question q is drawn in resample b
+                    weights = rng.multinomial(n, np.full(n, 1 / n), size=size)
+                    boot[start : start + size] = (weights @ filled) / (weights @ paired)
+                low, high = np.nanquantile(boot, [alpha, 1 - alpha], axis=0)
+                mean_difference = np.nansum(differences, axis=0) / counts
+                p_values = np.full(len(run_ids), np.nan)
+                testable = counts > 0
+                if testable.any():
+                    p_values[testable] = wilcoxon(
+                        differences[:, testable], axis=0, nan_policy="omit"
+                    ).pvalue
+
+            for position, run_id in enumerate(run_ids):
+                mask = paired[:, position]
+                rows.append(
+                    {
+                        "metric": metric,
+                        "run_id": run_id,
+                        "run_name": names.get(run_id, run_id),
+                        "baseline": names.get(baseline, baseline),
+                        "n": int(counts[position]),
+                        "baseline_mean": base[mask].mean() if mask.any() else np.nan,
+                        "mean": current[mask, position].mean()
+                        if mask.any()
+                        else np.nan,
+                        "difference": mean_difference[position],
+                        "ci_low": low[position],
+                        "ci_high": high[position],
+                        "p_value": p_values[position],
+                    }
+                )
+
+        comparison = pd.DataFrame(rows)
+        if comparison.empty:
+            return comparison
+        comparison["significant"] = (comparison["ci_low"] > 0) | (
+            comparison["ci_high"] < 0
+        )
+        comparison["rank"] = (
+            comparison.groupby("metric")["difference"]
+            .rank(ascending=False, method="min")
+            .astype("Int64")
+        )
+        return comparison.sort_values(["metric", "rank"], ignore_index=True)
+
+    def leaderboard(self, metrics=None):
+        """Return the mean score of every run (rows) for each metric (columns)."""
+        scores = self.scores(metrics=metrics)
+        board = scores.pivot_table(
+            index="run_id", columns="metric", values="score", aggfunc="mean"
+        )
+        names = self.runs().set_index("run_id")["run_name"]
+        board.insert(0, "run_name", names.reindex(board.index))
+        return board.sort_values(list(board.columns[1:]), ascending=False)
@@ -1,7 +1,12 @@
+import ast
 import pandas as pd
 import random
 import re
 from helper.openai_utils import general_prompt
+from helper.parsing import iter_json_items
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
 
 
 def remove_over_percentile(df, column, percentile):
@@ -52,7 +57,27 @@ def remove_over_percentile(df, column, percentile):
 
 
 def convert_to_dict(results):
-    converted_results = [eval(result) for result in results]
+    # Parse each response as JSON rather than eval-ing it. Items that are not
+    # JSON are retried as Python literals, which older cached responses use;
+    # anything else is logged and skipped instead of failing the whole batch.
+    converted_results = []
+    for result in results:
+        if result is None:
+            logger.warning("Skipped a response with no content")
+            continue
+        items = []
+        skipped = []
+        for item, error in iter_json_items(result):
+            if error is not None:
+                try:
+                    item = ast.literal_eval(item)
+                except (ValueError, TypeError, SyntaxError):
+                    skipped.append({"fragment": item, "error": error})
+                    continue
+            items.append(item)
+        if skipped:
+            logger.warning(f"Skipped {len(skipped)} malformed items: {skipped}")
+        converted_results.append(items)
     return [item for sublist in converted_results for item in sublist]
 
 
@@ -66,11 +91,21 @@ def remove_latex_packages(text):
     return cleaned_text
 
 
-def ask_rag(question, client, model, collection):
-    results = collection.query(query_texts=[question], n_results=5)
+def ask_rag(question, client, model, collection, cache=None):
+    """
+    Answer a question with retrieval augmented generation.
+
+    If a `rag.cache.SemanticCache` is given, questions similar enough to one
+    already answered by the same model from the same collection return the
+    cached answer without retrieval or generation.
+    """
 
-    context = "\n".join(results["documents"][0])
-    generation_prompt = f"""
+    def retrieve_and_generate():
+        results = collection.query(query_texts=[question], n_results=5)
+        contexts = results["documents"][0]
+
+        context = "\n".join(contexts)
+        generation_prompt = f"""
     You provide answers to questions based on information available. You give precise answers to the question asked.
     You do not answer more than what is needed. You are always exact to the point. You Answer the question using the provided context.
     If the answer is not contained within the given context, say 'I dont know.'. 
@@ -87,4 +122,11 @@ def ask_rag(question, client, model, collection):
     ANSWER:
     """
 
-    return general_prompt(client, generation_prompt, model=model)
+        return contexts, general_prompt(client, generation_prompt, model=model)
+
+    if cache is None:
+        return retrieve_and_generate()[1]
+
+    return cache.get_or_compute(
+        question, retrieve_and_generate, collection, model=model
+    )[1]
@@ -1,16 +1,195 @@
-import os
+import atexit
 import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 
 # Global variable to cache the logging level
 _cached_logging_level = None
 
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+
+class _LazyQueueHandler(QueueHandler):
+    # QueueHandler.prepare formats the message in the logging thread, which
+    # is exactly the work we want off the hot path. The queue never leaves
+    # the process, so the record can be passed on as it is.
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass every `every`-th record, starting with the first.
+
+    Parameters
+    ----------
+    every : int
+        The sampling interval.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        if every < 1:
+            raise ValueError("every must be at least one")
+        self.every = every
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        with self._lock:
+            self._seen += 1
+            return (self._seen - 1) % self.every == 0
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Pass at most `per_second` records per second, with bursts of `burst`.
+
+    Warnings and errors always pass. The number of records dropped since the
+    last one passed is appended to the next message that passes.
+
+    Parameters
+    ----------
+    per_second : float
+        The sustained rate.
+    burst : int, optional
+        The bucket size. Defaults to ``max(1, per_second)``.
+    """
+
+    def __init__(self, per_second, burst=None):
+        super().__init__()
+        if per_second <= 0:
+            raise ValueError("per_second must be positive")
+        self.per_second = per_second
+        self.burst = burst or max(1, per_second)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.per_second
+            )
+            self._last = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
 
-def set_logging_params():
-    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+def configure_logging(handlers=None, force=False):
+    """
+    Route all package logging through a background queue listener.
 
+    Called by `get_logger`, so it only needs calling directly to change the
+    output handlers. Like ``logging.basicConfig``, it leaves an application
+    that has already configured the root logger alone unless `handlers` or
+    `force` are given.
 
-def get_logger(name: str) -> logging.Logger:
-    set_logging_params()
+    Parameters
+    ----------
+    handlers : list of logging.Handler, optional
+        Where the listener writes records. Defaults to stderr with
+        `LOG_FORMAT`.
+    force : bool
+        Rebuild the subsystem if it is already configured.
+    """
+    global _queue_handler, _listener
+
+    with _lock:
+        if not force and (
+            _queue_handler is not None
+            or (handlers is None and logging.getLogger().handlers)
+        ):
+            return
+        _shutdown()
+
+        if handlers is None:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [handler]
+
+        records = queue.SimpleQueue()
+        _queue_handler = _LazyQueueHandler(records)
+        _listener = QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        logging.getLogger().addHandler(_queue_handler)
+
+
+def _shutdown():
+    # Flush the queue and remove the handler. Called with _lock held.
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler, _listener = None, None
+
+
+def shutdown_logging():
+    """Write out any queued records and stop the listener thread."""
+    with _lock:
+        _shutdown()
+
+
+def _after_fork_in_child():
+    # The listener thread did not survive the fork, so records put on the
+    # inherited queue would never be written. Start afresh, and flush on exit:
+    # multiprocessing children leave through os._exit, skipping atexit.
+    global _lock, _queue_handler, _listener
+    _lock = threading.Lock()
+    if _queue_handler is not None:
+        from multiprocessing import util
+
+        handlers = _listener.handlers
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler, _listener = None, None
+        configure_logging(list(handlers))
+        util.Finalize(None, shutdown_logging, exitpriority=0)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(shutdown_logging)
+
+
+def get_logger(
+    name: str, sample_every: int = None, max_per_second: float = None
+) -> logging.Logger:
+    """
+    Return a logger, configuring the logging subsystem on first use.
+
+    Records are formatted on the listener thread. In hot paths, pass arguments
+    %-style (``logger.debug("doc %s", doc_id)``) so that nothing is formatted
+    when the level is disabled.
+
+    Parameters
+    ----------
+    name : str
+        The logger name, usually ``__name__``.
+    sample_every : int, optional
+        Only pass every n-th record of this logger (see `SamplingFilter`).
+    max_per_second : float, optional
+        Only pass this many records per second (see `RateLimitFilter`).
+    """
+    configure_logging()
 
     global _cached_logging_level
     if _cached_logging_level is None:
@@ -19,4 +198,13 @@ def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     logger.setLevel(_cached_logging_level)
 
+    if sample_every is not None or max_per_second is not None:
+        for existing in list(logger.filters):
+            if isinstance(existing, (SamplingFilter, RateLimitFilter)):
+                logger.removeFilter(existing)
+        if sample_every is not None:
+            logger.addFilter(SamplingFilter(sample_every))
+        if max_per_second is not None:
+            logger.addFilter(RateLimitFilter(max_per_second))
+
     return logger
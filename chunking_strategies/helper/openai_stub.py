@@ -0,0 +1,363 @@
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"\w+")
+_PATH = re.compile(
+    r"^(?:/openai/deployments/(?P<deployment>[^/]+)|/v1)"
+    r"/(?P<endpoint>chat/completions|embeddings)$"
+)
+
+
+@dataclass
+class StubConfig:
+    """
+    Behaviour of the stub server.
+
+    Latencies are log-normal with the given median and shape (``sigma`` 0
+    gives a constant latency). Streaming adds ``1 / tokens_per_s`` between
+    chunks. The rates are probabilities per request, drawn from a generator
+    seeded with `seed`.
+    """
+
+    embedding_dimensions: int = 1536
+    latency_median_ms: float = 0.0
+    latency_sigma: float = 0.5
+    embedding_latency_median_ms: float = 0.0
+    tokens_per_s: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_s: int = 1
+    content_filter_rate: float = 0.0
+    content_filter_trigger: str = "TRIGGER_CONTENT_FILTER"
+    failure_rate: float = 0.0
+    completion: str = None
+    seed: int = 0
+
+
+def hashed_embedding(text, dimensions=1536):
+    """
+    Embed text by signed feature hashing of its lowercased words.
+
+    Returns
+    -------
+    numpy.ndarray
+        A unit-norm float32 vector. Texts without words get a fixed random
+        vector derived from the text itself.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        hashed = zlib.crc32(word.encode())
+        vector[hashed % dimensions] += 1.0 if hashed & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        vector = rng.standard_normal(dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+    return vector / norm
+
+
+def _count_tokens(text):
+    return len(_WORD.findall(text or ""))
+
+
+class StubState:
+    """Configuration, random state and request counters shared by handlers."""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = np.random.default_rng(config.seed)
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            [
+                "requests",
+                "chat",
+                "embeddings",
+                "rate_limited",
+                "content_filtered",
+                "failed",
+            ],
+            0,
+        )
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def draw(self, rate):
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.rng.random() < rate
+
+    def latency(self, median_ms):
+        if median_ms <= 0:
+            return 0.0
+        with self.lock:
+            factor = self.rng.lognormal(0.0, self.config.latency_sigma)
+        return median_ms * factor / 1000
+
+    def completion_for(self, messages):
+        if callable(self.config.completion):
+            return self.config.completion(messages)
+        if self.config.completion is not None:
+            return self.config.completion
+        last = messages[-1]["content"] if messages else ""
+        return f"Stub answer to: {' '.join(str(last).split()[:30])}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, code, message, headers=None):
+        self._send_json(
+            status, {"error": {"code": code, "message": message}}, headers=headers
+        )
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            with self.state.lock:
+                counts = dict(self.state.counts)
+            self._send_json(200, {**counts, "config": asdict(self.state.config)})
+        else:
+            self._send_error(404, "NotFound", f"No route for GET {self.path}")
+
+    def do_POST(self):
+        state = self.state
+        match = _PATH.match(self.path.split("?", 1)[0])
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if match is None:
+            self._send_error(404, "NotFound", f"No route for POST {self.path}")
+            return
+
+        state.count("requests")
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as error:
+            self._send_error(400, "BadRequest", f"Invalid JSON: {error}")
+            return
+        model = match.group("deployment") or request.get("model", "stub")
+
+        if state.draw(state.config.rate_limit_rate):
+            state.count("rate_limited")
+            retry_after = str(state.config.retry_after_s)
+            self._send_error(
+                429,
+                "429",
+                "Requests to the deployment have exceeded the rate limit. "
+                f"Please retry after {retry_after} seconds.",
+                headers={"Retry-After": retry_after},
+            )
+            return
+        if state.draw(state.config.failure_rate):
+            state.count("failed")
+            self._send_error(500, "InternalServerError", "Injected stub failure")
+            return
+
+        if match.group("endpoint") == "embeddings":
+            self._embeddings(request, model)
+        else:
+            self._chat(request, model)
+
+    def _embeddings(self, request, model):
+        state = self.state
+        state.count("embeddings")
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(state.latency(state.config.embedding_latency_median_ms))
+
+        dimensions = request.get("dimensions") or state.config.embedding_dimensions
+        as_base64 = request.get("encoding_format") == "base64"
+        data = []
+        for position, text in enumerate(inputs):
+            embedding = hashed_embedding(str(text), dimensions)
+            data.append(
+                {
+                    "object": "embedding",
+                    "index": position,
+                    "embedding": (
+                        base64.b64encode(embedding.tobytes()).decode()
+                        if as_base64
+                        else embedding.tolist()
+                    ),
+                }
+            )
+        tokens = sum(_count_tokens(str(text)) for text in inputs)
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": model,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+    def _chat(self, request, model):
+        state = self.state
+        state.count("chat")
+        messages = request.get("messages", [])
+        prompt_text = " ".join(str(m.get("content", "")) for m in messages)
+
+        filtered = state.config.content_filter_trigger in prompt_text or state.draw(
+            state.config.content_filter_rate
+        )
+        if filtered:
+            state.count("content_filtered")
+            content, finish_reason = None, "content_filter"
+        else:
+            content, finish_reason = state.completion_for(messages), "stop"
+
+        time.sleep(state.latency(state.config.latency_median_ms))
+        completion_id = f"chatcmpl-stub-{zlib.crc32(prompt_text.encode()):08x}"
+        usage = {
+            "prompt_tokens": _count_tokens(prompt_text),
+            "completion_tokens": _count_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if request.get("stream"):
+            self._stream_chat(completion_id, model, content, finish_reason)
+            return
+
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": finish_reason,
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream_chat(self, completion_id, model, content, finish_reason):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(choices):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+
+        # Azure sends the prompt filter results first, without choices
+        chunk([])
+        delay = (
+            1 / self.state.config.tokens_per_s if self.state.config.tokens_per_s else 0
+        )
+        tokens = re.findall(r"\s*\S+", content or "")
+        for position, token in enumerate(tokens):
+            if position and delay:
+                time.sleep(delay)
+            delta = {"content": token}
+            if position == 0:
+                delta["role"] = "assistant"
+            chunk([{"index": 0, "delta": delta, "finish_reason": None}])
+        chunk([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """
+    Start the stub server on a background thread.
+
+    The server answers chat completions (streamed or not) and embeddings under
+    both the Azure (``/openai/deployments/{deployment}/...``) and plain
+    (``/v1/...``) paths, so the real ``openai`` clients can run against it.
+
+    Parameters
+    ----------
+    config : StubConfig, optional
+        The server behaviour. Defaults to no latency and no injected errors.
+    host : str
+        The interface to listen on.
+    port : int
+        The port to listen on. 0 picks a free port.
+
+    Returns
+    -------
+    server : http.server.ThreadingHTTPServer
+        The running server. Call ``server.shutdown()`` to stop it.
+    url : str
+        The base URL, to pass as ``azure_endpoint`` or ``base_url``.
+    """
+    handler = type(
+        "StubHandler", (_StubHandler,), {"state": StubState(config or StubConfig())}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}"
+    logger.info(f"OpenAI stub server listening on {url}")
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--config", help="A JSON file of StubConfig fields, e.g. latency_median_ms"
+    )
+    args = parser.parse_args()
+
+    config = StubConfig()
+    if args.config:
+        with open(args.config) as f:
+            config = StubConfig(**json.load(f))
+
+    server, url = start_stub_server(config, args.host, args.port)
+    print(f"Serving on {url}. Set AZURE_OPENAI_ENDPOINT={url} to use it.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
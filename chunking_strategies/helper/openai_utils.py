@@ -1,13 +1,72 @@
-from openai import AzureOpenAI
 import os
+import time
+from dataclasses import dataclass, field
 from dotenv import load_dotenv, find_dotenv
 from helper.logging import get_logger
 
 logger = get_logger(__name__)
 
 
+class GenerationError(Exception):
+    """A chat completion request failed."""
+
+
+class ContentFilterError(GenerationError):
+    """The content filter stopped the completion."""
+
+
+class EmptyResponseError(GenerationError):
+    """The completion finished without any content."""
+
+
+@dataclass
+class StreamMetrics:
+    """
+    Timings of one streamed completion, filled in as the stream is consumed.
+
+    ``tokens`` counts the content chunks received, which is one token per
+    chunk for Azure OpenAI chat deployments, unless the service reports
+    usage.
+    """
+
+    model: str
+    start: float = field(default_factory=time.perf_counter)
+    first_token: float = None
+    end: float = None
+    tokens: int = 0
+    finish_reason: str = None
+
+    @property
+    def ttft_s(self):
+        """Time to first token, in seconds."""
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def latency_s(self):
+        """Total latency, in seconds."""
+        return None if self.end is None else self.end - self.start
+
+    @property
+    def tokens_per_s(self):
+        """Generation speed after the first token."""
+        if self.end is None or self.first_token is None or self.tokens < 2:
+            return None
+        return (self.tokens - 1) / max(self.end - self.first_token, 1e-9)
+
+    def as_dict(self):
+        return {
+            "model": self.model,
+            "ttft_s": self.ttft_s,
+            "latency_s": self.latency_s,
+            "tokens": self.tokens,
+            "tokens_per_s": self.tokens_per_s,
+            "finish_reason": self.finish_reason,
+        }
+
+
 def create_client():
     """ """
+    from openai import AzureOpenAI
 
     load_dotenv(find_dotenv())
 
@@ -31,31 +90,170 @@ def create_client():
         print(e)
 
 
-def general_prompt(client, prompt, model, temperature=0.9):
+def general_chat(
+    client, messages, model, temperature=0.9, max_tokens=None, raise_errors=False
+):
+    """
+    Run a chat completion and return its content.
+
+    Parameters
+    ----------
+    client : openai.AzureOpenAI
+        The client to use.
+    messages : list of dict
+        The chat messages.
+    model : str
+        The deployment to generate with.
+    temperature : float
+        The sampling temperature.
+    max_tokens : int, optional
+        The completion token limit.
+    raise_errors : bool
+        Whether to raise a `GenerationError` when the request fails, rather
+        than logging it and returning None.
+
+    Returns
+    -------
+    str or None
+        The completion, or None if it was filtered, empty or failed.
+    """
     try:
+        options = {} if max_tokens is None else {"max_tokens": max_tokens}
         result = client.chat.completions.create(
             model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"{prompt}",
-                },
-            ],
+            messages=messages,
             temperature=temperature,
+            **options,
         )
         if result.choices[0].finish_reason == "content_filter":
-            logger.warning(f"Content filter triggered. Review the prompt: {prompt}.")
+            logger.warning(
+                f"Content filter triggered. Review the messages: {messages}."
+            )
             output = None
 
         elif (
             result.choices[0].message is None
             or result.choices[0].message.content is None
         ):
-            logger.warning(f"No content was returned. Review the prompt: {prompt}.")
+            logger.warning(f"No content was returned. Review the messages: {messages}.")
             output = None
         else:
             output = result.choices[0].message.content
 
         return output
     except Exception as e:
-        print(e)
+        if raise_errors:
+            raise GenerationError(f"Chat completion from {model} failed: {e}") from e
+        logger.exception(f"Chat completion from {model} failed")
+        return None
+
+
+def general_prompt(client, prompt, model, temperature=0.9):
+    return general_chat(
+        client,
+        [
+            {
+                "role": "system",
+                "content": f"{prompt}",
+            },
+        ],
+        model=model,
+        temperature=temperature,
+    )
+
+
+def stream_chat(client, messages, model, temperature=0.9, metrics=None):
+    """
+    Stream a chat completion, yielding content as it arrives.
+
+    Parameters
+    ----------
+    client : openai.AzureOpenAI
+        The client to use.
+    messages : list of dict
+        The chat messages.
+    model : str
+        The deployment to generate with.
+    temperature : float
+        The sampling temperature.
+    metrics : StreamMetrics, optional
+        Filled in with the time to first token, tokens/sec and latency. One
+        is created (and logged) if not given.
+
+    Yields
+    ------
+    str
+        Content deltas, in order.
+
+    Raises
+    ------
+    GenerationError
+        If the request fails.
+    ContentFilterError
+        If the content filter stops the completion. Content streamed before
+        the filter triggered has already been yielded.
+    EmptyResponseError
+        If the completion has no content.
+    """
+    if metrics is None:
+        metrics = StreamMetrics(model=model)
+    else:
+        metrics.start = time.perf_counter()
+
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None and usage.completion_tokens:
+                metrics.tokens = usage.completion_tokens
+            # Azure sends prompt filter results in a chunk without choices
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason is not None:
+                metrics.finish_reason = choice.finish_reason
+            content = choice.delta.content if choice.delta is not None else None
+            if content:
+                if metrics.first_token is None:
+                    metrics.first_token = time.perf_counter()
+                metrics.tokens += 1
+                yield content
+    except Exception as e:
+        raise GenerationError(f"Streaming from {model} failed: {e}") from e
+    finally:
+        metrics.end = time.perf_counter()
+
+    logger.info(f"Streamed completion: {metrics.as_dict()}")
+
+    if metrics.finish_reason == "content_filter":
+        logger.warning(f"Content filter triggered. Review the messages: {messages}.")
+        raise ContentFilterError(f"Content filter triggered for {model}")
+    if metrics.first_token is None:
+        logger.warning(f"No content was returned. Review the messages: {messages}.")
+        raise EmptyResponseError(f"No content was returned by {model}")
+
+
+def stream_prompt(client, prompt, model, temperature=0.9, metrics=None):
+    """Streaming variant of `general_prompt` (see `stream_chat`)."""
+    return stream_chat(
+        client,
+        [
+            {
+                "role": "system",
+                "content": f"{prompt}",
+            },
+        ],
+        model=model,
+        temperature=temperature,
+        metrics=metrics,
+    )
+
+
+def collect_stream(stream):
+    """Join a `stream_chat` stream into the full completion."""
+    return "".join(stream)
@@ -0,0 +1,179 @@
+import json
+import re
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+_decoder = json.JSONDecoder()
+_fence = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_whitespace_and_commas = re.compile(r"[\s,]*")
+
+
+def _strip_fences(text):
+    return _fence.sub("", text)
+
+
+def _array_start(text):
+    """
+    Return the index just after the opening bracket of the outermost array.
+
+    Model outputs sometimes wrap the array in braces (``{[...]}``), so a brace
+    followed only by whitespace before the bracket is skipped.
+    """
+    stripped = text.lstrip()
+    offset = len(text) - len(stripped)
+    if stripped.startswith("["):
+        return offset + 1
+    if stripped.startswith("{") and stripped[1:].lstrip().startswith("["):
+        return text.index("[", offset) + 1
+    return None
+
+
+def _item_end(text, position):
+    """
+    Return the end of the top-level item starting at `position`.
+
+    Brackets are matched outside of strings, so the end of a malformed item
+    is never inside one of its nested objects: it is the bracket that closes
+    the item, the next top-level comma, or the bracket that closes the array.
+    """
+    depth = 0
+    in_string = escaped = False
+    for index in range(position, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth < 0:
+                return index
+            if depth == 0:
+                return index + 1
+        elif char == "," and depth == 0:
+            return index
+    return len(text)
+
+
+def iter_json_items(text):
+    """
+    Incrementally decode the items of a JSON array (or a run of JSON objects).
+
+    Each item is decoded independently with the strict JSON decoder, so a
+    malformed item only loses that item: decoding resumes at the next
+    top-level item.
+
+    Parameters
+    ----------
+    text : str
+        The raw model output. Markdown code fences are ignored.
+
+    Yields
+    ------
+    tuple of (object, str or None)
+        Either ``(item, None)`` for a decoded item, or ``(fragment, error)``
+        for text that could not be decoded.
+    """
+    text = _strip_fences(text)
+    position = _array_start(text)
+    in_array = position is not None
+    if position is None:
+        position = 0
+
+    while True:
+        position = _whitespace_and_commas.match(text, position).end()
+        if position >= len(text):
+            return
+        if in_array and text[position] == "]":
+            return
+
+        try:
+            item, end = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError as e:
+            # Resynchronise at the next top-level item
+            end = max(_item_end(text, position), position + 1)
+            yield text[position:end], str(e)
+            position = end
+            continue
+
+        yield item, None
+        position = end
+
+
+def parse_json_items(text):
+    """
+    Decode the items of a JSON array, separating out anything malformed.
+
+    Parameters
+    ----------
+    text : str
+        The raw model output.
+
+    Returns
+    -------
+    list
+        The decoded items.
+    list of dict
+        The rejected fragments, each with ``fragment`` and ``error`` keys.
+    """
+    items = []
+    rejected = []
+    if text is None:
+        return items, [{"fragment": None, "error": "No content"}]
+
+    for item, error in iter_json_items(text):
+        if error is None:
+            items.append(item)
+        else:
+            rejected.append({"fragment": item, "error": error})
+    return items, rejected
+
+
+def parse_qa_pairs(text):
+    """
+    Parse a model response into question/answer pairs.
+
+    Parameters
+    ----------
+    text : str
+        The raw model output; a JSON array of objects with ``question`` and
+        ``answer`` keys.
+
+    Returns
+    -------
+    list of dict
+        The valid question/answer pairs.
+    list of dict
+        The rejected items, each with ``fragment`` and ``error`` keys.
+    """
+    items, rejected = parse_json_items(text)
+
+    pairs = []
+    for item in items:
+        if (
+            isinstance(item, dict)
+            and isinstance(item.get("question"), str)
+            and isinstance(item.get("answer"), str)
+            and item["question"].strip()
+            and item["answer"].strip()
+        ):
+            pairs.append(
+                {"question": item["question"].strip(), "answer": item["answer"].strip()}
+            )
+        else:
+            rejected.append(
+                {"fragment": item, "error": "Expected a question and an answer"}
+            )
+
+    if rejected:
+        logger.warning(f"Rejected {len(rejected)} malformed question/answer items")
+
+    return pairs, rejected
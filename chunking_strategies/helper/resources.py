@@ -0,0 +1,100 @@
+import os
+from functools import lru_cache
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+# NLTK resource name -> path checked with nltk.data.find
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "stopwords": "corpora/stopwords",
+}
+
+REQUIRED_ENV_VARS = [
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_API_KEY",
+    "OPENAI_API_VERSION",
+]
+
+
+def offline_mode() -> bool:
+    """Whether downloads are disabled (``OFFLINE_MODE=TRUE``)."""
+    return os.getenv("OFFLINE_MODE", "FALSE").upper() in ("1", "TRUE", "YES")
+
+
+def missing_nltk_resources(names=tuple(NLTK_RESOURCES)) -> list:
+    """Return the NLTK resources that are not installed locally."""
+    import nltk
+
+    missing = []
+    for name in names:
+        try:
+            nltk.data.find(NLTK_RESOURCES[name])
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+@lru_cache(maxsize=None)
+def ensure_nltk_resources(*names) -> None:
+    """
+    Make sure NLTK resources are available, downloading them only if missing.
+
+    The check runs once per process (forked workers inherit the result), so
+    calling this from hot paths is cheap and never touches the network once
+    the resources are installed. Downloads are disabled in offline mode.
+
+    Parameters
+    ----------
+    *names : str
+        Keys of `NLTK_RESOURCES`.
+
+    Raises
+    ------
+    LookupError
+        If a resource is missing and cannot be downloaded.
+    """
+    missing = missing_nltk_resources(names)
+    if not missing:
+        return
+
+    if not offline_mode():
+        import nltk
+
+        for name in missing:
+            logger.info(f"Downloading NLTK resource {name}")
+            nltk.download(name, quiet=True)
+        missing = missing_nltk_resources(missing)
+
+    if missing:
+        raise LookupError(
+            f"NLTK resources {missing} are not installed. Run "
+            "`python -m helper.resources` on a connected machine first."
+        )
+
+
+def check_offline_resources() -> dict:
+    """
+    Report which local resources are missing for running without a network.
+
+    Returns
+    -------
+    dict
+        ``nltk``: the missing NLTK resources, ``env``: the unset environment
+        variables, and ``ok``: whether nothing is missing.
+    """
+    report = {
+        "nltk": missing_nltk_resources(),
+        "env": [name for name in REQUIRED_ENV_VARS if not os.getenv(name)],
+    }
+    report["ok"] = not report["nltk"] and not report["env"]
+    return report
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv, find_dotenv
+
+    load_dotenv(find_dotenv())
+    if not offline_mode():
+        ensure_nltk_resources(*NLTK_RESOURCES)
+    print(check_offline_resources())
@@ -1,15 +1,41 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from helper.logging import get_logger
 from helper.openai_utils import create_client, general_prompt
+from helper.parsing import parse_json_items
 from dotenv import load_dotenv, find_dotenv
-from tqdm.notebook import tqdm
-
-load_dotenv(find_dotenv())
 
 logger = get_logger(__name__)
-client = create_client()
 
-labelling_model = os.getenv("LABELLING_MODEL")
+# Labels keyed by a hash of the model, prompt version and topic terms,
+# shared across calls
+_label_cache = {}
+
+# Bump when _construct_batch_prompt changes, so cached labels are not reused
+LABEL_PROMPT_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Creates the labelling client on first use and reuses it in the process."""
+    return create_client()
+
+
+def get_labelling_model() -> str:
+    load_dotenv(find_dotenv())
+    return os.getenv("LABELLING_MODEL")
+
+
+def __getattr__(name):
+    # `client` and `labelling_model` used to be created at import time
+    if name == "client":
+        return get_client()
+    if name == "labelling_model":
+        return get_labelling_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _extract_topic_values(topic_tuple: tuple) -> list:
@@ -76,23 +102,26 @@ def _construct_prompt(topics: list) -> list:
     return prompts
 
 
-def label_topics(
-    topics: map, client=client, model=labelling_model, topic_embeddings=None
-) -> dict:
+def label_topics(topics: map, client=None, model=None, topic_embeddings=None) -> dict:
     """
     Labels topics using the OpenAI API.
 
     Args:
         topics: A map of topic terms where each item maps to a topic
         list.
-        client: An AzureOpenAI client.
-        model: The OpenAI model to use.
+        client: An AzureOpenAI client. Defaults to a shared client created on
+        first use.
+        model: The OpenAI model to use. Defaults to LABELLING_MODEL.
 
     Returns:
         topic_labels: A dictionary with topic labels as keys and their
         corresponding topic lists as values.
 
     """
+    from tqdm.notebook import tqdm  # pulls in IPython and ipywidgets
+
+    client = client or get_client()
+    model = model or get_labelling_model()
 
     topics_list = list(topics)
     prompts = _construct_prompt(topics_list)
@@ -109,6 +138,14 @@ def label_topics(
 
         topic_labels.append(topic_label)
 
+    topic_dict = _build_topic_dict(topic_labels, topics_list, topic_embeddings)
+
+    logger.info("Topic labelling complete")
+
+    return topic_dict
+
+
+def _build_topic_dict(topic_labels: list, topics_list: list, topic_embeddings) -> dict:
     if topic_embeddings:
         topic_dict = dict(
             zip(
@@ -122,6 +159,170 @@ def label_topics(
     else:
         topic_dict = dict(zip(topic_labels, topics_list))
 
+    return topic_dict
+
+
+def _topic_key(topic_terms: list, model: str) -> str:
+    parts = [model, str(LABEL_PROMPT_VERSION), *topic_terms]
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def _fallback_label(topic_terms: list) -> str:
+    return topic_terms[0] + "_" + topic_terms[1]
+
+
+def _construct_batch_prompt(batch: list) -> str:
+    """
+    Constructs a single prompt asking for labels for several topics
+
+    Args:
+        batch: A list of (topic index, topic terms) tuples
+
+    Returns:
+        prompt: A prompt requesting a JSON object of topic index to label
+
+    """
+    topic_lines = "\n".join(
+        f"{index}: {', '.join(topic_terms)}" for index, topic_terms in batch
+    )
+    return f"""Each numbered line below lists the words that represent a topic.
+                    Please come up with a two-word label for each topic based on
+                    its words, separated by an underscore.
+
+                    {topic_lines}
+
+                    Return only a JSON object mapping each topic number (as a
+                    string) to its label, e.g. {{"0": "first_label", "1": "second_label"}}.
+                    Do not include markdown or any other text in the output."""
+
+
+def _label_batch(batch: list, client, model) -> tuple:
+    """
+    Labels a batch of topics with one request, falling back to the first two
+    topic terms for any topic missing from the response
+
+    Args:
+        batch: A list of (topic index, topic terms) tuples
+        client: An AzureOpenAI client.
+        model: The OpenAI model to use.
+
+    Returns:
+        labels: A dictionary of topic index to label
+        from_model: The set of topic indices whose label came from the model
+        rather than the fallback
+
+    """
+    response = general_prompt(client, _construct_batch_prompt(batch), model)
+    items, rejected = parse_json_items(response or "")
+
+    mapping = items[0] if items and isinstance(items[0], dict) else {}
+    if rejected or not mapping:
+        logger.warning("Could not parse labels for %d topics: %s", len(batch), response)
+
+    labels = {}
+    from_model = set()
+    for index, topic_terms in batch:
+        label = mapping.get(str(index))
+        if isinstance(label, str) and label.strip():
+            from_model.add(index)
+        else:
+            label = _fallback_label(topic_terms)
+        labels[index] = label.strip().replace(" ", "_")
+    return labels, from_model
+
+
+def _load_label_cache(cache_path: str) -> None:
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            _label_cache.update(json.load(f))
+
+
+def _save_label_cache(cache_path: str) -> None:
+    if cache_path:
+        with open(cache_path, "w") as f:
+            json.dump(_label_cache, f)
+
+
+def label_topics_batched(
+    topics: map,
+    client=None,
+    model=None,
+    topic_embeddings=None,
+    batch_size=50,
+    max_in_flight=8,
+    cache_path=None,
+) -> dict:
+    """
+    Labels topics using the OpenAI API, many topics per request.
+
+    Topics are packed `batch_size` at a time into a single request that
+    returns a JSON object of topic index to label, and up to `max_in_flight`
+    requests run concurrently. Labels are cached by a hash of the model, the
+    prompt version and the topic terms, so relabelling the same topics with
+    the same model makes no requests. Topics the model does
+    not return a label for fall back to their first two terms, as in
+    label_topics. Fallback labels are not cached, so those topics are sent to
+    the model again on the next call.
+
+    Args:
+        topics: A map of topic terms where each item maps to a topic
+        list.
+        client: An AzureOpenAI client. Defaults to a shared client created on
+        first use.
+        model: The OpenAI model to use. Defaults to LABELLING_MODEL.
+        topic_embeddings: Optional topic vectors, stored with each topic.
+        batch_size: The number of topics to label per request.
+        max_in_flight: The maximum number of concurrent requests.
+        cache_path: An optional JSON file to persist the label cache in.
+
+    Returns:
+        topic_labels: A dictionary with topic labels as keys and their
+        corresponding topic lists as values.
+
+    """
+    from tqdm.notebook import tqdm  # pulls in IPython and ipywidgets
+
+    client = client or get_client()
+    model = model or get_labelling_model()
+
+    topics_list = list(topics)
+    _load_label_cache(cache_path)
+
+    keys = [_topic_key(topic_terms, model) for topic_terms in topics_list]
+    uncached = [
+        (index, topic_terms)
+        for index, (key, topic_terms) in enumerate(zip(keys, topics_list))
+        if key not in _label_cache
+    ]
+    logger.info(
+        f"Labelling {len(uncached)} of {len(topics_list)} topics "
+        f"({len(topics_list) - len(uncached)} cached)"
+    )
+
+    batches = [
+        uncached[i : i + batch_size] for i in range(0, len(uncached), batch_size)
+    ]
+    fallback_labels = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for labels, from_model in tqdm(
+            executor.map(lambda batch: _label_batch(batch, client, model), batches),
+            total=len(batches),
+            desc="Labelling topic batches...",
+        ):
+            for index, label in labels.items():
+                if index in from_model:
+                    _label_cache[keys[index]] = label
+                else:
+                    fallback_labels[index] = label
+
+    _save_label_cache(cache_path)
+
+    topic_labels = [
+        fallback_labels[index] if index in fallback_labels else _label_cache[key]
+        for index, key in enumerate(keys)
+    ]
+    topic_dict = _build_topic_dict(topic_labels, topics_list, topic_embeddings)
+
     logger.info("Topic labelling complete")
 
     return topic_dict
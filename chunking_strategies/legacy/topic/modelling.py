@@ -1,31 +1,212 @@
-from bertopic import BERTopic
-from bertopic.representation import KeyBERTInspired
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import TYPE_CHECKING, Iterable
+import numpy as np
 from numpy import ndarray
 import helper.logging as log
+from rag.embedding import get_local_embedder
 
 logger = log.get_logger(__name__)
 
+# BERTopic pulls in torch, UMAP and HDBSCAN, so it is only imported when a
+# model is built
+if TYPE_CHECKING:
+    from bertopic import BERTopic
+
 
 # TODO: Separate out model creation and parametrise it with the core options
 # for BERTopic components (embeddings, dimension reduction, clustering,
 # Vectorisation, Word weighting, and fine tuning)
 
 
-def create_and_fit_topic_model(docs: list) -> (BERTopic, list, ndarray | None):
+# Built on first use by _local_embedder_backend, because its base class comes
+# from bertopic. It is bound here so that pickle can find it by name.
+_LocalEmbedderBackend = None
+
+
+def _local_embedder_backend():
+    global _LocalEmbedderBackend
+    if _LocalEmbedderBackend is not None:
+        return _LocalEmbedderBackend
+
+    from bertopic.backend import BaseEmbedder
+
+    class _LocalEmbedderBackend(BaseEmbedder):
+        """Exposes a rag.embedding.LocalEmbedder to BERTopic as an embedding backend."""
+
+        def __init__(self, embedder):
+            super().__init__()
+            self.embedder = embedder
+
+        def embed(self, documents, verbose=False):
+            return self.embedder.encode(documents, show_progress_bar=verbose)
+
+    return _LocalEmbedderBackend
+
+
+def _embedding_cache_path(docs: list, embedder, cache_dir: str) -> str:
+    digest = hashlib.sha1(f"{embedder.model_name}:{embedder.backend}".encode())
+    for doc in docs:
+        digest.update(doc.encode())
+        digest.update(b"\0")
+    return os.path.join(cache_dir, f"embeddings-{digest.hexdigest()}.npy")
+
+
+def embed_documents(docs: list, embedder=None, cache_dir: str = None) -> ndarray:
+    """Embeds a list of documents, reusing cached embeddings where possible.
+
+    Args:
+        docs: A list of documents.
+        embedder: A rag.embedding.LocalEmbedder. Defaults to all-MiniLM-L6-v2.
+        cache_dir: A directory to cache embeddings in. The cache key is a hash
+        of the model and the documents, so a changed corpus is re-embedded.
+
+    Returns:
+        embeddings: A float32 array of document embeddings (memory-mapped when
+        read from the cache).
+    """
+    if embedder is None:
+        embedder = get_local_embedder()
+
+    if cache_dir is None:
+        return embedder.encode(docs, show_progress_bar=True)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _embedding_cache_path(docs, embedder, cache_dir)
+    if os.path.exists(path):
+        logger.info(f"Loading cached embeddings from {path}")
+        return np.load(path, mmap_mode="r")
+
+    logger.info(f"Embedding {len(docs)} documents into {path}")
+    return embedder.encode_to_memmap(docs, path, show_progress_bar=True)
+
+
+def create_and_fit_topic_model(
+    docs: list, embeddings: ndarray = None, embedder=None, cache_dir: str = None
+) -> (BERTopic, list, ndarray | None):
     """Creates a topic model from a list of documents.
 
     Args:
         docs: A list of documents.
+        embeddings: Precomputed document embeddings. If not given they are
+        computed with `embedder` (and cached in `cache_dir` if given).
+        embedder: A rag.embedding.LocalEmbedder, shared with BERTopic so the
+        model is only loaded once. Defaults to all-MiniLM-L6-v2.
+        cache_dir: A directory to cache document embeddings in.
 
     Returns:
         topics: A list of topics.
     """
+    if embedder is None:
+        embedder = get_local_embedder()
+
+    if embeddings is None:
+        embeddings = embed_documents(docs, embedder=embedder, cache_dir=cache_dir)
+
+    from bertopic import BERTopic
+    from bertopic.representation import KeyBERTInspired
+
     logger.info("Creating topic model")
     rep_model = KeyBERTInspired()
 
-    kb_topic_model = BERTopic(representation_model=rep_model, verbose=True)
+    kb_topic_model = BERTopic(
+        embedding_model=_local_embedder_backend()(embedder),
+        representation_model=rep_model,
+        verbose=True,
+    )
 
     logger.info("Fitting topic model")
-    topics, probs = kb_topic_model.fit_transform(docs)
+    topics, probs = kb_topic_model.fit_transform(
+        docs, embeddings=np.asarray(embeddings)
+    )
 
     return (kb_topic_model, topics, probs)
+
+
+def create_online_topic_model(
+    n_components: int = 5,
+    n_clusters: int = 50,
+    decay: float = 0.01,
+    embedder=None,
+    random_state: int = 42,
+) -> BERTopic:
+    """Creates a topic model that can be updated incrementally with partial_fit.
+
+    Dimensionality reduction uses IncrementalPCA, clustering uses
+    MiniBatchKMeans and the vocabulary is kept by an OnlineCountVectorizer,
+    all of which support partial_fit.
+
+    Args:
+        n_components: The number of dimensions to reduce embeddings to.
+        n_clusters: The number of topics. The first batch must contain at
+        least this many documents.
+        decay: How quickly the word counts of older batches are forgotten.
+        embedder: A rag.embedding.LocalEmbedder. Defaults to all-MiniLM-L6-v2.
+        random_state: The random state for the clustering model.
+
+    Returns:
+        topic_model: An unfitted BERTopic model.
+    """
+    from bertopic import BERTopic
+    from bertopic.vectorizers import OnlineCountVectorizer
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import IncrementalPCA
+
+    if embedder is None:
+        embedder = get_local_embedder()
+
+    logger.info("Creating online topic model")
+    return BERTopic(
+        embedding_model=_local_embedder_backend()(embedder),
+        umap_model=IncrementalPCA(n_components=n_components),
+        hdbscan_model=MiniBatchKMeans(
+            n_clusters=n_clusters, random_state=random_state, n_init="auto"
+        ),
+        vectorizer_model=OnlineCountVectorizer(stop_words="english", decay=decay),
+        verbose=True,
+    )
+
+
+def partial_fit_topic_model(
+    topic_model: BERTopic,
+    doc_batches: Iterable[list],
+    embedding_batches: Iterable[ndarray] = None,
+) -> (BERTopic, list):
+    """Updates an online topic model over a stream of document batches.
+
+    Args:
+        topic_model: A model from create_online_topic_model (or a previously
+        partially fitted one).
+        doc_batches: An iterable of document lists. Each batch must contain at
+        least `n_components` documents.
+        embedding_batches: An optional iterable of precomputed embeddings,
+        one array per document batch.
+
+    Returns:
+        topic_model: The updated model. As with BERTopic.partial_fit, its
+        topics_ and topic sizes only cover the last batch.
+        topics: The topic of every document in `doc_batches`, in order.
+
+    Raises:
+        ValueError: If there are fewer embedding batches than document batches.
+    """
+    if embedding_batches is not None:
+        embedding_batches = iter(embedding_batches)
+
+    # partial_fit replaces topics_ with the topics of the latest batch
+    topics = []
+    for index, docs in enumerate(doc_batches):
+        embeddings = None
+        if embedding_batches is not None:
+            embeddings = next(embedding_batches, None)
+            if embeddings is None:
+                raise ValueError(f"No embeddings were given for document batch {index}")
+        logger.info(f"Partially fitting topic model on batch {index}")
+        topic_model.partial_fit(
+            docs, embeddings=None if embeddings is None else np.asarray(embeddings)
+        )
+        topics.extend(topic_model.topics_)
+
+    return topic_model, topics
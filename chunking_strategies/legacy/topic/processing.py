@@ -1,20 +1,14 @@
-import nltk
-
 # from nltk.corpus import stopwords
 # from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
 import pandas as pd
 import numpy as np  # For L2 norm calculation
 import uuid
 from helper.logging import get_logger
-from tqdm.notebook import tqdm
+from helper.resources import ensure_nltk_resources
 
 logger = get_logger(__name__)
-
-
-# Ensure NLTK resources are downloaded
-nltk.download("punkt")
-nltk.download("stopwords")
+# Per-document progress, thinned so it stays out of the density loop's profile
+document_logger = get_logger(f"{__name__}.documents", sample_every=100)
 
 
 def _calculate_topic_densities(
@@ -25,6 +19,8 @@ def _calculate_topic_densities(
     overlap=10,
     increment=5,
     doc_id=None,
+    words=None,
+    tokenizer=None,
 ) -> list[pd.Series]:
     # Preprocess text: remove stopwords and stem
     # stop_words = set(stopwords.words("english"))
@@ -35,10 +31,15 @@ def _calculate_topic_densities(
     if doc_id is None:
         doc_id = uuid.uuid4()
 
-    logger.info(f"Calculating topic densities for document {doc_id}")
+    document_logger.info("Calculating topic densities for document %s", doc_id)
 
-    # Tokenize and preprocess words
-    words = word_tokenize(text)
+    # Tokenize and preprocess words, unless pre-tokenized (rag.corpus)
+    if words is None:
+        if tokenizer is None:
+            from nltk.tokenize import word_tokenize as tokenizer  # slow to import
+
+            ensure_nltk_resources("punkt")
+        words = tokenizer(text)
     processed_words = words
     # [stemmer.stem(word.lower()) for word in words if word.isalpha() and word.lower() not in stop_words]
 
@@ -95,20 +96,29 @@ def _calculate_topic_densities(
     return best_substrings
 
 
-def combined_densities(docs: list[str], topics: dict) -> pd.DataFrame:
+def combined_densities(
+    docs: list[str], topics: dict, corpus=None, tokenizer=None
+) -> pd.DataFrame:
     """
     Calculates the topic densities for a list of documents and combines them into
     a single DataFrame.
 
     Args:
-        docs: A list of documents.
+        docs: A list of documents, or of doc_ids when `corpus` is given.
         topics: A dictionary of topic terms where each item maps to a topic list.
+        corpus: An optional rag.corpus.CorpusIndex holding the documents, whose
+        stored word offsets are used instead of re-tokenizing.
+        tokenizer: A function splitting a document into words. Defaults to
+        nltk.word_tokenize. helper.tokenization.words is faster and needs no
+        NLTK data, but does not split every document identically.
 
     Returns:
         combined_densities: A DataFrame of topic densities for all documents.
 
     """
-    logger.info(f"Calculating topic densities for {len(docs)} documents")
+    from tqdm.notebook import tqdm  # pulls in IPython and ipywidgets
+
+    logger.info("Calculating topic densities for %d documents", len(docs))
 
     # Map based approach
     # density_map = map(lambda x: _calculate_topic_densities(x, topics), docs)
@@ -118,11 +128,20 @@ def combined_densities(docs: list[str], topics: dict) -> pd.DataFrame:
 
     # List comprehension based approach
     # TODO find a better/more readable way to flatten the list
-    combined_densities = [
-        density
-        for doc in tqdm(docs, desc="Processing docs...")
-        for density in _calculate_topic_densities(doc, topics)
-    ]
+    if corpus is None:
+        combined_densities = [
+            density
+            for doc in tqdm(docs, desc="Processing docs...")
+            for density in _calculate_topic_densities(doc, topics, tokenizer=tokenizer)
+        ]
+    else:
+        combined_densities = [
+            density
+            for doc_id in tqdm(docs, desc="Processing docs...")
+            for density in _calculate_topic_densities(
+                None, topics, doc_id=doc_id, words=corpus.words(doc_id)
+            )
+        ]
 
     # element for item in items for element in your_function(item)
 
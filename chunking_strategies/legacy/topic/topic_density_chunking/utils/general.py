@@ -1,16 +1,17 @@
 import pandas as pd
-import random
 import re
+from rag.loading import reservoir_sample
 from utils.openai_utils import general_prompt
 
 
-def load_and_sample_data(input_datapath, sample_size, seed):
+def load_and_sample_data(input_datapath, sample_size, seed, batch_size=10_000):
     """
     Load a CSV file and randomly sample a subset of rows.
 
-    This function reads a CSV file, randomly selects a subset of rows,
-    and returns a DataFrame containing the selected rows. The random
-    seed can be set for reproducibility.
+    This function streams a CSV file in batches and selects a uniform random
+    subset of rows with single-pass reservoir sampling, so the file is read
+    once and never held in memory in full. The random seed can be set for
+    reproducibility.
 
     Parameters
     ----------
@@ -20,30 +21,24 @@ def load_and_sample_data(input_datapath, sample_size, seed):
         The number of rows to randomly select from the CSV file.
     seed : int
         The random seed for reproducibility.
+    batch_size : int
+        The number of rows to read at a time.
 
     Returns
     -------
     pandas.DataFrame
-        A DataFrame containing the randomly selected rows.
+        A DataFrame containing the randomly selected rows, in file order.
 
     Examples
     --------
     >>> df = load_and_sample_data("data/Reviews.csv", 1000, 42)
     """
-    # Set the random seed for reproducibility
-    random.seed(seed)
-
-    # Get the number of lines in the file
-    num_lines = sum(1 for l in open(input_datapath))
-
-    # Calculate the number of lines to skip
-    skip = num_lines - sample_size
-
-    # The row indices to skip - make sure 0 is not included to keep the header!
-    skip_idx = random.sample(range(1, num_lines), skip)
+    df = reservoir_sample(
+        pd.read_csv(input_datapath, index_col=0, chunksize=batch_size),
+        sample_size,
+        seed=seed,
+    )
 
-    # Load the data
-    df = pd.read_csv(input_datapath, skiprows=skip_idx, index_col=0)
     df = df[["Time", "ProductId", "UserId", "Score", "Summary", "Text"]]
     df = df.dropna()
     df["combined"] = (
@@ -1,18 +1,17 @@
 import pandas as pd
-import nltk
 from uuid import uuid4
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from rag.embedding import get_local_embedder
 import numpy as np
 
 from helper.logging import get_logger
+from helper.resources import ensure_nltk_resources
 
 logging = get_logger(__name__)
 
-nltk.download("punkt")
 
-
-def split_and_reconstitute(strings, minimum, maximum, increment):
+def split_and_reconstitute(
+    strings, minimum, maximum, increment, sentences=None, tokenizer=None
+):
     """Split the given strings into sentences, then reconstitute them into chunks.
 
     Parameters:
@@ -20,14 +19,19 @@ def split_and_reconstitute(strings, minimum, maximum, increment):
     - minimum: int, the minimum number of sentences per chunk.
     - maximum: int, the maximum number of sentences per chunk.
     - increment: int, the number of sentences to increment by.
+    - sentences: optional list of the pre-split sentences of each string
+      (e.g. from rag.corpus.CorpusIndex.sentences), used instead of splitting.
+    - tokenizer: optional function splitting a string into sentences. Defaults
+      to nltk.sent_tokenize. helper.tokenization.sentences is faster and needs
+      no NLTK data, but does not split every string identically.
 
     Returns:
     - pandas.DataFrame containing the chunks.
     """
 
     def split_sentences(text):
-        """Split the given text into sentences using NLTK."""
-        return nltk.sent_tokenize(text)
+        """Split the given text into sentences."""
+        return tokenizer(text)
 
     def reconstitute(sentences, min_sentences, max_sentences, increment):
         result = []
@@ -60,10 +64,17 @@ def split_and_reconstitute(strings, minimum, maximum, increment):
 
         return result
 
+    if sentences is None:
+        if tokenizer is None:
+            import nltk  # nltk is slow to import
+
+            ensure_nltk_resources("punkt")
+            tokenizer = nltk.sent_tokenize
+        sentences = map(split_sentences, strings)
+
     data = []
-    for string in strings:
-        sentences = split_sentences(string)
-        for item in reconstitute(sentences, minimum, maximum, increment):
+    for string_sentences in sentences:
+        for item in reconstitute(string_sentences, minimum, maximum, increment):
             data.append(item)
 
     df = pd.DataFrame(data, columns=["doc_id", "chunk_id", "start", "end", "string"])
@@ -71,7 +82,13 @@ def split_and_reconstitute(strings, minimum, maximum, increment):
 
 
 def create_chunk_embeddings(
-    df: pd.DataFrame, column_to_embed: str, model="all-MiniLM-L6-v2", batch_size=250
+    df: pd.DataFrame,
+    column_to_embed: str,
+    model="all-MiniLM-L6-v2",
+    batch_size=250,
+    embedder=None,
+    memmap_path=None,
+    normalize_embeddings=False,
 ) -> pd.DataFrame:
     """Create embeddings for each chunk in the DataFrame using the specified model.
 
@@ -79,15 +96,34 @@ def create_chunk_embeddings(
     - df: pandas.DataFrame containing the chunks to embed.
     - column_to_embed: str, the name of the column containing the strings to embed.
     - model: str, the name of the SentenceTransformer model to use.
-    - batch_size: int, the batch size to use when encoding the chunks.
+    - batch_size: int, the maximum number of chunks per encoder call.
+    - embedder: rag.embedding.LocalEmbedder, optional. Reused across calls so
+      the model is only loaded once. Created from `model` if not provided.
+    - memmap_path: str, optional. If given, the float32 embeddings are written
+      to this .npy memmap instead of being held in memory.
+    - normalize_embeddings: bool, whether to L2-normalise the embeddings. Off
+      by default, so they match those of SentenceTransformer.encode.
 
     Returns:
-    - pandas.DataFrame with the embeddings added as a new column.
+    - pandas.DataFrame with the embeddings added as a new column (one float32
+      array view per row).
     """
-    model = SentenceTransformer(model)
-    df["embeddings"] = model.encode(
-        df[column_to_embed].tolist(), batch_size=batch_size, show_progress_bar=True
-    ).tolist()
+    if embedder is None:
+        embedder = get_local_embedder(
+            model,
+            max_batch_size=batch_size,
+            normalize_embeddings=normalize_embeddings,
+        )
+
+    texts = df[column_to_embed].tolist()
+    if memmap_path is not None:
+        embeddings = embedder.encode_to_memmap(
+            texts, memmap_path, show_progress_bar=True
+        )
+    else:
+        embeddings = embedder.encode(texts, show_progress_bar=True)
+
+    df["embeddings"] = list(embeddings)
     return df
 
 
@@ -104,6 +140,7 @@ def calculate_similarity(
     Returns:
     - pandas.DataFrame with the cosine similarity metrics added as new columns.
     """
+    from sklearn.metrics.pairwise import cosine_similarity
 
     metric_columns = [f"{topic}_metric" for topic in topics.keys()]
     logging.info(f"Calculating similarity for {len(metric_columns)} topics")
@@ -1,8 +1,250 @@
+from functools import lru_cache, partial
+
+
 def get_context(question, index, top_k=5):
     results = index.query(query_texts=[question], n_results=top_k)["documents"]
     return results[0]
 
 
+def get_hits(question, index, top_k=5):
+    """
+    Retrieve the top_k chunks for a question along with their metadata.
+
+    Parameters
+    ----------
+    question : str
+        The question to retrieve context for.
+    index : chromadb.Collection
+        The collection to query.
+    top_k : int
+        The number of chunks to retrieve.
+
+    Returns
+    -------
+    list of dict
+        One dict per hit, in relevance order, with the keys ``text``,
+        ``doc_id``, ``start``, ``end`` and ``distance``. ``start`` and ``end``
+        are None when the chunk was stored without offsets.
+    """
+    results = index.query(
+        query_texts=[question],
+        n_results=top_k,
+        include=["documents", "metadatas", "distances"],
+    )
+    hits = []
+    for text, metadata, distance in zip(
+        results["documents"][0], results["metadatas"][0], results["distances"][0]
+    ):
+        metadata = metadata or {}
+        hits.append(
+            {
+                "text": text,
+                "doc_id": metadata.get("doc_id"),
+                "start": metadata.get("start"),
+                "end": metadata.get("end"),
+                "distance": distance,
+            }
+        )
+    return hits
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name):
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text, encoding_name="cl100k_base"):
+    """Count the tokens in a string with tiktoken."""
+    return len(_get_encoding(encoding_name).encode(text))
+
+
+def _truncate_tokens(text, max_tokens, encoding_name="cl100k_base"):
+    encoding = _get_encoding(encoding_name)
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def _word_overlap(left, right, min_overlap):
+    """Return the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left[-size:] == right[:size]:
+            return size
+    return 0
+
+
+def _shingles(words, size=3):
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _merge_document_hits(hits, min_overlap):
+    """
+    Merge the hits of a single document into contiguous blocks.
+
+    Hits with stored offsets are merged when their word ranges overlap or
+    touch. Hits without offsets are merged when the end of one chunk repeats
+    at least `min_overlap` words at the start of another.
+    """
+    with_offsets = sorted(
+        (hit for hit in hits if hit["start"] is not None and hit["end"] is not None),
+        key=lambda hit: hit["start"],
+    )
+    without_offsets = [
+        hit for hit in hits if hit["start"] is None or hit["end"] is None
+    ]
+
+    blocks = []
+    for hit in with_offsets:
+        words = hit["text"].split()
+        if blocks and hit["start"] <= blocks[-1]["end"]:
+            block = blocks[-1]
+            if hit["end"] > block["end"]:
+                block["words"].extend(words[block["end"] - hit["start"] :])
+                block["end"] = hit["end"]
+            block["rank"] = min(block["rank"], hit["rank"])
+        else:
+            blocks.append(
+                {
+                    "words": words,
+                    "start": hit["start"],
+                    "end": hit["end"],
+                    "rank": hit["rank"],
+                }
+            )
+
+    for hit in without_offsets:
+        words = hit["text"].split()
+        text = " ".join(words)
+        for block in blocks:
+            if text in " ".join(block["words"]):
+                break
+            size = _word_overlap(block["words"], words, min_overlap)
+            if size:
+                block["words"].extend(words[size:])
+                break
+            size = _word_overlap(words, block["words"], min_overlap)
+            if size:
+                block["words"] = words + block["words"][size:]
+                break
+        else:
+            block = {"words": words, "start": None, "end": None, "rank": hit["rank"]}
+            blocks.append(block)
+        block["rank"] = min(block["rank"], hit["rank"])
+
+    return blocks
+
+
+def pack_context(
+    hits,
+    token_budget=3000,
+    near_duplicate_threshold=0.9,
+    min_overlap=10,
+    min_tokens=50,
+    token_counter=None,
+    encoding_name="cl100k_base",
+):
+    """
+    Pack retrieved hits into a deduplicated, token-budgeted context.
+
+    Hits from the same document are merged into contiguous passages using their
+    stored word offsets (or detected text overlap), so the overlap between
+    neighbouring chunks is only included once. Exact and near-duplicate
+    passages are dropped, then passages are added in relevance order until the
+    token budget is spent.
+
+    Parameters
+    ----------
+    hits : list of dict or list of str
+        The hits in relevance order, as returned by `get_hits`. Plain strings
+        (as returned by `get_context`) are accepted and treated as hits without
+        offsets from an unknown document.
+    token_budget : int
+        The maximum number of context tokens.
+    near_duplicate_threshold : float
+        Passages whose word 3-shingle Jaccard similarity with a more relevant
+        passage is at or above this value are dropped.
+    min_overlap : int
+        The minimum number of repeated words needed to merge hits that were
+        stored without offsets.
+    min_tokens : int
+        The smallest truncated passage worth including when a passage does not
+        fit in the remaining budget.
+    token_counter : callable, optional
+        A function returning the token count of a string. Defaults to tiktoken
+        with `encoding_name`. If given, passages that do not fit are skipped
+        rather than truncated.
+    encoding_name : str
+        The tiktoken encoding to count tokens with.
+
+    Returns
+    -------
+    list of str
+        The packed passages in relevance order.
+    """
+    if token_counter is None:
+        token_counter = partial(count_tokens, encoding_name=encoding_name)
+        truncate = partial(_truncate_tokens, encoding_name=encoding_name)
+    else:
+        truncate = None
+
+    hits = [
+        {"text": hit, "doc_id": None, "start": None, "end": None}
+        if isinstance(hit, str)
+        else dict(hit)
+        for hit in hits
+    ]
+
+    # Group hits by document, remembering each hit's relevance rank
+    documents = {}
+    for rank, hit in enumerate(hits):
+        hit["rank"] = rank
+        documents.setdefault(hit["doc_id"], []).append(hit)
+
+    blocks = [
+        block
+        for doc_hits in documents.values()
+        for block in _merge_document_hits(doc_hits, min_overlap)
+    ]
+    blocks.sort(key=lambda block: block["rank"])
+
+    # Drop exact and near duplicates, keeping the most relevant copy
+    passages = []
+    seen_texts = set()
+    kept_shingles = []
+    for block in blocks:
+        text = " ".join(block["words"])
+        normalised = text.lower()
+        if normalised in seen_texts:
+            continue
+        shingles = _shingles(normalised.split())
+        if any(
+            len(shingles & other) / len(shingles | other) >= near_duplicate_threshold
+            for other in kept_shingles
+        ):
+            continue
+        seen_texts.add(normalised)
+        kept_shingles.append(shingles)
+        passages.append(text)
+
+    # Fill the token budget in relevance order
+    packed = []
+    remaining = token_budget
+    for passage in passages:
+        tokens = token_counter(passage)
+        if tokens <= remaining:
+            packed.append(passage)
+            remaining -= tokens
+        elif truncate is not None and remaining >= min_tokens:
+            packed.append(truncate(passage, remaining))
+            remaining = 0
+        if remaining <= 0:
+            break
+
+    return packed
+
+
 def contruct_prompt(context, question):
     generation_prompt = f"""
         You provide answers to questions based on information available. You give precise answers to the question asked.
@@ -21,3 +263,15 @@ def contruct_prompt(context, question):
         ANSWER:
         """
     return generation_prompt
+
+
+def construct_packed_prompt(passages, question):
+    """
+    Build the generation prompt from packed passages, one per paragraph.
+
+    `contruct_prompt` interpolates a list of chunks as-is, which existing
+    experiments depend on; use this for the output of `pack_context`.
+    """
+    if isinstance(passages, str):
+        passages = [passages]
+    return contruct_prompt("\n\n".join(passages), question)
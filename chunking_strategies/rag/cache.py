@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from helper.logging import get_logger
+from rag.embedding import normalize
+
+logger = get_logger(__name__)
+
+
+# Write counts per collection name, bumped by the writers in this package
+_collection_versions = {}
+_collection_versions_lock = threading.Lock()
+
+
+def bump_collection_version(collection):
+    """
+    Record a write to a collection, invalidating answers cached from it.
+
+    `rag.retrieval.add_documents`, `rag.doc_store.add_child_chunks`,
+    `rag.ingestion.ingest` and `rag.sharding.ShardedIndex` call this after
+    writing. Code that updates, upserts or deletes chunks directly should
+    call it too. Indexes without a ``name`` are not tracked.
+    """
+    name = getattr(collection, "name", None)
+    if name is None:
+        return
+    with _collection_versions_lock:
+        _collection_versions[name] = _collection_versions.get(name, 0) + 1
+
+
+def collection_fingerprint(collection):
+    """
+    Return a cheap fingerprint of a collection's contents.
+
+    The fingerprint combines the number of chunks, which catches writes from
+    other processes that add or delete chunks, with the write version kept by
+    `bump_collection_version`, which also catches updates, upserts and
+    replacements made in this process.
+    """
+    return (
+        collection.name,
+        collection.count(),
+        _collection_versions.get(collection.name, 0),
+    )
+
+
+class SemanticCache:
+    """
+    An in-memory cache of RAG answers keyed by question embeddings.
+
+    A lookup embeds the question and returns the stored contexts and answer of
+    the most similar cached question answered by the same model, provided its
+    cosine similarity is at least `threshold`. Entries are evicted
+    least-recently-used once `max_entries` is reached and expire after `ttl`
+    seconds. The cache is cleared whenever the fingerprint of the collection
+    it is used with changes (see `collection_fingerprint`).
+
+    Parameters
+    ----------
+    embedding_function : callable
+        Maps a list of strings to a list of embeddings, e.g. a Chroma
+        embedding function or `rag.embedding.LocalEmbedder`.
+    threshold : float
+        The minimum cosine similarity for a cache hit.
+    max_entries : int
+        The maximum number of cached answers.
+    ttl : float, optional
+        The number of seconds an entry stays valid. Entries never expire if
+        None.
+
+    Examples
+    --------
+    >>> cache = SemanticCache(openai_ef, threshold=0.95)
+    >>> answer = ask_rag(question, client, model, collection, cache=cache)
+    >>> cache.stats["hit_rate"]
+    """
+
+    def __init__(self, embedding_function, threshold=0.95, max_entries=1024, ttl=None):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least one")
+
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._models = np.full(max_entries, None, dtype=object)
+        self._entries = OrderedDict()
+        self._fingerprint = None
+        self._counters = dict.fromkeys(
+            ["hits", "misses", "evictions", "expirations", "invalidations"], 0
+        )
+
+    def embed(self, question):
+        """Return the L2-normalised float32 embedding of a question."""
+        return normalize(self.embedding_function([question])[0])
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        # Called with the lock held
+        self._valid[:] = False
+        self._entries.clear()
+
+    def validate(self, collection):
+        """Clear the cache if `collection` has changed since it was last seen."""
+        fingerprint = collection_fingerprint(collection)
+        with self._lock:
+            if self._fingerprint is not None and fingerprint != self._fingerprint:
+                logger.info(f"Collection {fingerprint[0]} changed, clearing the cache")
+                self._clear()
+                self._counters["invalidations"] += 1
+            self._fingerprint = fingerprint
+
+    def _evict(self, slot, counter):
+        self._valid[slot] = False
+        del self._entries[slot]
+        self._counters[counter] += 1
+
+    def _expire(self):
+        # Called with the lock held
+        if self.ttl is None:
+            return
+        expired = self._valid & (self._created < time.monotonic() - self.ttl)
+        for slot in np.flatnonzero(expired).tolist():
+            self._evict(slot, "expirations")
+
+    def lookup(self, question, embedding=None, model=None):
+        """
+        Return the cached entry for the most similar question, if any.
+
+        Parameters
+        ----------
+        question : str
+            The question to look up.
+        embedding : numpy.ndarray, optional
+            The normalised question embedding, if already computed.
+        model : str, optional
+            The model the answer must have been generated by.
+
+        Returns
+        -------
+        dict or None
+            The entry (``question``, ``contexts``, ``answer``, ``similarity``)
+            on a hit, otherwise None.
+        """
+        if embedding is None:
+            embedding = self.embed(question)
+
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self._counters["misses"] += 1
+                return None
+
+            similarities = self._vectors @ embedding
+            similarities[~(self._valid & (self._models == model))] = -np.inf
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+
+            if similarity < self.threshold:
+                self._counters["misses"] += 1
+                return None
+
+            entry = self._entries[slot]
+            self._entries.move_to_end(slot)
+            self._counters["hits"] += 1
+            return {
+                "question": entry["question"],
+                "contexts": entry["contexts"],
+                "answer": entry["answer"],
+                "similarity": similarity,
+            }
+
+    def store(self, question, contexts, answer, embedding=None, model=None):
+        """Cache the contexts and answer a model gave for a question."""
+        if embedding is None:
+            embedding = self.embed(question)
+
+        with self._lock:
+            self._expire()
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_entries, embedding.shape[0]), dtype=np.float32
+                )
+
+            if len(self._entries) >= self.max_entries:
+                oldest = next(iter(self._entries))
+                self._evict(oldest, "evictions")
+
+            slot = int(np.argmin(self._valid))
+            self._vectors[slot] = embedding
+            self._valid[slot] = True
+            self._created[slot] = time.monotonic()
+            self._models[slot] = model
+            self._entries[slot] = {
+                "question": question,
+                "contexts": contexts,
+                "answer": answer,
+            }
+
+    def get_or_compute(self, question, compute, collection=None, model=None):
+        """
+        Return the cached (contexts, answer) for a question, computing it on a miss.
+
+        Parameters
+        ----------
+        question : str
+            The question to answer.
+        compute : callable
+            Called with no arguments on a miss; returns ``(contexts, answer)``.
+        collection : chromadb.Collection, optional
+            The collection the answer is retrieved from. The cache is cleared
+            if it has changed since the last call.
+        model : str, optional
+            The model `compute` generates answers with. Answers from other
+            models are never returned.
+
+        Returns
+        -------
+        tuple of (list of str, str)
+            The contexts and answer.
+        """
+        if collection is not None:
+            self.validate(collection)
+
+        embedding = self.embed(question)
+        entry = self.lookup(question, embedding=embedding, model=model)
+        if entry is not None:
+            return entry["contexts"], entry["answer"]
+
+        contexts, answer = compute()
+        # Don't cache failed generations
+        if answer is not None:
+            self.store(question, contexts, answer, embedding=embedding, model=model)
+        return contexts, answer
+
+    @property
+    def stats(self):
+        """Hit/miss counters and the hit rate since the cache was created."""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": entries,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        }
@@ -1,4 +1,16 @@
-def chunk_string_with_overlap(input_text: str, chunk_length: int, overlap: int):
+import numpy as np
+from helper.tokenization import sentence_spans, spans_to_strings, whitespace_spans
+
+
+def _words(input_text, word_offsets):
+    if word_offsets is None:
+        return input_text.split()
+    return spans_to_strings(input_text, word_offsets)
+
+
+def chunk_string_with_overlap(
+    input_text: str, chunk_length: int, overlap: int, word_offsets=None
+):
     """
     Chunk a string into substrings of length n words with an overlap of k words.
 
@@ -10,6 +22,9 @@ def chunk_string_with_overlap(input_text: str, chunk_length: int, overlap: int):
         The length of each chunk in words.
     overlap : int
         The number of words each chunk should overlap with the next.
+    word_offsets : numpy.ndarray, optional
+        Precomputed whitespace token spans of the text (see
+        `rag.corpus.CorpusIndex`), used instead of splitting it again.
 
     Returns
     -------
@@ -21,8 +36,177 @@ def chunk_string_with_overlap(input_text: str, chunk_length: int, overlap: int):
     if overlap >= chunk_length:
         raise ValueError("k must be less than n")
 
-    words = input_text.split()
+    words = _words(input_text, word_offsets)
     return [
         " ".join(words[i : i + chunk_length])
         for i in range(0, len(words) - overlap, chunk_length - overlap)
     ]
+
+
+def chunk_string_with_offsets(
+    input_text: str, chunk_length: int, overlap: int, word_offsets=None
+):
+    """
+    Chunk a string as `chunk_string_with_overlap` does, keeping word offsets.
+
+    The offsets can be stored alongside each chunk (see
+    `rag.retrieval.add_documents`) so overlapping hits from the same document
+    can be stitched back together at query time.
+
+    Parameters
+    ----------
+    input_text : str
+        The string to chunk.
+    chunk_length : int
+        The length of each chunk in words.
+    overlap : int
+        The number of words each chunk should overlap with the next.
+    word_offsets : numpy.ndarray, optional
+        Precomputed whitespace token spans of the text.
+
+    Returns
+    -------
+    list of tuple of (str, int, int)
+        The chunked substrings with their start and end word offsets.
+    """
+    if chunk_length < 1:
+        raise ValueError("chunk_length must be at least one")
+    if overlap >= chunk_length:
+        raise ValueError("k must be less than n")
+
+    words = _words(input_text, word_offsets)
+    return [
+        (" ".join(words[i : i + chunk_length]), i, min(i + chunk_length, len(words)))
+        for i in range(0, len(words) - overlap, chunk_length - overlap)
+    ]
+
+
+def chunk_sentences(
+    input_text: str,
+    chunk_length: int,
+    overlap: int = 0,
+    sentence_offsets=None,
+    word_offsets=None,
+):
+    """
+    Chunk a string into runs of whole sentences of up to n words.
+
+    Sentences are never split (a single sentence longer than `chunk_length`
+    becomes its own chunk), and up to `overlap` sentences at the end of each
+    chunk are repeated at the start of the next, as far as the length allows.
+
+    Parameters
+    ----------
+    input_text : str
+        The string to chunk.
+    chunk_length : int
+        The maximum length of each chunk in words.
+    overlap : int
+        The number of sentences each chunk should overlap with the next.
+    sentence_offsets, word_offsets : numpy.ndarray, optional
+        Precomputed sentence and whitespace token spans of the text.
+
+    Returns
+    -------
+    list of str
+        The list of chunked substrings.
+    """
+    if chunk_length < 1:
+        raise ValueError("chunk_length must be at least one")
+    if overlap < 0:
+        raise ValueError("overlap must not be negative")
+
+    spans = sentence_spans(input_text) if sentence_offsets is None else sentence_offsets
+    if word_offsets is None:
+        word_offsets = whitespace_spans(input_text)
+    # Whitespace tokens never straddle a sentence boundary, so the words
+    # before each sentence boundary can be counted by binary search
+    word_starts = np.asarray(word_offsets)[:, 0]
+    cumulative = np.concatenate(
+        [[0], np.searchsorted(word_starts, np.asarray(spans)[:, 1], side="left")]
+    )
+
+    chunks = []
+    first = 0
+    covered = 0
+    while covered < len(spans):
+        # Drop overlap sentences if they leave no room for a new sentence
+        while (
+            first < covered
+            and cumulative[covered + 1] - cumulative[first] > chunk_length
+        ):
+            first += 1
+
+        last = np.searchsorted(
+            cumulative, cumulative[first] + chunk_length, side="right"
+        )
+        last = max(int(last) - 1, covered + 1)
+        chunks.append(input_text[spans[first, 0] : spans[last - 1, 1]])
+
+        covered = last
+        first = max(last - overlap, first + 1)
+
+    return chunks
+
+
+def token_spans(input_text: str, encoding_name="cl100k_base"):
+    """
+    Split text into tiktoken tokens, as character spans.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``(n, 2)`` int64 array of token start and end offsets. A character
+        split across several tokens is attributed to the first of them.
+    """
+    from rag.augmentation import _get_encoding
+
+    encoding = _get_encoding(encoding_name)
+    _, starts = encoding.decode_with_offsets(encoding.encode(input_text))
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.append(starts[1:], len(input_text))
+    return np.column_stack([starts, ends]).reshape(-1, 2)
+
+
+def chunk_tokens(
+    input_text: str,
+    chunk_length: int,
+    overlap: int,
+    token_offsets=None,
+    encoding_name="cl100k_base",
+):
+    """
+    Chunk a string into windows of n tiktoken tokens with an overlap of k.
+
+    Parameters
+    ----------
+    input_text : str
+        The string to chunk.
+    chunk_length : int
+        The length of each chunk in tokens.
+    overlap : int
+        The number of tokens each chunk should overlap with the next.
+    token_offsets : numpy.ndarray, optional
+        Precomputed token spans of the text (see `token_spans`).
+    encoding_name : str
+        The tiktoken encoding, when `token_offsets` is not given.
+
+    Returns
+    -------
+    list of str
+        The list of chunked substrings, sliced from the original text.
+    """
+    if chunk_length < 1:
+        raise ValueError("chunk_length must be at least one")
+    if overlap >= chunk_length:
+        raise ValueError("k must be less than n")
+
+    if token_offsets is None:
+        token_offsets = token_spans(input_text, encoding_name)
+    token_offsets = np.asarray(token_offsets)
+    starts = np.arange(0, len(token_offsets) - overlap, chunk_length - overlap)
+    ends = np.minimum(starts + chunk_length, len(token_offsets))
+    return [
+        input_text[token_offsets[start, 0] : token_offsets[end - 1, 1]]
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
@@ -0,0 +1,335 @@
+import time
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+from rag.embedding import normalize
+
+logger = get_logger(__name__)
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+class PCAReducer:
+    """
+    Project embeddings onto their leading principal components.
+
+    Parameters
+    ----------
+    n_components : int
+        The number of dimensions to keep.
+    sample_size : int, optional
+        Fit on a random sample of this many rows rather than all of them.
+    seed : int
+        The random seed for the sample.
+    """
+
+    def __init__(self, n_components, sample_size=50_000, seed=42):
+        self.n_components = n_components
+        self.sample_size = sample_size
+        self.seed = seed
+        self.mean_ = None
+        self.components_ = None
+
+    def fit(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.sample_size is not None and len(embeddings) > self.sample_size:
+            rng = np.random.default_rng(self.seed)
+            rows = rng.choice(len(embeddings), self.sample_size, replace=False)
+            embeddings = embeddings[np.sort(rows)]
+
+        self.mean_ = embeddings.mean(axis=0)
+        _, singular_values, components = np.linalg.svd(
+            embeddings - self.mean_, full_matrices=False
+        )
+        self.components_ = components[: self.n_components].astype(np.float32)
+        variance = singular_values**2
+        kept = variance[: self.n_components].sum() / variance.sum()
+        logger.info(
+            f"PCA to {self.n_components} dimensions keeps {kept:.1%} of the variance"
+        )
+        return self
+
+    def transform(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return (embeddings - self.mean_) @ self.components_.T
+
+
+class TruncationReducer:
+    """
+    Keep the first `n_components` dimensions.
+
+    Only suitable for models trained for it (e.g. text-embedding-3 models);
+    prefer `PCAReducer` for ada-002.
+    """
+
+    def __init__(self, n_components):
+        self.n_components = n_components
+
+    def fit(self, embeddings):
+        return self
+
+    def transform(self, embeddings):
+        return np.asarray(embeddings, dtype=np.float32)[..., : self.n_components]
+
+
+def quantize(embeddings, dtype="int8"):
+    """
+    Quantize embeddings.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray
+        A 2D float array.
+    dtype : str
+        ``"int8"`` (symmetric, one float32 scale per vector), ``"float16"`` or
+        ``"float32"``.
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        The quantized embeddings.
+    scales : numpy.ndarray or None
+        The per-vector int8 scales, or None for float types.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if dtype in ("float16", "float32"):
+        return embeddings.astype(dtype), None
+    raise ValueError(f"dtype must be one of {QUANTIZATIONS}")
+
+
+def dequantize(codes, scales=None):
+    """Invert `quantize` (up to rounding)."""
+    embeddings = codes.astype(np.float32)
+    if scales is not None:
+        embeddings *= scales[:, None]
+    return embeddings
+
+
+class CompressedIndex:
+    """
+    Exact search over compressed embeddings with optional float rescoring.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray
+        The ``(n, dim)`` full-precision embeddings. May be a memmap; it is only
+        read again for rescoring.
+    reducer : PCAReducer or TruncationReducer, optional
+        Reduces dimensions before quantization. Fitted here if not yet fitted.
+    dtype : str
+        The quantization, one of ``"int8"``, ``"float16"`` or ``"float32"``.
+    rescore : bool
+        Whether to keep a reference to `embeddings` and rescore shortlists
+        with them.
+    block_size : int
+        The number of codes scored at a time, which bounds the float32
+        working memory of a query batch.
+    """
+
+    def __init__(
+        self, embeddings, reducer=None, dtype="int8", rescore=True, block_size=65_536
+    ):
+        self.reducer = reducer
+        self.dtype = dtype
+        self.block_size = block_size
+        self.full = embeddings if rescore else None
+
+        if reducer is not None and getattr(reducer, "components_", True) is None:
+            reducer.fit(embeddings)
+
+        codes, scales = [], []
+        for start in range(0, len(embeddings), block_size):
+            block_codes, block_scales = quantize(
+                self._reduce(embeddings[start : start + block_size]), dtype
+            )
+            codes.append(block_codes)
+            scales.append(block_scales)
+        self.codes = np.concatenate(codes)
+        self.scales = None if dtype != "int8" else np.concatenate(scales)
+
+    def _reduce(self, embeddings):
+        if self.reducer is not None:
+            embeddings = self.reducer.transform(embeddings)
+        return normalize(embeddings)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        """The memory used by the compressed codes and scales."""
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def _approximate_top_k(self, queries, k):
+        """
+        Score the codes block by block, keeping a running top-k per query.
+
+        Only one block of scores is held at a time, so the working memory is
+        ``(q, block_size + k)`` rather than ``(q, n)``.
+        """
+        queries = self._reduce(queries)
+        indices = np.empty((len(queries), 0), dtype=np.int64)
+        scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.codes), self.block_size):
+            codes = self.codes[start : start + self.block_size]
+            block = queries @ codes.astype(np.float32).T
+            if self.scales is not None:
+                block *= self.scales[start : start + len(codes)]
+            positions = np.arange(start, start + len(codes))
+            scores = np.concatenate([scores, block], axis=1)
+            indices = np.concatenate(
+                [indices, np.broadcast_to(positions, block.shape)], axis=1
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                indices = np.take_along_axis(indices, keep, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(indices, order, axis=1),
+            np.take_along_axis(scores, order, axis=1),
+        )
+
+    def search(self, queries, k=10, shortlist=None):
+        """
+        Find the `k` most cosine-similar embeddings for each query.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            A ``(q, dim)`` array of full-precision query embeddings.
+        k : int
+            The number of results per query.
+        shortlist : int, optional
+            The number of compressed-search candidates to rescore exactly.
+            Defaults to ``4 * k`` when rescoring, and is ignored otherwise.
+
+        Returns
+        -------
+        indices : numpy.ndarray
+            A ``(q, k)`` array of row indices, most similar first.
+        scores : numpy.ndarray
+            The matching cosine similarities (approximate if not rescored).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+
+        if self.full is None:
+            return self._approximate_top_k(queries, k)
+
+        shortlist = min(shortlist or 4 * k, len(self))
+        candidates, _ = self._approximate_top_k(queries, shortlist)
+        # Rescore the shortlist with the full-precision vectors
+        rows = np.unique(candidates)
+        full = normalize(self.full[rows])
+        positions = np.searchsorted(rows, candidates)
+        exact = np.einsum("qd,qsd->qs", normalize(queries), full[positions])
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(exact, order, axis=1),
+        )
+
+
+def _top_k(scores, k):
+    """The column indices of the k largest scores per row, largest first."""
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def exact_search(embeddings, queries, k=10):
+    """Full-precision cosine search, the baseline for `recall_report`."""
+    scores = normalize(queries) @ normalize(embeddings).T
+    candidates = _top_k(scores, min(k, len(embeddings)))
+    return candidates, np.take_along_axis(scores, candidates, axis=1)
+
+
+def recall_at_k(found, expected):
+    """The mean fraction of the expected neighbours that were found."""
+    return float(
+        np.mean([len(np.intersect1d(f, e)) / len(e) for f, e in zip(found, expected)])
+    )
+
+
+def recall_report(
+    embeddings,
+    queries,
+    k=10,
+    dimensions=(None, 512, 256),
+    dtypes=QUANTIZATIONS,
+    reducer="pca",
+    rescore=True,
+    shortlist=None,
+):
+    """
+    Compare compression settings against exact float32 search.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray
+        The ``(n, dim)`` corpus embeddings.
+    queries : numpy.ndarray
+        The ``(q, dim)`` query embeddings, e.g. embedded evaluation questions.
+    k : int
+        The number of neighbours to compare.
+    dimensions : sequence of int or None
+        The reduced dimensions to try. None keeps every dimension.
+    dtypes : sequence of str
+        The quantizations to try.
+    reducer : str
+        ``"pca"`` or ``"truncate"``.
+    rescore : bool
+        Whether to rescore shortlists with the full-precision vectors.
+    shortlist : int, optional
+        The rescoring shortlist size (see `CompressedIndex.search`).
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per setting with the bytes per vector, the compression ratio
+        against float32, recall@k and the mean query latency.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    expected, _ = exact_search(embeddings, queries, k)
+    full_bytes = embeddings.shape[1] * 4
+
+    rows = []
+    for dimension in dimensions:
+        if dimension is None or dimension >= embeddings.shape[1]:
+            fitted = None
+            dimension = embeddings.shape[1]
+        elif reducer == "pca":
+            fitted = PCAReducer(dimension).fit(embeddings)
+        elif reducer == "truncate":
+            fitted = TruncationReducer(dimension)
+        else:
+            raise ValueError("reducer must be 'pca' or 'truncate'")
+
+        for dtype in dtypes:
+            index = CompressedIndex(embeddings, fitted, dtype=dtype, rescore=rescore)
+            start = time.perf_counter()
+            found, _ = index.search(queries, k, shortlist=shortlist)
+            elapsed = time.perf_counter() - start
+            rows.append(
+                {
+                    "dimensions": dimension,
+                    "dtype": dtype,
+                    "rescored": rescore,
+                    "bytes_per_vector": index.nbytes / len(index),
+                    "compression": full_bytes * len(index) / index.nbytes,
+                    f"recall@{k}": recall_at_k(found, expected),
+                    "query_ms": elapsed / len(queries) * 1000,
+                }
+            )
+
+    return pd.DataFrame(rows)
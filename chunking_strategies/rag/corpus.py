@@ -0,0 +1,222 @@
+import os
+from functools import partial
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+from helper.tokenization import (
+    sentence_spans,
+    spans_to_strings,
+    whitespace_spans,
+    word_spans,
+)
+from rag.chunking import (
+    chunk_sentences,
+    chunk_string_with_offsets,
+    chunk_tokens,
+    token_spans,
+)
+from rag.doc_store import DocStore
+
+logger = get_logger(__name__)
+
+SPAN_KINDS = ("sentences", "words", "whitespace", "tokens")
+STRATEGIES = ("words", "sentences", "tokens")
+
+
+def default_tokenizers(encoding_name="cl100k_base"):
+    """The span function of each kind, each taking a text."""
+    return {
+        "sentences": sentence_spans,
+        "words": word_spans,
+        "whitespace": whitespace_spans,
+        "tokens": partial(token_spans, encoding_name=encoding_name),
+    }
+
+
+class CorpusIndex(DocStore):
+    """
+    Read-only access to a corpus written by `CorpusIndex.build`.
+
+    Every article is tokenized once, at build time, and each kind of span is
+    stored as one memory-mapped array of character offsets, so a sweep over
+    chunking strategies slices them instead of re-tokenizing.
+
+    Parameters
+    ----------
+    path : str
+        The corpus directory, holding the `rag.doc_store.DocStore` files,
+        ``spans.npz`` and one ``{kind}.bin`` per kind of span.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        pointers = np.load(os.path.join(path, "spans.npz"))
+        self.kinds = tuple(pointers["kinds"].tolist())
+        self._pointers = {kind: pointers[kind] for kind in self.kinds}
+        self._spans = {}
+        for kind in self.kinds:
+            span_path = os.path.join(path, f"{kind}.bin")
+            self._spans[kind] = (
+                np.memmap(span_path, dtype=np.int32, mode="r").reshape(-1, 2)
+                if os.path.getsize(span_path)
+                else np.empty((0, 2), dtype=np.int32)
+            )
+
+    @classmethod
+    def build(cls, path, documents, kinds=SPAN_KINDS, tokenizers=None):
+        """
+        Tokenize documents once and write them to a new corpus.
+
+        Parameters
+        ----------
+        path : str
+            The directory to write to.
+        documents : iterable of tuple of (str, str)
+            ``(doc_id, text)`` pairs. May be a generator. Later duplicates of
+            a doc_id are skipped.
+        kinds : sequence of str
+            The kinds of span to store, from `SPAN_KINDS`.
+        tokenizers : dict, optional
+            Overrides of `default_tokenizers`, by kind.
+
+        Returns
+        -------
+        CorpusIndex
+            The opened corpus.
+        """
+        unknown = set(kinds) - set(SPAN_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown span kinds {sorted(unknown)}")
+        tokenizers = {**default_tokenizers(), **(tokenizers or {})}
+
+        os.makedirs(path, exist_ok=True)
+        files = {kind: open(os.path.join(path, f"{kind}.bin"), "wb") for kind in kinds}
+        counts = {kind: [0] for kind in kinds}
+        seen = set()
+
+        def tokenized():
+            for doc_id, text in documents:
+                doc_id = str(doc_id)
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                for kind in kinds:
+                    spans = np.asarray(tokenizers[kind](text), dtype=np.int32)
+                    files[kind].write(spans.reshape(-1, 2).tobytes())
+                    counts[kind].append(counts[kind][-1] + len(spans))
+                yield doc_id, text
+
+        try:
+            DocStore.build(path, tokenized())
+        finally:
+            for f in files.values():
+                f.close()
+
+        np.savez(
+            os.path.join(path, "spans.npz"),
+            kinds=np.array(kinds, dtype=str),
+            **{kind: np.array(counts[kind], dtype=np.int64) for kind in kinds},
+        )
+        logger.info(
+            f"Tokenized {len(seen)} documents: "
+            + ", ".join(f"{counts[kind][-1]} {kind}" for kind in kinds)
+        )
+        return cls(path)
+
+    def spans(self, doc_id, kind):
+        """
+        Return the stored spans of a document.
+
+        Returns
+        -------
+        numpy.ndarray
+            An ``(n, 2)`` int32 view of start and end character offsets.
+        """
+        if kind not in self._spans:
+            raise ValueError(f"This corpus has no {kind} spans (it has {self.kinds})")
+        row = self._rows[str(doc_id)]
+        pointers = self._pointers[kind]
+        return self._spans[kind][pointers[row] : pointers[row + 1]]
+
+    def sentences(self, doc_id):
+        """The sentence strings of a document, as `helper.tokenization.sentences`."""
+        return spans_to_strings(self.get(doc_id), self.spans(doc_id, "sentences"))
+
+    def words(self, doc_id):
+        """The word strings of a document, as `helper.tokenization.words`."""
+        return spans_to_strings(self.get(doc_id), self.spans(doc_id, "words"))
+
+    def chunk(self, doc_id, strategy, chunk_length, overlap=0, **kwargs):
+        """
+        Chunk a document from its stored spans.
+
+        Parameters
+        ----------
+        doc_id : str
+            The document to chunk.
+        strategy : str
+            ``"words"`` (`rag.chunking.chunk_string_with_offsets`),
+            ``"sentences"`` (`rag.chunking.chunk_sentences`) or ``"tokens"``
+            (`rag.chunking.chunk_tokens`).
+        chunk_length, overlap : int
+            Passed to the chunker.
+
+        Returns
+        -------
+        list
+            The chunker's output.
+        """
+        text = self.get(doc_id)
+        if strategy == "words":
+            return chunk_string_with_offsets(
+                text,
+                chunk_length,
+                overlap,
+                word_offsets=self.spans(doc_id, "whitespace"),
+                **kwargs,
+            )
+        if strategy == "sentences":
+            return chunk_sentences(
+                text,
+                chunk_length,
+                overlap,
+                sentence_offsets=self.spans(doc_id, "sentences"),
+                word_offsets=self.spans(doc_id, "whitespace"),
+                **kwargs,
+            )
+        if strategy == "tokens":
+            return chunk_tokens(
+                text,
+                chunk_length,
+                overlap,
+                token_offsets=self.spans(doc_id, "tokens"),
+                **kwargs,
+            )
+        raise ValueError(f"strategy must be one of {STRATEGIES}")
+
+    def chunk_corpus(self, strategy, chunk_length, overlap=0, doc_ids=None, **kwargs):
+        """
+        Chunk every document (or the given ones) with one strategy.
+
+        Returns
+        -------
+        pandas.DataFrame
+            ``doc_id``, ``chunk_id`` and ``chunks`` columns, as from
+            `rag.loading.iter_chunks`, plus the word offsets ``start`` and
+            ``end`` for the ``"words"`` strategy.
+        """
+        rows = []
+        for doc_id in self.doc_ids.tolist() if doc_ids is None else doc_ids:
+            for i, chunk in enumerate(
+                self.chunk(doc_id, strategy, chunk_length, overlap, **kwargs)
+            ):
+                row = {"doc_id": doc_id, "chunk_id": f"{doc_id}-{i + 1}"}
+                if isinstance(chunk, tuple):
+                    row["chunks"], row["start"], row["end"] = chunk
+                else:
+                    row["chunks"] = chunk
+                rows.append(row)
+        columns = ["doc_id", "chunk_id", "chunks"]
+        if strategy == "words":
+            columns += ["start", "end"]
+        return pd.DataFrame(rows, columns=columns)
@@ -1,5 +1,7 @@
-def generate_qa_prompt(article):
-    prompt = f"""
+# The instructions and few-shot examples are identical for every article, so
+# they are kept as a static prefix ahead of the article. This lets the service
+# reuse its prompt cache across requests.
+QA_GENERATION_INSTRUCTIONS = """
     Your task is to create three (3) question and answer pairs from provided document. You must follow specific rules while generating 3 questions.
 
     Rules for Crafting Questions:
@@ -20,7 +22,7 @@ def generate_qa_prompt(article):
         Contrasts with City B, where the population has remained stable at 1 million, attributed to its consistent but unexpanding manufacturing base.
 
     Assistant:
-        {{"question": "How are City A's technological sector growth and City B's consistent manufacturing base differently influencing their urban planning strategies in light of their divergent population trends?", "answer": "City A's significant population increase, driven by the booming tech industry, necessitates urban planning strategies that focus on expanding residential and technological infrastructure to accommodate the growing workforce. In contrast, City B, with its stable population anchored by a longstanding manufacturing sector, might prioritize urban planning efforts towards sustaining and modestly enhancing existing industrial and residential areas to support its steady economic base."}}
+        {"question": "How are City A's technological sector growth and City B's consistent manufacturing base differently influencing their urban planning strategies in light of their divergent population trends?", "answer": "City A's significant population increase, driven by the booming tech industry, necessitates urban planning strategies that focus on expanding residential and technological infrastructure to accommodate the growing workforce. In contrast, City B, with its stable population anchored by a longstanding manufacturing sector, might prioritize urban planning efforts towards sustaining and modestly enhancing existing industrial and residential areas to support its steady economic base."}
     </Example 1>
 
     <Example 2>:
@@ -30,7 +32,7 @@ def generate_qa_prompt(article):
         Highlights the shift in consumer behavior towards online shopping, resulting in a 30% increase in e-commerce sales and prompting the repurposing of traditional retail spaces into distribution hubs and experiential centers.
 
     Assistant:
-        {{"question": "With a 20% decrease in office space rentals and a 30% increase in e-commerce sales over the past year, how are cities adapting urban development strategies to repurpose commercial and retail spaces?", "answer": "In response to the significant shifts in workplace and shopping behaviors, cities are reevaluating their urban development strategies to accommodate the new landscape. The marked decrease in office space demand has prompted a reimagining of city centers, with a focus on converting underutilized office buildings into residential units, co-working spaces, or community centers. Simultaneously, the surge in e-commerce has transformed traditional retail locations into distribution hubs or experiential centers, catering to the new consumer preferences. These adaptations reflect a broader move towards flexible, mixed-use urban environments that can respond dynamically to changing economic and social trends."}}
+        {"question": "With a 20% decrease in office space rentals and a 30% increase in e-commerce sales over the past year, how are cities adapting urban development strategies to repurpose commercial and retail spaces?", "answer": "In response to the significant shifts in workplace and shopping behaviors, cities are reevaluating their urban development strategies to accommodate the new landscape. The marked decrease in office space demand has prompted a reimagining of city centers, with a focus on converting underutilized office buildings into residential units, co-working spaces, or community centers. Simultaneously, the surge in e-commerce has transformed traditional retail locations into distribution hubs or experiential centers, catering to the new consumer preferences. These adaptations reflect a broader move towards flexible, mixed-use urban environments that can respond dynamically to changing economic and social trends."}
     </Example 2>
 
     <Example 3>:
@@ -43,7 +45,7 @@ def generate_qa_prompt(article):
         Explores the revival of local agriculture in City V, emphasizing community gardens and urban farms' role in enhancing food security.
 
     Assistant:
-        {{"question": "Considering City X's waste-to-energy programs, City Y's adoption of electric buses, and City W's IoT-based traffic and air quality monitoring, how are these specific initiatives redefining standards for urban living quality?", "answer": "The integration of City X's waste-to-energy programs and City Y's electric buses represents a significant step towards reducing urban pollution and carbon footprint, thereby enhancing environmental sustainability. Coupled with City W's implementation of IoT technologies for real-time traffic and air quality management, these initiatives collectively contribute to a substantial improvement in urban living standards. They not only ensure a cleaner and more efficient urban environment but also demonstrate the potential of combining green technologies and smart city solutions to create more livable, sustainable cities for future generations."}}
+        {"question": "Considering City X's waste-to-energy programs, City Y's adoption of electric buses, and City W's IoT-based traffic and air quality monitoring, how are these specific initiatives redefining standards for urban living quality?", "answer": "The integration of City X's waste-to-energy programs and City Y's electric buses represents a significant step towards reducing urban pollution and carbon footprint, thereby enhancing environmental sustainability. Coupled with City W's implementation of IoT technologies for real-time traffic and air quality management, these initiatives collectively contribute to a substantial improvement in urban living standards. They not only ensure a cleaner and more efficient urban environment but also demonstrate the potential of combining green technologies and smart city solutions to create more livable, sustainable cities for future generations."}
     </Example 3>
 
     The following example shows how to modify the question in case it doesn't comply with the rules.
@@ -55,23 +57,48 @@ def generate_qa_prompt(article):
         Discusses a policy initiative in several large cities aiming to expand green spaces and cycling infrastructure by 30% over the next five years, in response to the positive outcomes of bike-sharing programs.
 
     Assistant:
-        {{"question": "Given the 15% decrease in car usage during peak hours in cities with bike-sharing and a 10% increase in physical activity levels, what specific urban planning strategies are being formulated to capitalize on these trends, particularly the 30% expansion in green spaces and cycling infrastructure?", "answer": "The observed 15% reduction in car usage and the corresponding 10% increase in physical activity in cities with bike-sharing programs underscore the programs' effectiveness in promoting sustainable transportation and healthier lifestyles. In response, urban planners are formulating strategies to further encourage these trends, including a significant 30% expansion in green spaces and cycling infrastructure over the next five years. These initiatives aim not only to enhance the urban environment and resident well-being but also to sustain the momentum towards more eco-friendly and active urban lifestyles."}}
+        {"question": "Given the 15% decrease in car usage during peak hours in cities with bike-sharing and a 10% increase in physical activity levels, what specific urban planning strategies are being formulated to capitalize on these trends, particularly the 30% expansion in green spaces and cycling infrastructure?", "answer": "The observed 15% reduction in car usage and the corresponding 10% increase in physical activity in cities with bike-sharing programs underscore the programs' effectiveness in promoting sustainable transportation and healthier lifestyles. In response, urban planners are formulating strategies to further encourage these trends, including a significant 30% expansion in green spaces and cycling infrastructure over the next five years. These initiatives aim not only to enhance the urban environment and resident well-being but also to sustain the momentum towards more eco-friendly and active urban lifestyles."}
     </Example 4>
-    Article:\n
-    {article}\n
-
-       The output should be a list of dictionaries, with each question/answer pair structured as follows::
-    {{
-        [
-            {{"question": <question>, "answer": <answer>}},
-            {{"question": <question>, "answer": <answer>}},
-            {{"question": <question>, "answer": <answer>}}
-        ]
-      }}
+    The output should be a JSON array of objects, with each question/answer pair structured as follows:
+    [
+        {"question": <question>, "answer": <answer>},
+        {"question": <question>, "answer": <answer>},
+        {"question": <question>, "answer": <answer>}
+    ]
 
     Only provide the data in as describes, do not include any other information in the output.
     The questions should not be generic and should be specific to the content of the article.
-    Ensure that the output is formatted as a list of dictionaries.
+    Ensure that the output is formatted as a JSON array of objects.
     Do not include markdown or any other formatting in the output e.g. no ```json.
+"""
+
+
+def generate_qa_prompt(article):
+    prompt = f"""{QA_GENERATION_INSTRUCTIONS}
+    Article:\n
+    {article}\n
     """
     return prompt
+
+
+def generate_qa_messages(article):
+    """
+    Build the chat messages to generate question/answer pairs for an article.
+
+    The static instructions go in the system message and the article in the
+    user message, so every request shares the same prefix.
+
+    Parameters
+    ----------
+    article : str
+        The article to generate questions from.
+
+    Returns
+    -------
+    list of dict
+        The chat messages.
+    """
+    return [
+        {"role": "system", "content": QA_GENERATION_INSTRUCTIONS},
+        {"role": "user", "content": f"Article:\n\n{article}"},
+    ]
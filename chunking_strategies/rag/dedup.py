@@ -0,0 +1,213 @@
+import zlib
+import numpy as np
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    words = text.lower().split()
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [
+            " ".join(words[i : i + shingle_size])
+            for i in range(len(words) - shingle_size + 1)
+        ]
+    return np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def minhash_signatures(
+    texts, num_perm=128, shingle_size=5, seed=1, max_shingles_per_batch=50_000
+):
+    """
+    Compute MinHash signatures over word shingles.
+
+    The permutations are applied to every shingle of a batch of texts at
+    once, and each text's minimum is taken with ``np.minimum.reduceat``.
+
+    Parameters
+    ----------
+    texts : list of str
+        The texts to sign.
+    num_perm : int
+        The number of hash permutations (signature length).
+    shingle_size : int
+        The number of words per shingle.
+    seed : int
+        The seed for the permutation parameters.
+    max_shingles_per_batch : int
+        Bounds the ``(shingles, num_perm)`` working array of each batch.
+
+    Returns
+    -------
+    numpy.ndarray
+        A ``(len(texts), num_perm)`` uint64 array of signatures.
+    """
+    rng = np.random.default_rng(seed)
+    # a, b < 2**32 so that a * hash + b cannot overflow uint64
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+
+    def sign(first, hashes):
+        lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        permuted = (np.concatenate(hashes)[:, None] * a + b) % _MERSENNE_PRIME
+        signatures[first : first + len(hashes)] = np.minimum.reduceat(
+            permuted & _MAX_HASH, offsets, axis=0
+        )
+
+    batch, batch_start, batch_shingles = [], 0, 0
+    for index, text in enumerate(texts):
+        hashes = _shingle_hashes(text, shingle_size)
+        if batch and batch_shingles + len(hashes) > max_shingles_per_batch:
+            sign(batch_start, batch)
+            batch, batch_start, batch_shingles = [], index, 0
+        batch.append(hashes)
+        batch_shingles += len(hashes)
+    if batch:
+        sign(batch_start, batch)
+
+    return signatures
+
+
+def lsh_parameters(threshold, num_perm):
+    """
+    Pick the number of LSH bands and rows per band for a Jaccard threshold.
+
+    The S-curve ``1 - (1 - s**rows)**bands`` rises steepest at
+    ``(1 / bands) ** (1 / rows)``, which is placed as close to the threshold
+    as the signature length allows.
+
+    Returns
+    -------
+    tuple of (int, int)
+        The number of bands and rows per band.
+    """
+    candidates = [(bands, num_perm // bands) for bands in range(1, num_perm + 1)]
+    return min(
+        candidates,
+        key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold),
+    )
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def near_duplicate_clusters(
+    texts, threshold=0.9, num_perm=128, shingle_size=5, seed=1
+) -> np.ndarray:
+    """
+    Cluster near-duplicate texts with MinHash LSH.
+
+    Texts sharing an LSH bucket in any band are candidate pairs; a pair is
+    merged when its estimated Jaccard similarity is at least `threshold`.
+
+    Parameters
+    ----------
+    texts : list of str
+        The texts to cluster.
+    threshold : float
+        The minimum estimated Jaccard similarity of word shingles.
+    num_perm : int
+        The MinHash signature length.
+    shingle_size : int
+        The number of words per shingle.
+    seed : int
+        The seed for the MinHash permutations.
+
+    Returns
+    -------
+    numpy.ndarray
+        For each text, the index of its cluster representative (the first
+        text in the cluster). Unique texts are their own representative.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be between 0 and 1")
+
+    signatures = minhash_signatures(
+        texts, num_perm=num_perm, shingle_size=shingle_size, seed=seed
+    )
+    bands, rows = lsh_parameters(threshold, num_perm)
+    parents = np.arange(len(texts))
+
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+        shared = counts[bucket] > 1
+        if not shared.any():
+            continue
+
+        # Compare every bucket member with the first member of its bucket
+        members = np.flatnonzero(shared)
+        order = members[np.argsort(bucket[members], kind="stable")]
+        sorted_buckets = bucket[order]
+        starts = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+        heads = order[starts][np.cumsum(starts) - 1]
+
+        candidates, candidate_heads = order[~starts], heads[~starts]
+        similarity = np.mean(
+            signatures[candidates] == signatures[candidate_heads], axis=1
+        )
+        for i, head in zip(
+            candidates[similarity >= threshold].tolist(),
+            candidate_heads[similarity >= threshold].tolist(),
+        ):
+            root_i, root_head = _find(parents, i), _find(parents, head)
+            if root_i != root_head:
+                parents[max(root_i, root_head)] = min(root_i, root_head)
+
+    return np.array([_find(parents, i) for i in range(len(texts))], dtype=np.int64)
+
+
+def deduplicate_chunks(chunks, doc_ids, threshold=0.9, **kwargs):
+    """
+    Collapse near-duplicate chunks, keeping the first of each cluster.
+
+    Parameters
+    ----------
+    chunks : list of str
+        The chunk texts.
+    doc_ids : list of str
+        The doc_id of each chunk.
+    threshold : float
+        The minimum estimated Jaccard similarity for two chunks to collapse.
+    **kwargs
+        Passed to `near_duplicate_clusters`.
+
+    Returns
+    -------
+    keep : numpy.ndarray
+        The indices of the kept chunks.
+    source_doc_ids : list of list of str
+        For each kept chunk, the doc_ids of every chunk collapsed into it
+        (its own first), without repeats.
+    """
+    representatives = near_duplicate_clusters(chunks, threshold=threshold, **kwargs)
+    keep = np.flatnonzero(representatives == np.arange(len(chunks)))
+
+    sources = {int(i): [doc_ids[i]] for i in keep}
+    for i, representative in enumerate(representatives.tolist()):
+        if representative != i and doc_ids[i] not in sources[representative]:
+            sources[representative].append(doc_ids[i])
+
+    logger.info(
+        f"Kept {len(keep)} of {len(chunks)} chunks "
+        f"({len(chunks) - len(keep)} near-duplicates removed)"
+    )
+    return keep, [sources[int(i)] for i in keep]
@@ -0,0 +1,379 @@
+import os
+import numpy as np
+from helper.logging import get_logger
+from helper.tokenization import sentence_spans, whitespace_spans
+from rag.cache import bump_collection_version
+
+logger = get_logger(__name__)
+
+PARENT_MODES = ("window", "paragraph", "document")
+
+
+class DocStore:
+    """
+    Read-only access to a store written by `DocStore.build`.
+
+    Parameters
+    ----------
+    path : str
+        The store directory, holding ``text.bin`` and ``index.npz``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index = np.load(os.path.join(path, "index.npz"))
+        self.doc_ids = index["doc_ids"]
+        self.offsets = index["offsets"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids.tolist())}
+        text_path = os.path.join(path, "text.bin")
+        self._text = (
+            np.memmap(text_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(text_path)
+            else np.empty(0, dtype=np.uint8)
+        )
+
+    @classmethod
+    def build(cls, path, documents):
+        """
+        Write documents to a new store.
+
+        Parameters
+        ----------
+        path : str
+            The directory to write to.
+        documents : iterable of tuple of (str, str)
+            ``(doc_id, text)`` pairs. May be a generator, e.g. over
+            `rag.loading.iter_record_batches`, so the corpus never has to fit
+            in memory. Later duplicates of a doc_id are skipped.
+
+        Returns
+        -------
+        DocStore
+            The opened store.
+        """
+        os.makedirs(path, exist_ok=True)
+        doc_ids, offsets, seen = [], [], set()
+        position = 0
+        with open(os.path.join(path, "text.bin"), "wb") as f:
+            for doc_id, text in documents:
+                doc_id = str(doc_id)
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                data = text.encode("utf-8")
+                f.write(data)
+                doc_ids.append(doc_id)
+                offsets.append((position, position + len(data)))
+                position += len(data)
+
+        np.savez(
+            os.path.join(path, "index.npz"),
+            doc_ids=np.array(doc_ids, dtype=str),
+            offsets=np.array(offsets, dtype=np.int64).reshape(-1, 2),
+        )
+        logger.info(f"Stored {len(doc_ids)} documents ({position} bytes) in {path}")
+        return cls(path)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self._rows
+
+    def __iter__(self):
+        for doc_id in self.doc_ids.tolist():
+            yield doc_id, self.get(doc_id)
+
+    @property
+    def nbytes(self):
+        return len(self._text)
+
+    def get(self, doc_id):
+        """Return the full text of a document."""
+        start, end = self.offsets[self._rows[str(doc_id)]]
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    def slice(self, doc_id, start, end):
+        """Return characters ``[start, end)`` of a document."""
+        return self.get(doc_id)[start:end]
+
+
+def child_spans(text, chunk_length=100, overlap=20):
+    """
+    Split text into overlapping word windows, as character spans.
+
+    The windows match `rag.chunking.chunk_string_with_offsets`, whose word
+    offsets index the whitespace tokens of the text.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``(n, 4)`` int64 array of start and end character offsets followed
+        by start and end word offsets.
+    """
+    if chunk_length < 1:
+        raise ValueError("chunk_length must be at least one")
+    if overlap >= chunk_length:
+        raise ValueError("overlap must be less than chunk_length")
+
+    words = whitespace_spans(text)
+    # Unlike chunk_string_with_offsets, a document shorter than the overlap
+    # still gets one chunk
+    last = max(len(words) - overlap, min(len(words), 1))
+    starts = np.arange(0, last, chunk_length - overlap)
+    ends = np.minimum(starts + chunk_length, len(words))
+    return np.column_stack([words[starts, 0], words[ends - 1, 1], starts, ends]).astype(
+        np.int64
+    )
+
+
+def add_child_chunks(
+    index,
+    store,
+    chunk_length=100,
+    overlap=20,
+    embedding_function=None,
+    store_text=True,
+    batch_size=1000,
+):
+    """
+    Index small child spans of every document in a store.
+
+    Each chunk's metadata holds its ``doc_id``, its character offsets
+    (``char_start``, ``char_end``) and its word offsets (``start``, ``end``,
+    as used by `rag.augmentation.pack_context`). Chunk ids are
+    ``{doc_id}-{i + 1}``.
+
+    Parameters
+    ----------
+    index : chromadb.Collection
+        The collection to add to.
+    store : DocStore
+        The documents to chunk.
+    chunk_length : int
+        The length of each child chunk in words.
+    overlap : int
+        The number of words each child chunk overlaps with the next.
+    embedding_function : callable, optional
+        Embeds the child texts before adding them. Required when
+        `store_text` is False.
+    store_text : bool
+        Whether to store the child text in the index. Without it, the index
+        only holds embeddings and offsets and text comes from the store.
+    batch_size : int
+        The number of chunks added per call.
+
+    Returns
+    -------
+    int
+        The number of chunks added.
+    """
+    if not store_text and embedding_function is None:
+        raise ValueError("embedding_function is required when store_text is False")
+
+    def empty_batch():
+        return {"ids": [], "documents": [], "metadatas": []}
+
+    batch = empty_batch()
+    added = 0
+
+    def flush():
+        kwargs = {"ids": batch["ids"], "metadatas": batch["metadatas"]}
+        if embedding_function is not None:
+            kwargs["embeddings"] = embedding_function(batch["documents"])
+        if store_text:
+            kwargs["documents"] = batch["documents"]
+        index.add(**kwargs)
+        bump_collection_version(index)
+
+    for doc_id, text in store:
+        for i, (char_start, char_end, start, end) in enumerate(
+            child_spans(text, chunk_length, overlap).tolist()
+        ):
+            batch["ids"].append(f"{doc_id}-{i + 1}")
+            batch["documents"].append(text[char_start:char_end])
+            batch["metadatas"].append(
+                {
+                    "doc_id": doc_id,
+                    "char_start": char_start,
+                    "char_end": char_end,
+                    "start": start,
+                    "end": end,
+                }
+            )
+            if len(batch["ids"]) >= batch_size:
+                added += len(batch["ids"])
+                flush()
+                batch = empty_batch()
+    if batch["ids"]:
+        added += len(batch["ids"])
+        flush()
+
+    logger.info(f"Indexed {added} child chunks from {len(store)} documents")
+    return added
+
+
+def parent_span(
+    text, start, end, mode="window", window_chars=1500, sentence_offsets=None
+):
+    """
+    Expand a child span to its parent.
+
+    Parameters
+    ----------
+    text : str
+        The full document.
+    start, end : int
+        The child's character offsets.
+    mode : str
+        ``"window"``: about `window_chars` characters centred on the child,
+        widened to sentence boundaries. ``"paragraph"``: the lines (or
+        blank-line separated paragraphs) the child falls in. ``"document"``:
+        the whole document.
+    window_chars : int
+        The target size of a window.
+    sentence_offsets : numpy.ndarray, optional
+        Precomputed sentence spans of the text, used in window mode.
+
+    Returns
+    -------
+    tuple of (int, int)
+        The parent's character offsets. Always contains the child.
+    """
+    if mode == "document":
+        return 0, len(text)
+
+    if mode == "paragraph":
+        parent_start = text.rfind("\n", 0, start) + 1
+        parent_end = text.find("\n", end)
+        return parent_start, len(text) if parent_end == -1 else parent_end
+
+    if mode == "window":
+        padding = max(window_chars - (end - start), 0) // 2
+        low, high = max(start - padding, 0), min(end + padding, len(text))
+        # Snap outwards to the sentences that overlap the window
+        spans = sentence_spans(text) if sentence_offsets is None else sentence_offsets
+        overlapping = spans[(spans[:, 1] > low) & (spans[:, 0] < high)]
+        if len(overlapping):
+            low = min(low, int(overlapping[0, 0]))
+            high = max(high, int(overlapping[-1, 1]))
+        return min(low, start), max(high, end)
+
+    raise ValueError(f"mode must be one of {PARENT_MODES}")
+
+
+def expand_hits(hits, store, mode="window", window_chars=1500):
+    """
+    Expand child hits to their parents, merging parents that overlap.
+
+    Parameters
+    ----------
+    hits : list of dict
+        Hits with ``doc_id``, ``char_start``, ``char_end`` and ``distance``
+        keys, most relevant first (see `get_parent_hits`).
+    store : DocStore
+        The store holding the documents.
+    mode : str
+        See `parent_span`.
+    window_chars : int
+        See `parent_span`.
+
+    Returns
+    -------
+    list of dict
+        One dict per parent, ordered by its best hit, with the keys ``text``,
+        ``doc_id``, ``char_start``, ``char_end`` and ``distance`` (of the best
+        hit).
+    """
+    parents = {}
+    # Each document is decoded (and split into sentences) once per call, however
+    # many of its children were hit
+    texts = {}
+    sentences = {}
+    for rank, hit in enumerate(hits):
+        doc_id = hit["doc_id"]
+        if doc_id not in texts:
+            texts[doc_id] = store.get(doc_id)
+            if mode == "window":
+                sentences[doc_id] = sentence_spans(texts[doc_id])
+        start, end = parent_span(
+            texts[doc_id],
+            hit["char_start"],
+            hit["char_end"],
+            mode,
+            window_chars,
+            sentence_offsets=sentences.get(doc_id),
+        )
+        parents.setdefault(doc_id, []).append([start, end, rank, hit["distance"]])
+
+    expanded = []
+    for doc_id, spans in parents.items():
+        spans.sort()
+        merged = [spans[0]]
+        for start, end, rank, distance in spans[1:]:
+            last = merged[-1]
+            if start <= last[1]:
+                last[1] = max(last[1], end)
+                if rank < last[2]:
+                    last[2], last[3] = rank, distance
+            else:
+                merged.append([start, end, rank, distance])
+        for start, end, rank, distance in merged:
+            expanded.append(
+                {
+                    "text": texts[doc_id][start:end],
+                    "doc_id": doc_id,
+                    "char_start": start,
+                    "char_end": end,
+                    "distance": distance,
+                    "rank": rank,
+                }
+            )
+
+    expanded.sort(key=lambda parent: parent.pop("rank"))
+    return expanded
+
+
+def get_parent_hits(question, index, top_k=5):
+    """
+    Retrieve the top_k child chunks for a question, without their text.
+
+    Returns
+    -------
+    list of dict
+        One dict per hit with the keys ``doc_id``, ``char_start``,
+        ``char_end`` and ``distance``.
+    """
+    results = index.query(
+        query_texts=[question], n_results=top_k, include=["metadatas", "distances"]
+    )
+    return [
+        {
+            "doc_id": metadata["doc_id"],
+            "char_start": metadata["char_start"],
+            "char_end": metadata["char_end"],
+            "distance": distance,
+        }
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0])
+    ]
+
+
+def get_parent_context(
+    question, index, store, top_k=5, mode="window", window_chars=1500
+):
+    """
+    Retrieve context by matching small chunks and returning their parents.
+
+    A drop-in for `rag.augmentation.get_context` on an index built with
+    `add_child_chunks`.
+
+    Returns
+    -------
+    list of str
+        The merged parent passages, most relevant first.
+    """
+    hits = get_parent_hits(question, index, top_k)
+    return [
+        parent["text"]
+        for parent in expand_hits(hits, store, mode=mode, window_chars=window_chars)
+    ]
@@ -0,0 +1,322 @@
+import os
+import threading
+from functools import cached_property
+import numpy as np
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Process-wide cache of loaded models so repeated calls (and every notebook
+# cell) reuse the same weights instead of reloading them from disk.
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+BACKENDS = ("torch", "quantized", "onnx")
+
+
+def normalize(embeddings):
+    """L2-normalize rows so that dot products are cosine similarities."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _load_model(model_name: str, backend: str, device: str):
+    """
+    Load (or fetch from the process cache) the encoder for a backend.
+
+    Parameters
+    ----------
+    model_name : str
+        The SentenceTransformer / Hugging Face model id.
+    backend : str
+        One of ``"torch"``, ``"quantized"`` (dynamic int8 quantisation of the
+        linear layers, CPU only) or ``"onnx"`` (ONNX Runtime via optimum).
+    device : str
+        The torch device to run on. Ignored for the onnx backend.
+
+    Returns
+    -------
+    object
+        A model exposing ``tokenizer`` and ``encode_batch(texts)``.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+
+    key = (model_name, backend, device)
+    with _model_cache_lock:
+        if key not in _model_cache:
+            logger.info(f"Loading {backend} embedding model {model_name}")
+            if backend == "onnx":
+                _model_cache[key] = _OnnxEncoder(model_name)
+            else:
+                _model_cache[key] = _TorchEncoder(
+                    model_name, device=device, quantize=backend == "quantized"
+                )
+        return _model_cache[key]
+
+
+class _TorchEncoder:
+    def __init__(self, model_name, device="cpu", quantize=False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device=device)
+        if quantize:
+            if device != "cpu":
+                raise ValueError("Quantized embeddings are only supported on CPU")
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+
+    def encode_batch(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+
+class _OnnxEncoder:
+    def __init__(self, model_name):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend requires optimum: "
+                "pip install 'optimum[onnxruntime]'"
+            ) from e
+
+        model_id = (
+            model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_id, export=True, provider="CPUExecutionProvider"
+        )
+        self.max_seq_length = min(self.tokenizer.model_max_length, 512)
+
+    def encode_batch(self, texts):
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        hidden = self.model(**inputs).last_hidden_state
+        if not isinstance(hidden, np.ndarray):
+            hidden = hidden.numpy()
+
+        # Mean pooling over the attention mask, as SentenceTransformer does
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def set_num_threads(num_threads):
+    """
+    Set the number of intra-op threads torch may use.
+
+    This is process-wide: it applies to every torch model in the process, not
+    only to embedders, so call it once at start-up.
+    """
+    import torch
+
+    torch.set_num_threads(num_threads)
+
+
+def length_buckets(lengths, max_tokens_per_batch=8192, max_batch_size=256):
+    """
+    Group item indices into batches of similar token length.
+
+    Items are sorted by length and greedily packed so that
+    ``batch_size * longest_item`` stays under the token budget, which keeps
+    padding inside each batch to a minimum.
+
+    Parameters
+    ----------
+    lengths : array-like of int
+        The token length of each item.
+    max_tokens_per_batch : int
+        The padded token budget for a single batch.
+    max_batch_size : int
+        The maximum number of items in a single batch.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The original indices of the items in each batch.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    order = np.argsort(lengths, kind="stable")
+
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        longest = max(int(lengths[order[end - 1]]), 1)
+        size = end - start
+        if size > 1 and (
+            size * longest > max_tokens_per_batch or size > max_batch_size
+        ):
+            batches.append(order[start : end - 1])
+            start = end - 1
+    if start < len(order):
+        batches.append(order[start:])
+
+    return batches
+
+
+class LocalEmbedder:
+    """
+    A long-lived local embedding service.
+
+    The model is loaded once per process and shared between instances. Inputs
+    are bucketed by token length before encoding and the float32 results are
+    written straight into a preallocated array (or a memmap on disk).
+
+    Instances are callable with a list of documents, so they can be passed to
+    ChromaDB as an ``embedding_function``.
+
+    Parameters
+    ----------
+    model_name : str
+        The SentenceTransformer model to use.
+    backend : str
+        ``"torch"``, ``"quantized"`` or ``"onnx"``. The latter two are intended
+        for CPU-only hosts.
+    device : str
+        The torch device to use.
+    max_tokens_per_batch : int
+        The padded token budget for each encoder call.
+    max_batch_size : int
+        The maximum number of texts in each encoder call.
+    normalize_embeddings : bool
+        Whether to L2-normalise the embeddings. Off by default, so vectors
+        match those of ``SentenceTransformer.encode``. Turn it on only for new
+        indexes, since existing stored vectors are unnormalised.
+    """
+
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        backend="torch",
+        device="cpu",
+        max_tokens_per_batch=8192,
+        max_batch_size=256,
+        normalize_embeddings=False,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.device = device
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.normalize_embeddings = normalize_embeddings
+
+    @property
+    def model(self):
+        return _load_model(self.model_name, self.backend, self.device)
+
+    @cached_property
+    def dimension(self):
+        return int(self.model.encode_batch(["dimension probe"]).shape[1])
+
+    def token_lengths(self, texts):
+        """Return the token length of each text, truncated to max_seq_length."""
+        model = self.model
+        encoded = model.tokenizer(
+            list(texts),
+            add_special_tokens=True,
+            truncation=True,
+            max_length=model.max_seq_length,
+        )["input_ids"]
+        return np.fromiter(
+            (len(ids) for ids in encoded), dtype=np.int64, count=len(texts)
+        )
+
+    def encode(self, texts, out=None, show_progress_bar=False):
+        """
+        Embed a list of texts.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to embed.
+        out : numpy.ndarray, optional
+            A preallocated ``(len(texts), dim)`` float32 array (e.g. a memmap)
+            to write the embeddings into.
+        show_progress_bar : bool
+            Whether to display a progress bar over the batches.
+
+        Returns
+        -------
+        numpy.ndarray
+            The float32 embeddings in input order, L2-normalised if
+            `normalize_embeddings` is set.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32) if out is None else out
+
+        batches = length_buckets(
+            self.token_lengths(texts),
+            max_tokens_per_batch=self.max_tokens_per_batch,
+            max_batch_size=self.max_batch_size,
+        )
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} batches")
+
+        if show_progress_bar:
+            from tqdm.auto import tqdm
+
+            batches = tqdm(batches, desc="Embedding batches...")
+
+        for batch in batches:
+            vectors = self.model.encode_batch([texts[i] for i in batch])
+            if self.normalize_embeddings:
+                vectors = normalize(vectors)
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+
+        return out
+
+    def encode_to_memmap(self, texts, path, show_progress_bar=False):
+        """
+        Embed a list of texts into a float32 ``.npy`` memmap on disk.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to embed.
+        path : str
+            Where to write the ``.npy`` file.
+        show_progress_bar : bool
+            Whether to display a progress bar over the batches.
+
+        Returns
+        -------
+        numpy.memmap
+            The embeddings, backed by ``path``.
+        """
+        texts = list(texts)
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=(len(texts), self.dimension)
+        )
+        self.encode(texts, out=out, show_progress_bar=show_progress_bar)
+        out.flush()
+        return out
+
+    def __call__(self, input):
+        # ChromaDB EmbeddingFunction protocol
+        return self.encode(input).tolist()
+
+
+def get_local_embedder(model_name="all-MiniLM-L6-v2", **kwargs) -> LocalEmbedder:
+    """
+    Create a LocalEmbedder, defaulting the backend from ``LOCAL_EMBEDDING_BACKEND``.
+    """
+    kwargs.setdefault("backend", os.getenv("LOCAL_EMBEDDING_BACKEND", "torch"))
+    return LocalEmbedder(model_name, **kwargs)
@@ -0,0 +1,316 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from helper.logging import get_logger
+from helper.openai_utils import general_chat, general_prompt
+from helper.parsing import parse_json_items
+from rag.augmentation import construct_packed_prompt, count_tokens
+
+logger = get_logger(__name__)
+
+BATCH_ANSWER_INSTRUCTIONS = """
+    You provide answers to questions based on information available. You give precise answers to the question asked.
+    You do not answer more than what is needed. You are always exact to the point. You Answer each question using only its own context.
+    If the answer is not contained within a question's context, answer 'I dont know.'.
+    Each context is an excerpt from a report or data.
+
+    You will be given several questions, each with an id, a CONTEXT and a QUESTION.
+    Respond with only a JSON array containing one object per question, in the same order, of the form:
+    [{"id": "1", "answer": "..."}, {"id": "2", "answer": "..."}]
+    """
+
+# Context windows in tokens, matched against the start of the model or
+# deployment name (longest prefix first). The original gpt-35-turbo versions
+# (0301, 0613) have 4k windows; only 1106 and later have 16k.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-35-turbo-16k": 16_384,
+    "gpt-35-turbo-1106": 16_385,
+    "gpt-35-turbo-0125": 16_385,
+    "gpt-35-turbo": 4_096,
+    "gpt-3.5-turbo-16k": 16_384,
+    "gpt-3.5-turbo-1106": 16_385,
+    "gpt-3.5-turbo-0125": 16_385,
+    "gpt-3.5-turbo": 4_096,
+    "gpt-4-32k": 32_768,
+    "gpt-4-turbo": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4": 8_192,
+}
+
+
+def context_window(model, default=8_192):
+    """Return the context window of a model, or `default` if it is unknown."""
+    name = model.lower()
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return default
+
+
+def _format_item(item_id, context, question):
+    if isinstance(context, (list, tuple)):
+        context = "\n\n".join(context)
+    return f"### Question {item_id}\nCONTEXT:\n{context}\n\nQUESTION:\n{question}\n"
+
+
+def batch_messages(questions, contexts):
+    """
+    Build the chat messages answering several questions in one request.
+
+    The questions are numbered from 1 in the order given.
+
+    Returns
+    -------
+    list of dict
+        The chat messages.
+    """
+    items = [
+        _format_item(position + 1, context, question)
+        for position, (question, context) in enumerate(zip(questions, contexts))
+    ]
+    return [
+        {"role": "system", "content": BATCH_ANSWER_INSTRUCTIONS},
+        {"role": "user", "content": "\n".join(items)},
+    ]
+
+
+def parse_batch_answers(response, num_questions):
+    """
+    Parse the answers of a batched request.
+
+    Parameters
+    ----------
+    response : str or None
+        The raw model output.
+    num_questions : int
+        The number of questions in the batch.
+
+    Returns
+    -------
+    dict
+        Answers by zero-based position in the batch. Missing, duplicated,
+        empty or malformed answers are left out.
+    """
+    items, _ = parse_json_items(response)
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("answer"), str):
+            continue
+        try:
+            position = int(str(item.get("id")).strip()) - 1
+        except ValueError:
+            continue
+        if 0 <= position < num_questions and item["answer"].strip():
+            answers.setdefault(position, item["answer"].strip())
+    return answers
+
+
+def plan_batch(
+    item_tokens,
+    start,
+    token_budget,
+    max_answer_tokens,
+    max_output_tokens,
+    max_batch_size,
+):
+    """
+    Return the end of the largest batch starting at `start` that fits.
+
+    A batch fits when its items plus `max_answer_tokens` per question stay
+    within `token_budget`, and its answers within `max_output_tokens`. A
+    batch always holds at least one item.
+    """
+    end, used = start, 0
+    while end < len(item_tokens) and end - start < max_batch_size:
+        cost = item_tokens[end] + max_answer_tokens
+        answers = (end - start + 1) * max_answer_tokens
+        if end > start and (used + cost > token_budget or answers > max_output_tokens):
+            break
+        used += cost
+        end += 1
+    return end
+
+
+def generate_answers(
+    questions,
+    contexts,
+    client,
+    model,
+    max_batch_size=16,
+    window=None,
+    max_answer_tokens=256,
+    max_output_tokens=4_096,
+    max_in_flight=4,
+    temperature=0.9,
+    token_counter=count_tokens,
+):
+    """
+    Answer many questions with batched requests.
+
+    Several questions, each with its own packed context, share one request
+    whose instructions are sent once as the system message. Questions whose
+    answer is missing or malformed are retried one at a time. The batch size
+    is halved after a batch with failures and grows back after clean ones.
+
+    Parameters
+    ----------
+    questions : list of str
+        The questions.
+    contexts : list of list of str
+        The packed context of each question, e.g. from
+        `rag.augmentation.pack_context`.
+    client : openai.AzureOpenAI
+        The client to use.
+    model : str
+        The deployment to generate with.
+    max_batch_size : int
+        The most questions per request. 1 sends every question on its own
+        with `rag.augmentation.construct_packed_prompt`.
+    window : int, optional
+        The model's context window in tokens. Defaults to
+        `context_window(model)`.
+    max_answer_tokens : int
+        The tokens reserved for each answer.
+    max_output_tokens : int
+        The most tokens the model may generate per request. Each batched
+        request is sent with ``max_tokens`` set to its answer reservation,
+        which never exceeds this.
+    max_in_flight : int
+        The maximum number of concurrent requests.
+    temperature : float
+        The sampling temperature.
+    token_counter : callable
+        Returns the token count of a string.
+
+    Returns
+    -------
+    answers : list of str or None
+        The answers in question order. None where even the single-question
+        fallback returned nothing.
+    stats : dict
+        The numbers of ``requests``, ``batches``, single-question requests
+        (``singles``) and answers retried alone after their batch failed
+        (``fallbacks``), and the ``prompt_tokens`` sent next to the
+        ``unbatched_prompt_tokens`` one request per question would have
+        taken.
+    """
+    if len(questions) != len(contexts):
+        raise ValueError("questions and contexts must be the same length")
+    if max_batch_size < 1 or max_in_flight < 1:
+        raise ValueError("max_batch_size and max_in_flight must be at least one")
+
+    window = window or context_window(model)
+    instruction_tokens = token_counter(BATCH_ANSWER_INSTRUCTIONS)
+    token_budget = window - instruction_tokens
+    item_tokens = [
+        token_counter(_format_item(position + 1, context, question))
+        for position, (question, context) in enumerate(zip(questions, contexts))
+    ]
+    unbatched = sum(
+        token_counter(construct_packed_prompt(context, question))
+        for question, context in zip(questions, contexts)
+    )
+
+    answers = [None] * len(questions)
+    single, failed = [], []
+    stats = {
+        "requests": 0,
+        "batches": 0,
+        "singles": 0,
+        "fallbacks": 0,
+        "prompt_tokens": 0,
+        "unbatched_prompt_tokens": unbatched,
+    }
+    # Grown by one after a clean batch, halved after a batch with failures.
+    # It never drops below two while batching is enabled: at one, every
+    # question would go out alone and no batch would be left to grow it back.
+    batch_limit = max_batch_size
+    min_batch_limit = min(2, max_batch_size)
+
+    def answer_batch(positions):
+        messages = batch_messages(
+            [questions[i] for i in positions], [contexts[i] for i in positions]
+        )
+        response = general_chat(
+            client,
+            messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=min(max_output_tokens, len(positions) * max_answer_tokens),
+        )
+        return positions, parse_batch_answers(response, len(positions))
+
+    def record(positions, parsed):
+        nonlocal batch_limit
+        for position, index in enumerate(positions):
+            if position in parsed:
+                answers[index] = parsed[position]
+            else:
+                failed.append(index)
+        if len(parsed) < len(positions):
+            batch_limit = max(min_batch_limit, batch_limit // 2)
+            logger.warning(
+                "Batch of %d questions returned %d answers; batch size now %d",
+                len(positions),
+                len(parsed),
+                batch_limit,
+            )
+        else:
+            batch_limit = min(max_batch_size, batch_limit + 1)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = set()
+        start = 0
+        while start < len(questions) or in_flight:
+            if start < len(questions) and len(in_flight) < max_in_flight:
+                end = plan_batch(
+                    item_tokens,
+                    start,
+                    token_budget,
+                    max_answer_tokens,
+                    max_output_tokens,
+                    batch_limit,
+                )
+                positions = list(range(start, end))
+                start = end
+                if len(positions) == 1:
+                    # A batch of one gains nothing from the JSON wrapper
+                    single.extend(positions)
+                    continue
+                stats["requests"] += 1
+                stats["batches"] += 1
+                stats["prompt_tokens"] += instruction_tokens + sum(
+                    item_tokens[i] for i in positions
+                )
+                in_flight.add(executor.submit(answer_batch, positions))
+                continue
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(*future.result())
+
+        prompts = {
+            index: construct_packed_prompt(contexts[index], questions[index])
+            for index in sorted(single + failed)
+        }
+        stats["requests"] += len(prompts)
+        stats["singles"] += len(prompts)
+        stats["fallbacks"] += len(failed)
+        stats["prompt_tokens"] += sum(token_counter(p) for p in prompts.values())
+        for index, answer in zip(
+            prompts,
+            executor.map(
+                lambda prompt: general_prompt(
+                    client, prompt, model=model, temperature=temperature
+                ),
+                prompts.values(),
+            ),
+        ):
+            answers[index] = answer
+
+    logger.info(
+        f"Answered {len(questions)} questions with {stats['requests']} requests "
+        f"({stats['batches']} batches, {stats['singles']} single, "
+        f"{stats['fallbacks']} fallbacks) and "
+        f"{stats['prompt_tokens']} prompt tokens "
+        f"({stats['unbatched_prompt_tokens']} unbatched)"
+    )
+    return answers, stats
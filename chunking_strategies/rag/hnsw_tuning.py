@@ -0,0 +1,212 @@
+import itertools
+import time
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+from rag.compression import normalize, recall_at_k
+
+logger = get_logger(__name__)
+
+SPACES = ("cosine", "ip", "l2")
+
+
+def exact_neighbours(embeddings, queries, k=10, space="cosine"):
+    """The true k nearest neighbours of each query, by brute force."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if space == "cosine":
+        scores = normalize(queries) @ normalize(embeddings).T
+    elif space == "ip":
+        scores = queries @ embeddings.T
+    elif space == "l2":
+        scores = 2 * queries @ embeddings.T - (embeddings**2).sum(axis=1)
+    else:
+        raise ValueError(f"space must be one of {SPACES}")
+    k = min(k, len(embeddings))
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def hnsw_memory_bytes(num_elements, dimensions, M):
+    """
+    Estimate the memory of an hnswlib index.
+
+    Every element stores its vector, label and 2 * M level-0 links; about
+    1 / ln(M) of them also carry M links per upper level.
+    """
+    level0 = dimensions * 4 + 8 + (2 * M + 1) * 4
+    upper = (M + 1) * 4 / np.log(M) if M > 1 else 0
+    return int(num_elements * (level0 + upper))
+
+
+def build_hnswlib(embeddings, space, M, construction_ef, num_threads=-1):
+    """
+    Build an hnswlib index and return a search function for it.
+
+    Returns
+    -------
+    callable
+        ``search(queries, k, search_ef)`` returning a ``(q, k)`` array of row
+        indices.
+    """
+    import hnswlib
+
+    index = hnswlib.Index(space=space, dim=embeddings.shape[1])
+    index.init_index(max_elements=len(embeddings), ef_construction=construction_ef, M=M)
+    index.add_items(embeddings, np.arange(len(embeddings)), num_threads=num_threads)
+
+    def search(queries, k, search_ef):
+        index.set_ef(max(search_ef, k))
+        labels, _ = index.knn_query(queries, k=k, num_threads=1)
+        return labels
+
+    return search
+
+
+def pareto_front(results, maximise=("recall",), minimise=("query_ms",)):
+    """
+    Mark the settings that no other setting beats on every objective.
+
+    Returns
+    -------
+    numpy.ndarray
+        A boolean mask over the rows of `results`.
+    """
+    # Negate the maximised objectives so that lower is better everywhere
+    values = np.column_stack(
+        [-results[column].to_numpy(float) for column in maximise]
+        + [results[column].to_numpy(float) for column in minimise]
+    )
+    no_worse = (values[:, None, :] <= values[None, :, :]).all(axis=2)
+    better = (values[:, None, :] < values[None, :, :]).any(axis=2)
+    dominated = (no_worse & better).any(axis=0)
+    return ~dominated
+
+
+def tune_hnsw(
+    embeddings,
+    queries=None,
+    target_recall=0.95,
+    k=10,
+    space="cosine",
+    M_values=(8, 16, 32, 64),
+    construction_efs=(64, 128, 256),
+    search_efs=(10, 20, 40, 80, 160, 320),
+    sample_size=20_000,
+    num_queries=200,
+    seed=42,
+    build_fn=build_hnswlib,
+):
+    """
+    Measure HNSW settings on a sample and recommend one for a recall target.
+
+    Parameters
+    ----------
+    embeddings : numpy.ndarray
+        The ``(n, dim)`` corpus embeddings.
+    queries : numpy.ndarray, optional
+        Query embeddings, e.g. the embedded evaluation questions. Defaults to
+        a sample of the corpus embeddings that is held out of the index.
+    target_recall : float
+        The minimum recall@k the recommendation must reach.
+    k : int
+        The number of neighbours for recall and latency.
+    space : str
+        ``"cosine"``, ``"ip"`` or ``"l2"``, as in ``hnsw:space``.
+    M_values, construction_efs, search_efs : sequence of int
+        The parameter grid.
+    sample_size : int
+        The number of corpus embeddings to index.
+    num_queries : int
+        The number of queries to sample when `queries` is not given.
+    seed : int
+        The random seed for the samples.
+    build_fn : callable
+        ``build_fn(embeddings, space, M, construction_ef)`` returning a
+        ``search(queries, k, search_ef)`` function. Defaults to hnswlib.
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per setting with ``M``, ``construction_ef``, ``search_ef``,
+        ``recall``, ``query_ms`` (per query), ``build_s``, ``memory_mb``,
+        ``pareto`` (on recall, query latency and memory) and ``meets_target``.
+    best : dict
+        The fastest setting meeting the target (ties broken by memory and
+        build time), as keyword arguments for `rag.retrieval.create_index`.
+        If none meets it, the setting with the highest recall.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    rows = rng.permutation(len(embeddings))
+    if queries is None:
+        num_queries = min(num_queries, len(embeddings) // 2)
+        queries, rows = embeddings[rows[:num_queries]], rows[num_queries:]
+    sample = embeddings[np.sort(rows[:sample_size])]
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    k = min(k, len(sample))
+
+    expected = exact_neighbours(sample, queries, k, space)
+    logger.info(
+        f"Tuning HNSW on {len(sample)} vectors and {len(queries)} queries "
+        f"for recall@{k} >= {target_recall}"
+    )
+
+    records = []
+    for M, construction_ef in itertools.product(M_values, construction_efs):
+        start = time.perf_counter()
+        search = build_fn(sample, space, M, construction_ef)
+        build_s = time.perf_counter() - start
+        memory_mb = hnsw_memory_bytes(len(sample), sample.shape[1], M) / 2**20
+
+        for search_ef in search_efs:
+            start = time.perf_counter()
+            found = search(queries, k, search_ef)
+            query_ms = (time.perf_counter() - start) / len(queries) * 1000
+            records.append(
+                {
+                    "M": M,
+                    "construction_ef": construction_ef,
+                    "search_ef": search_ef,
+                    "recall": recall_at_k(found, expected),
+                    "query_ms": query_ms,
+                    "build_s": build_s,
+                    "memory_mb": memory_mb,
+                }
+            )
+        logger.info(
+            f"M={M}, construction_ef={construction_ef}: built in {build_s:.2f}s, "
+            f"best recall {max(r['recall'] for r in records[-len(search_efs):]):.3f}"
+        )
+
+    results = pd.DataFrame(records)
+    results["pareto"] = pareto_front(
+        results, maximise=("recall",), minimise=("query_ms", "memory_mb")
+    )
+    results["meets_target"] = results["recall"] >= target_recall
+
+    if results["meets_target"].any():
+        choice = (
+            results[results["meets_target"]]
+            .sort_values(["query_ms", "memory_mb", "build_s"])
+            .iloc[0]
+        )
+    else:
+        choice = results.sort_values(["recall", "query_ms"], ascending=[False, True])
+        choice = choice.iloc[0]
+        logger.warning(
+            f"No setting reached recall {target_recall}; the best reached "
+            f"{choice['recall']:.3f}. Widen the grid."
+        )
+
+    best = {
+        "M": int(choice["M"]),
+        "construction_ef": int(choice["construction_ef"]),
+        "search_ef": int(choice["search_ef"]),
+    }
+    logger.info(
+        f"Recommended {best}: recall {choice['recall']:.3f}, "
+        f"{choice['query_ms']:.3f} ms per query"
+    )
+    return results, best
@@ -0,0 +1,286 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from helper.logging import get_logger
+from rag.cache import bump_collection_version
+from rag.chunking import chunk_string_with_offsets
+
+logger = get_logger(__name__)
+
+_DONE = object()
+
+
+def load_checkpoint(path):
+    """Return the doc_ids recorded as complete in a checkpoint file."""
+    try:
+        with open(path) as f:
+            return {line.rstrip("\n") for line in f if line.endswith("\n")}
+    except FileNotFoundError:
+        return set()
+
+
+class _Pipeline:
+    def __init__(self, queue_size):
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.embedded = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.errors = []
+        self.busy = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def put(self, target, item):
+        """Put with backpressure, giving up if another stage failed."""
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, source, drain=False):
+        """
+        Get the next item, or _DONE once another stage failed. With `drain`,
+        items already queued are still returned after a failure.
+        """
+        while not self.stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        if drain:
+            try:
+                return source.get_nowait()
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def fail(self, error):
+        with self.lock:
+            self.errors.append(error)
+        self.stop.set()
+
+    def timed(self, stage, start):
+        with self.lock:
+            self.busy[stage] += time.perf_counter() - start
+
+
+def ingest(
+    record_batches,
+    index,
+    embedding_function,
+    text_column="article",
+    id_column="doc_id",
+    chunker=chunk_string_with_offsets,
+    embed_batch_size=256,
+    write_batch_size=5000,
+    embed_workers=2,
+    queue_size=8,
+    checkpoint_path=None,
+    checkpoint_every_s=10.0,
+    **chunker_kwargs,
+):
+    """
+    Chunk, embed and index a stream of documents with overlapping stages.
+
+    Parameters
+    ----------
+    record_batches : iterable of pandas.DataFrame
+        The documents, e.g. from `rag.loading.iter_record_batches`.
+    index : chromadb.Collection or rag.sharding.ShardedIndex
+        The index to write to.
+    embedding_function : callable
+        Embeds a list of texts, e.g. a `rag.embedding.LocalEmbedder` or
+        `rag.retrieval.get_openai_embedding_function()`.
+    text_column : str
+        The column holding the document text.
+    id_column : str
+        The column holding the document id.
+    chunker : callable
+        Called as ``chunker(input_text=text, **chunker_kwargs)``, returning
+        chunk strings or ``(text, start, end)`` tuples whose word offsets are
+        stored in the metadata (see `rag.chunking.chunk_string_with_offsets`).
+    embed_batch_size : int
+        The number of chunks per embedding call.
+    write_batch_size : int
+        The maximum number of chunks per index write. Keep it under the
+        client's ``max_batch_size``.
+    embed_workers : int
+        The number of concurrent embedding threads.
+    queue_size : int
+        The capacity, in batches, of each queue between stages.
+    checkpoint_path : str, optional
+        A file to append completed doc_ids to. Documents already in it are
+        skipped.
+    checkpoint_every_s : float
+        How often to flush the checkpoint and log progress.
+    **chunker_kwargs
+        Passed to `chunker`, e.g. ``chunk_length=400, overlap=50``.
+
+    Returns
+    -------
+    dict
+        The numbers of documents ingested and skipped, chunks written and
+        index writes, the elapsed seconds, and the busy seconds of each stage
+        (``chunk_s``, ``embed_s``, ``write_s``).
+    """
+    completed = load_checkpoint(checkpoint_path) if checkpoint_path else set()
+    pipeline = _Pipeline(queue_size)
+    remaining = {}
+    stats = dict.fromkeys(["documents", "skipped", "chunks", "writes"], 0)
+    start_time = time.perf_counter()
+
+    def chunk_stage():
+        batch = []
+        try:
+            for records in record_batches:
+                started = time.perf_counter()
+                for doc_id, text in zip(records[id_column], records[text_column]):
+                    doc_id = str(doc_id)
+                    if doc_id in completed or doc_id in remaining:
+                        stats["skipped"] += 1
+                        continue
+                    if not isinstance(text, str):
+                        continue
+                    chunks = chunker(input_text=text, **chunker_kwargs)
+                    if not chunks:
+                        continue
+                    with pipeline.lock:
+                        remaining[doc_id] = len(chunks)
+                    for i, chunk in enumerate(chunks):
+                        metadata = {"doc_id": doc_id}
+                        if isinstance(chunk, tuple):
+                            chunk, metadata["start"], metadata["end"] = chunk
+                        batch.append((f"{doc_id}-{i + 1}", chunk, metadata))
+                        if len(batch) >= embed_batch_size:
+                            pipeline.timed("chunk_s", started)
+                            if not pipeline.put(pipeline.chunks, batch):
+                                return
+                            batch, started = [], time.perf_counter()
+                pipeline.timed("chunk_s", started)
+            if batch:
+                pipeline.put(pipeline.chunks, batch)
+        except Exception as error:
+            pipeline.fail(error)
+        finally:
+            for _ in range(embed_workers):
+                pipeline.put(pipeline.chunks, _DONE)
+
+    def embed_stage():
+        try:
+            while True:
+                batch = pipeline.get(pipeline.chunks)
+                if batch is _DONE:
+                    return
+                started = time.perf_counter()
+                embeddings = embedding_function([text for _, text, _ in batch])
+                embeddings = np.asarray(embeddings, dtype=np.float32).tolist()
+                pipeline.timed("embed_s", started)
+                if not pipeline.put(pipeline.embedded, (batch, embeddings)):
+                    return
+        except Exception as error:
+            pipeline.fail(error)
+        finally:
+            pipeline.put(pipeline.embedded, _DONE)
+
+    write = getattr(index, "upsert", None) or index.add
+    checkpoint = open(checkpoint_path, "a") if checkpoint_path else None
+
+    def flush_checkpoint(finished):
+        if checkpoint is not None and finished:
+            checkpoint.write("".join(f"{doc_id}\n" for doc_id in finished))
+            checkpoint.flush()
+        finished.clear()
+
+    def write_stage():
+        pending, finished = [], []
+        last_report = time.perf_counter()
+        embedders_left = embed_workers
+
+        def write_pending():
+            started = time.perf_counter()
+            for offset in range(0, len(pending), write_batch_size):
+                part = pending[offset : offset + write_batch_size]
+                write(
+                    ids=[chunk_id for chunk_id, _, _, _ in part],
+                    documents=[text for _, text, _, _ in part],
+                    metadatas=[metadata for _, _, metadata, _ in part],
+                    embeddings=[embedding for _, _, _, embedding in part],
+                )
+                stats["writes"] += 1
+            bump_collection_version(index)
+            pipeline.timed("write_s", started)
+
+            stats["chunks"] += len(pending)
+            for _, _, metadata, _ in pending:
+                doc_id = metadata["doc_id"]
+                with pipeline.lock:
+                    remaining[doc_id] -= 1
+                    if remaining[doc_id] == 0:
+                        del remaining[doc_id]
+                        finished.append(doc_id)
+                        stats["documents"] += 1
+            pending.clear()
+
+        try:
+            while embedders_left:
+                # After a failure, still write what was already embedded
+                item = pipeline.get(pipeline.embedded, drain=True)
+                if item is _DONE:
+                    if pipeline.stop.is_set() and pipeline.embedded.empty():
+                        break
+                    embedders_left -= 1
+                    continue
+                batch, embeddings = item
+                pending.extend(
+                    (chunk_id, text, metadata, embedding)
+                    for (chunk_id, text, metadata), embedding in zip(batch, embeddings)
+                )
+                if len(pending) >= write_batch_size:
+                    write_pending()
+
+                if time.perf_counter() - last_report >= checkpoint_every_s:
+                    flush_checkpoint(finished)
+                    elapsed = time.perf_counter() - start_time
+                    logger.info(
+                        f"Ingested {stats['documents']} documents, "
+                        f"{stats['chunks']} chunks "
+                        f"({stats['chunks'] / elapsed:.0f} chunks/s)"
+                    )
+                    last_report = time.perf_counter()
+            if pending:
+                write_pending()
+        except Exception as error:
+            pipeline.fail(error)
+        finally:
+            flush_checkpoint(finished)
+
+    threads = [threading.Thread(target=chunk_stage, name="ingest-chunk")]
+    threads += [
+        threading.Thread(target=embed_stage, name=f"ingest-embed-{i}")
+        for i in range(embed_workers)
+    ]
+    threads.append(threading.Thread(target=write_stage, name="ingest-write"))
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pipeline.stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    if pipeline.errors:
+        raise pipeline.errors[0]
+
+    stats["elapsed_s"] = time.perf_counter() - start_time
+    stats.update({stage: round(busy, 3) for stage, busy in pipeline.busy.items()})
+    logger.info(f"Ingestion finished: {stats}")
+    return stats
@@ -0,0 +1,187 @@
+import os
+import numpy as np
+import pandas as pd
+from helper.logging import get_logger
+from rag.chunking import chunk_string_with_overlap
+
+logger = get_logger(__name__)
+
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+
+def _file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return FILE_FORMATS[extension]
+    except KeyError:
+        raise ValueError(
+            f"Cannot infer the format of {path}, pass file_format as one of "
+            f"{sorted(set(FILE_FORMATS.values()))}"
+        ) from None
+
+
+def iter_record_batches(path, batch_size=10_000, columns=None, file_format=None):
+    """
+    Read a CSV, Parquet or JSONL file as a stream of record batches.
+
+    Parameters
+    ----------
+    path : str
+        The file to read.
+    batch_size : int
+        The maximum number of records per batch.
+    columns : list of str, optional
+        The columns to keep. Parquet only reads these columns from disk.
+    file_format : str, optional
+        One of ``"csv"``, ``"parquet"`` or ``"jsonl"``. Inferred from the file
+        extension by default.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Consecutive batches of at most `batch_size` records.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least one")
+
+    file_format = file_format or _file_format(path)
+    if file_format == "csv":
+        reader = pd.read_csv(path, chunksize=batch_size, usecols=columns)
+    elif file_format == "jsonl":
+        reader = pd.read_json(path, lines=True, chunksize=batch_size)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        reader = (
+            batch.to_pandas()
+            for batch in parquet_file.iter_batches(
+                batch_size=batch_size, columns=columns
+            )
+        )
+    else:
+        raise ValueError(f"Unsupported file format {file_format}")
+
+    with_columns = file_format == "jsonl" and columns is not None
+    for batch in reader:
+        yield batch[columns] if with_columns else batch
+
+
+def reservoir_sample(batches, sample_size, seed=None):
+    """
+    Sample records uniformly from a stream of batches in a single pass.
+
+    Uses reservoir sampling (Algorithm R), vectorised per batch: the t-th
+    record seen replaces a random reservoir slot with probability
+    ``sample_size / (t + 1)``. Only the reservoir and the current batch are
+    held in memory, and the total number of records need not be known.
+
+    Parameters
+    ----------
+    batches : iterable of pandas.DataFrame
+        The record batches, e.g. from `iter_record_batches`.
+    sample_size : int
+        The number of records to sample. Every record is returned if the
+        stream is shorter.
+    seed : int, optional
+        The random seed for reproducibility.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The sampled records, in stream order.
+    """
+    if sample_size < 0:
+        raise ValueError("sample_size must not be negative")
+
+    rng = np.random.default_rng(seed)
+    reservoir, positions = None, np.empty(0, dtype=np.int64)
+    seen = 0
+
+    for batch in batches:
+        if reservoir is None:
+            reservoir = batch.iloc[:0]
+        n = len(batch)
+        stream_positions = np.arange(seen, seen + n)
+
+        # Rows of concat([reservoir, batch]) that make up the new reservoir
+        size = min(sample_size, seen + n)
+        source = np.arange(size)
+        filling = stream_positions < sample_size
+        source[stream_positions[filling]] = len(reservoir) + np.flatnonzero(filling)
+
+        replacing = ~filling
+        slots = rng.integers(0, stream_positions[replacing] + 1)
+        accepted = slots < sample_size
+        slots = slots[accepted]
+        rows = len(reservoir) + np.flatnonzero(replacing)[accepted]
+        # A slot chosen more than once keeps the last record, as in Algorithm R.
+        # Fancy assignment does not guarantee which repeat wins.
+        _, last = np.unique(slots[::-1], return_index=True)
+        last = len(slots) - 1 - last
+        source[slots[last]] = rows[last]
+
+        reservoir = pd.concat([reservoir, batch]).iloc[source]
+        positions = np.concatenate([positions, stream_positions])[source]
+        seen += n
+
+    if reservoir is None:
+        return pd.DataFrame()
+
+    logger.info(f"Sampled {len(reservoir)} of {seen} records")
+    return reservoir.iloc[np.argsort(positions, kind="stable")]
+
+
+def iter_chunks(
+    batches,
+    text_column="article",
+    id_column="doc_id",
+    chunker=chunk_string_with_overlap,
+    **chunker_kwargs,
+):
+    """
+    Chunk a stream of record batches.
+
+    Parameters
+    ----------
+    batches : iterable of pandas.DataFrame
+        The record batches, e.g. from `iter_record_batches`.
+    text_column : str
+        The column holding the text to chunk.
+    id_column : str
+        The column holding the document id.
+    chunker : callable
+        Called as ``chunker(input_text=text, **chunker_kwargs)`` and returning
+        a list of chunk strings, e.g. `rag.chunking.chunk_string_with_overlap`.
+    **chunker_kwargs
+        Passed to `chunker`, e.g. ``chunk_length=400, overlap=50``.
+
+    Yields
+    ------
+    pandas.DataFrame
+        One DataFrame of ``doc_id``, ``chunk_id`` and ``chunks`` columns per
+        record batch, ready for `rag.retrieval.add_documents`.
+
+    Examples
+    --------
+    >>> batches = iter_record_batches("data/docs_subset.csv", batch_size=1000)
+    >>> for chunked in iter_chunks(batches, chunk_length=400, overlap=50):
+    ...     add_documents(index, chunked["chunks"].tolist(),
+    ...                   chunked["chunk_id"].tolist(), chunked["doc_id"].tolist())
+    """
+    for batch in batches:
+        doc_ids, chunk_ids, chunks = [], [], []
+        for doc_id, text in zip(batch[id_column], batch[text_column]):
+            if not isinstance(text, str):
+                continue
+            document_chunks = chunker(input_text=text, **chunker_kwargs)
+            chunks.extend(document_chunks)
+            doc_ids.extend([doc_id] * len(document_chunks))
+            chunk_ids.extend([f"{doc_id}-{i + 1}" for i in range(len(document_chunks))])
+        yield pd.DataFrame({"doc_id": doc_ids, "chunk_id": chunk_ids, "chunks": chunks})
@@ -0,0 +1,182 @@
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import pandas as pd
+from helper.logging import get_logger
+from helper.openai_utils import GenerationError, general_chat
+from helper.parsing import parse_qa_pairs
+from rag.data_prep import generate_qa_messages
+
+logger = get_logger(__name__)
+
+
+def _completed_doc_ids(path):
+    """Return the doc_ids already written to a JSONL file."""
+    doc_ids = set()
+    if not os.path.exists(path):
+        return doc_ids
+    with open(path) as f:
+        for line in f:
+            try:
+                doc_ids.add(json.loads(line)["doc_id"])
+            except (json.JSONDecodeError, KeyError):
+                # A torn final line from an interrupted run
+                continue
+    return doc_ids
+
+
+def _end_torn_line(path):
+    """Terminate a torn final line so that appended rows start on a new line."""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _generate(client, model, doc_id, article, temperature):
+    try:
+        response = general_chat(
+            client,
+            generate_qa_messages(article),
+            model=model,
+            temperature=temperature,
+            raise_errors=True,
+        )
+    except GenerationError as e:
+        logger.warning(f"Request for {doc_id} failed: {e}")
+        return doc_id, None, str(e)
+    return doc_id, response, None
+
+
+def synthesise_qa_pairs(
+    articles,
+    client,
+    model,
+    output_path="data/qa_pairs.jsonl",
+    quarantine_path="data/qa_pairs-quarantine.jsonl",
+    max_in_flight=8,
+    temperature=0.9,
+):
+    """
+    Generate question/answer pairs for many articles concurrently.
+
+    Requests run on a thread pool with at most `max_in_flight` outstanding at
+    a time. Every request shares the same static instruction prefix (see
+    `rag.data_prep.generate_qa_messages`), so the service can reuse its
+    prompt cache. Responses are parsed with a strict JSON parser: valid pairs
+    are appended to `output_path` as soon as each article completes, while
+    malformed items and failed requests are written to `quarantine_path`
+    instead of failing the run.
+
+    Articles with pairs already in `output_path` are skipped, so an
+    interrupted run can be resumed (retrying articles that only produced
+    rejects), and an existing set can be grown by passing more articles.
+
+    Parameters
+    ----------
+    articles : iterable of tuple of (str, str)
+        ``(doc_id, article)`` pairs. May be a generator.
+    client : openai.AzureOpenAI
+        The client to use.
+    model : str
+        The deployment to generate with.
+    output_path : str
+        The JSONL file to append ``doc_id``/``question``/``ground_truth`` rows to.
+    quarantine_path : str
+        The JSONL file to append rejected responses to.
+    max_in_flight : int
+        The maximum number of concurrent requests.
+    temperature : float
+        The sampling temperature.
+
+    Returns
+    -------
+    dict
+        Counts of the articles processed and skipped, and of the pairs written
+        and rejected.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least one")
+
+    completed = _completed_doc_ids(output_path)
+    _end_torn_line(output_path)
+    _end_torn_line(quarantine_path)
+    stats = dict.fromkeys(["articles", "skipped", "pairs", "rejected"], 0)
+
+    def record(output, quarantine, doc_id, response, error):
+        if error is None:
+            pairs, rejected = parse_qa_pairs(response)
+        else:
+            pairs, rejected = [], [{"fragment": None, "error": error}]
+        for pair in pairs:
+            row = {
+                "doc_id": doc_id,
+                "question": pair["question"],
+                "ground_truth": pair["answer"],
+            }
+            output.write(json.dumps(row) + "\n")
+        for item in rejected:
+            row = {"doc_id": doc_id, "error": item["error"], "raw": item["fragment"]}
+            quarantine.write(json.dumps(row, default=str) + "\n")
+        output.flush()
+        quarantine.flush()
+
+        stats["articles"] += 1
+        stats["pairs"] += len(pairs)
+        stats["rejected"] += len(rejected)
+
+    with open(output_path, "a") as output, open(
+        quarantine_path, "a"
+    ) as quarantine, ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = set()
+        for doc_id, article in articles:
+            if doc_id in completed:
+                stats["skipped"] += 1
+                continue
+
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(output, quarantine, *future.result())
+
+            in_flight.add(
+                executor.submit(_generate, client, model, doc_id, article, temperature)
+            )
+
+        for future in wait(in_flight).done:
+            record(output, quarantine, *future.result())
+
+    logger.info(
+        f"Generated {stats['pairs']} question/answer pairs from {stats['articles']} "
+        f"articles ({stats['rejected']} rejected, {stats['skipped']} skipped)"
+    )
+    return stats
+
+
+def export_qa_pairs(jsonl_path, csv_path, include_doc_id=False):
+    """
+    Convert the JSONL written by `synthesise_qa_pairs` to the evaluation CSV.
+
+    Parameters
+    ----------
+    jsonl_path : str
+        The JSONL file of generated pairs.
+    csv_path : str
+        Where to write the CSV with ``question`` and ``ground_truth`` columns.
+    include_doc_id : bool
+        Whether to keep the ``doc_id`` column.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The exported pairs.
+    """
+    df = pd.read_json(jsonl_path, lines=True)
+    columns = ["question", "ground_truth"]
+    if include_doc_id:
+        columns = ["doc_id"] + columns
+    df = df[columns].drop_duplicates(subset="question")
+    df.to_csv(csv_path, index=False)
+    return df
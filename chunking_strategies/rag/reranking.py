@@ -0,0 +1,214 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from helper.logging import get_logger
+from rag.augmentation import get_context
+from rag.embedding import length_buckets
+
+logger = get_logger(__name__)
+
+# Process-wide cache of loaded cross-encoders, as in rag.embedding
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+
+def _load_cross_encoder(model_name, device):
+    key = (model_name, device)
+    with _model_cache_lock:
+        if key not in _model_cache:
+            from sentence_transformers import CrossEncoder
+
+            logger.info(f"Loading cross-encoder {model_name}")
+            _model_cache[key] = CrossEncoder(model_name, device=device)
+        return _model_cache[key]
+
+
+class CrossEncoderReranker:
+    """
+    Scores (question, chunk) pairs with a cross-encoder, caching the scores.
+
+    Parameters
+    ----------
+    model_name : str
+        The sentence-transformers cross-encoder to use.
+    device : str
+        The torch device to run on.
+    max_tokens_per_batch : int
+        The padded token budget for each model call.
+    max_batch_size : int
+        The maximum number of pairs in each model call.
+    cache_size : int
+        The number of pair scores to keep, least recently used first out.
+    model : object, optional
+        A loaded model with ``predict(pairs)``, and optionally a
+        ``tokenizer``, used instead of loading `model_name`.
+    """
+
+    def __init__(
+        self,
+        model_name="cross-encoder/ms-marco-MiniLM-L-6-v2",
+        device="cpu",
+        max_tokens_per_batch=8192,
+        max_batch_size=64,
+        cache_size=100_000,
+        model=None,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._model = model
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(["hits", "misses", "batches"], 0)
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = _load_cross_encoder(self.model_name, self.device)
+        return self._model
+
+    @staticmethod
+    def key(question, passage):
+        digest = hashlib.sha1(question.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(passage.encode("utf-8"))
+        return digest.digest()
+
+    def token_lengths(self, pairs):
+        """Return the (truncated) token length of each pair."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return np.array([len(q.split()) + len(p.split()) for q, p in pairs])
+        encoded = tokenizer(
+            [question for question, _ in pairs],
+            [passage for _, passage in pairs],
+            truncation=False,
+        )["input_ids"]
+        max_length = getattr(self.model, "max_length", None) or 512
+        return np.minimum([len(ids) for ids in encoded], max_length)
+
+    def score_pairs(self, pairs):
+        """
+        Score (question, passage) pairs.
+
+        Parameters
+        ----------
+        pairs : list of tuple of (str, str)
+            The pairs to score. May span many questions.
+
+        Returns
+        -------
+        numpy.ndarray
+            The relevance score of each pair; higher is more relevant.
+        """
+        keys = [self.key(question, passage) for question, passage in pairs]
+        scores = np.empty(len(pairs), dtype=np.float32)
+        missing = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[position] = self._cache[key]
+                else:
+                    missing.setdefault(key, []).append(position)
+            self.stats["hits"] += len(pairs) - sum(map(len, missing.values()))
+            self.stats["misses"] += sum(map(len, missing.values()))
+
+        if not missing:
+            return scores
+
+        # Each distinct uncached pair is scored once
+        unique = [pairs[positions[0]] for positions in missing.values()]
+        computed = np.empty(len(unique), dtype=np.float32)
+        batches = length_buckets(
+            self.token_lengths(unique),
+            max_tokens_per_batch=self.max_tokens_per_batch,
+            max_batch_size=self.max_batch_size,
+        )
+        for batch in batches:
+            computed[batch] = np.asarray(
+                self.model.predict([unique[i] for i in batch]), dtype=np.float32
+            ).reshape(-1)
+
+        with self._lock:
+            self.stats["batches"] += len(batches)
+            for (key, positions), score in zip(missing.items(), computed):
+                scores[positions] = score
+                self._cache[key] = float(score)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, question, passages, top_n=5):
+        """
+        Order passages by relevance to a question.
+
+        Returns
+        -------
+        list of tuple of (str, float)
+            The `top_n` most relevant passages and their scores, best first.
+        """
+        if not passages:
+            return []
+        scores = self.score_pairs([(question, passage) for passage in passages])
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(passages[i], float(scores[i])) for i in order]
+
+    def rerank_many(self, questions, passages, top_n=5):
+        """
+        Rerank the candidates of many questions in one scoring pass.
+
+        Pairs from every question share the length buckets, so batches stay
+        full even when each question has few candidates.
+
+        Returns
+        -------
+        list of list of str
+            The `top_n` passages of each question, best first.
+        """
+        pairs = [
+            (question, passage)
+            for question, candidates in zip(questions, passages)
+            for passage in candidates
+        ]
+        scores = self.score_pairs(pairs)
+        reranked, offset = [], 0
+        for candidates in passages:
+            own = scores[offset : offset + len(candidates)]
+            order = np.argsort(-own, kind="stable")[:top_n]
+            reranked.append([candidates[i] for i in order])
+            offset += len(candidates)
+        return reranked
+
+
+def get_reranked_context(question, index, reranker, candidates=20, top_n=5):
+    """
+    Retrieve a wide candidate set and keep only the best reranked chunks.
+
+    A drop-in for `rag.augmentation.get_context`, whose output can go straight
+    to `rag.augmentation.contruct_prompt`.
+
+    Parameters
+    ----------
+    question : str
+        The question to retrieve context for.
+    index : chromadb.Collection
+        The collection to query.
+    reranker : CrossEncoderReranker
+        Scores the candidates.
+    candidates : int
+        The number of chunks to retrieve before reranking.
+    top_n : int
+        The number of chunks to return.
+
+    Returns
+    -------
+    list of str
+        The `top_n` chunks, most relevant first.
+    """
+    passages = get_context(question, index, top_k=max(candidates, top_n))
+    return [passage for passage, _ in reranker.rerank(question, passages, top_n)]
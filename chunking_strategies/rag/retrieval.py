@@ -1,48 +1,157 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv, find_dotenv
-import chromadb.utils.embedding_functions as embedding_functions
-from helper.logging import logger
+from helper.logging import get_logger
+from rag.cache import bump_collection_version
 
-load_dotenv(find_dotenv())
+logger = get_logger(__name__)
 
-logger = logger()
 
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_type="azure",
-    api_version=os.getenv("OPENAI_API_VERSION"),
-    model_name="text-embedding-ada-002",
-)
+@lru_cache(maxsize=None)
+def get_openai_embedding_function():
+    """
+    Create the Azure OpenAI embedding function on first use.
+
+    The function (and the .env lookup) is cached per process, so importing
+    this module stays cheap and does not need credentials or a network.
+    """
+    import chromadb.utils.embedding_functions as embedding_functions
+
+    load_dotenv(find_dotenv())
+
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_type="azure",
+        api_version=os.getenv("OPENAI_API_VERSION"),
+        model_name="text-embedding-ada-002",
+    )
+
+
+def __getattr__(name):
+    # `openai_ef` used to be created at import time
+    if name == "openai_ef":
+        return get_openai_embedding_function()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def hnsw_metadata(construction_ef=None, search_ef=None, M=None, num_threads=None):
+    """
+    Build the Chroma collection metadata for HNSW index parameters.
+
+    Parameters
+    ----------
+    construction_ef : int, optional
+        The candidate list size while building. Higher builds a better graph,
+        more slowly.
+    search_ef : int, optional
+        The candidate list size while querying. Higher raises recall and
+        query latency.
+    M : int, optional
+        The number of neighbours per node. Higher raises recall, memory and
+        build time.
+    num_threads : int, optional
+        The number of threads used to build the index.
+
+    Returns
+    -------
+    dict
+        The ``hnsw:*`` keys of the parameters that were given.
+    """
+    parameters = {
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+        "hnsw:M": M,
+        "hnsw:num_threads": num_threads,
+    }
+    return {key: int(value) for key, value in parameters.items() if value is not None}
 
 
 def create_index(
-    client, index_name, embedding_function, metadata={"hnsw:space": "cosine"}
+    client,
+    index_name,
+    embedding_function,
+    metadata={"hnsw:space": "cosine"},
+    construction_ef=None,
+    search_ef=None,
+    M=None,
+    num_threads=None,
 ):
+    """
+    Create a collection, optionally setting its HNSW parameters.
+
+    Parameters left as None keep Chroma's defaults. See `hnsw_metadata`, and
+    `rag.hnsw_tuning.tune_hnsw` to pick them for a recall target.
+    """
+    metadata = {
+        **metadata,
+        **hnsw_metadata(construction_ef, search_ef, M, num_threads),
+    }
     index = client.create_collection(
         name=index_name, embedding_function=embedding_function, metadata=metadata
     )
-    logger.info(f"Created index: {index_name}")
+    logger.info(f"Created index: {index_name} ({metadata})")
     return index
 
 
-def add_documents(index, chunks, chunk_ids, doc_ids, embeddings=None):
+def add_documents(
+    index,
+    chunks,
+    chunk_ids,
+    doc_ids,
+    embeddings=None,
+    offsets=None,
+    dedup_threshold=None,
+):
+    """
+    Add chunks to the index, optionally with pre-generated embeddings.
+
+    `offsets` is an optional list of (start, end) word offsets per chunk (see
+    `rag.chunking.chunk_string_with_offsets`). They are stored in the chunk
+    metadata so `rag.augmentation.pack_context` can merge overlapping hits.
+
+    If `dedup_threshold` is set, near-duplicate chunks (estimated Jaccard
+    similarity of word shingles at or above the threshold, see
+    `rag.dedup.deduplicate_chunks`) are collapsed before embedding. The kept
+    chunk records every source document in its ``source_doc_ids`` metadata,
+    as a comma-separated string.
+    """
+    metadatas = [{"doc_id": doc_id} for doc_id in doc_ids]
+    if offsets is not None:
+        for metadata, (start, end) in zip(metadatas, offsets):
+            metadata["start"] = int(start)
+            metadata["end"] = int(end)
+
+    if dedup_threshold is not None:
+        from rag.dedup import deduplicate_chunks
+
+        keep, source_doc_ids = deduplicate_chunks(
+            chunks, doc_ids, threshold=dedup_threshold
+        )
+        chunks = [chunks[i] for i in keep]
+        chunk_ids = [chunk_ids[i] for i in keep]
+        metadatas = [metadatas[i] for i in keep]
+        if embeddings is not None:
+            embeddings = [embeddings[i] for i in keep]
+        for metadata, sources in zip(metadatas, source_doc_ids):
+            metadata["source_doc_ids"] = ",".join(str(s) for s in sources)
 
     if embeddings is None:
-        logger.info("Generating embeddings on load. Please be patient")
+        logger.info("Generating embeddings for %d chunks on load", len(chunks))
         index.add(
             documents=chunks,
-            metadatas=[{"doc_id": doc_id} for doc_id in doc_ids],
+            metadatas=metadatas,
             ids=chunk_ids,
         )
 
     else:
-        logger.info("Adding pre-generated embeddings")
+        logger.info("Adding %d pre-generated embeddings", len(chunks))
         index.add(
             embeddings=embeddings,
             documents=chunks,
-            metadatas=[{"doc_id": doc_id} for doc_id in doc_ids],
+            metadatas=metadatas,
             ids=chunk_ids,
         )
 
+    bump_collection_version(index)
     return None
@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from collections import deque
+import numpy as np
+from helper.logging import get_logger
+
+logger = get_logger(__name__)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Server Error"}
+
+
+def _fail(batch, error):
+    for _, _, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
+
+class RetrievalServer:
+    """
+    Serve batched retrieval over HTTP.
+
+    The first request of a batch waits up to `batch_window` seconds for
+    others, then the whole batch is embedded and searched with one call each.
+    ``POST /query`` takes ``{"question": str, "top_k": int}`` and returns the
+    ``contexts``, ``ids``, ``metadatas`` and ``distances``. ``GET /health`` and
+    ``GET /stats`` report liveness and the request, batch and latency counters.
+
+    Parameters
+    ----------
+    index : chromadb.Collection or rag.sharding.ShardedIndex
+        The index to search.
+    embedding_function : callable, optional
+        Embeds a list of questions in one call. If not given, the index embeds
+        the query texts itself (still once per batch).
+    host : str
+        The interface to listen on.
+    port : int
+        The port to listen on. 0 picks a free port (see `port` once started).
+    max_batch_size : int
+        The maximum number of questions per batch.
+    batch_window : float
+        How long, in seconds, the first request of a batch waits for more.
+    default_top_k : int
+        The number of results when a request does not give ``top_k``.
+    """
+
+    def __init__(
+        self,
+        index,
+        embedding_function=None,
+        host="127.0.0.1",
+        port=8765,
+        max_batch_size=64,
+        batch_window=0.005,
+        default_top_k=5,
+    ):
+        self.index = index
+        self.embedding_function = embedding_function
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.default_top_k = default_top_k
+
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._started = None
+        self._latencies = deque(maxlen=10_000)
+        self._counts = dict.fromkeys(["requests", "questions", "batches", "errors"], 0)
+
+    def search_batch(self, questions, top_k):
+        """Embed and search a batch of questions with one call each."""
+        if self.embedding_function is None:
+            return self.index.query(query_texts=questions, n_results=top_k)
+        embeddings = self.embedding_function(questions)
+        return self.index.query(query_embeddings=embeddings, n_results=top_k)
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            questions = [question for question, _, _ in batch]
+            top_k = max(top_k for _, top_k, _ in batch)
+            self._counts["batches"] += 1
+            self._counts["questions"] += len(batch)
+            try:
+                # The search blocks, so it runs off the event loop
+                results = await loop.run_in_executor(
+                    None, self.search_batch, questions, top_k
+                )
+                responses = [
+                    {
+                        "contexts": results["documents"][position][:k],
+                        "ids": results["ids"][position][:k],
+                        "metadatas": results["metadatas"][position][:k],
+                        "distances": results["distances"][position][:k],
+                    }
+                    for position, (_, k, _) in enumerate(batch)
+                ]
+            except asyncio.CancelledError:
+                _fail(batch, RuntimeError("The server was stopped"))
+                raise
+            except Exception as error:
+                logger.error(f"Batch of {len(batch)} questions failed: {error}")
+                _fail(batch, error)
+                continue
+
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    async def query(self, question, top_k=None):
+        """Queue a question for the next batch and wait for its results."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((question, top_k or self.default_top_k, future))
+        return await future
+
+    def stats(self):
+        latencies = np.array(self._latencies) * 1000
+        batches = self._counts["batches"]
+        stats = {
+            **self._counts,
+            "mean_batch_size": self._counts["questions"] / batches if batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "uptime_s": time.perf_counter() - self._started if self._started else 0.0,
+        }
+        for percentile in (50, 95, 99):
+            stats[f"p{percentile}_ms"] = (
+                float(np.percentile(latencies, percentile)) if len(latencies) else None
+            )
+        return stats
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method == "POST" and path == "/query":
+            try:
+                request = json.loads(body or b"{}")
+                question = request["question"]
+                top_k = int(request.get("top_k", self.default_top_k))
+            except (ValueError, KeyError, TypeError) as error:
+                return 400, {"error": f"Invalid query: {error}"}
+            if not isinstance(question, str) or top_k < 1:
+                return 400, {"error": "question must be a string and top_k >= 1"}
+
+            start = time.perf_counter()
+            self._counts["requests"] += 1
+            try:
+                response = await self.query(question, top_k)
+            except Exception as error:
+                self._counts["errors"] += 1
+                return 500, {"error": str(error)}
+            self._latencies.append(time.perf_counter() - start)
+            return 200, response
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, path, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                        "\r\n"
+                    ).encode()
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Start listening and batching. Returns once the server is ready."""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.perf_counter()
+        logger.info(f"Retrieval server listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop listening, stop batching and fail any questions still queued."""
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        queued = []
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+        _fail(queued, RuntimeError("The server was stopped"))
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def run(self):
+        """Serve until interrupted."""
+        asyncio.run(self.serve_forever())
+
+
+def query_server(question, top_k=5, url="http://127.0.0.1:8765", timeout=30):
+    """
+    Query a running `RetrievalServer`.
+
+    Returns
+    -------
+    dict
+        The ``contexts``, ``ids``, ``metadatas`` and ``distances`` of the hits.
+    """
+    request = urllib.request.Request(
+        f"{url}/query",
+        data=json.dumps({"question": question, "top_k": top_k}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a Chroma collection")
+    parser.add_argument("--path", default="./data/chroma_db")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--local-model",
+        help="Embed with this sentence-transformers model instead of Azure OpenAI",
+    )
+    args = parser.parse_args()
+
+    from chromadb import PersistentClient
+
+    if args.local_model:
+        from rag.embedding import get_local_embedder
+
+        embedding_function = get_local_embedder(args.local_model)
+    else:
+        from rag.retrieval import get_openai_embedding_function
+
+        embedding_function = get_openai_embedding_function()
+
+    index = PersistentClient(path=args.path).get_collection(
+        name=args.collection, embedding_function=embedding_function
+    )
+    RetrievalServer(
+        index,
+        embedding_function=embedding_function,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        batch_window=args.batch_window_ms / 1000,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
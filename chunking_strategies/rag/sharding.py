@@ -0,0 +1,258 @@
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from helper.logging import get_logger
+from rag.cache import bump_collection_version
+from rag.retrieval import create_index
+
+logger = get_logger(__name__)
+
+DEFAULT_INCLUDE = ("metadatas", "documents", "distances")
+
+
+def shard_for(doc_id, num_shards):
+    """Return the shard of a document (stable across processes and runs)."""
+    return zlib.crc32(str(doc_id).encode()) % num_shards
+
+
+class ShardedIndex:
+    """
+    A set of Chroma collections queried as one index.
+
+    Parameters
+    ----------
+    shards : list of chromadb.Collection
+        The shard collections, in shard order.
+    name : str
+        The name of the sharded index.
+    embedding_function : callable, optional
+        Used to embed query texts once for all shards. If not given, each
+        shard embeds the query texts with its own embedding function.
+    max_workers : int, optional
+        The number of threads used for fan-out. Defaults to one per shard.
+
+    Examples
+    --------
+    The fan-out threads are released by `close`, or on leaving a ``with``
+    block:
+
+    >>> with get_sharded_index(client, "papers", openai_ef) as index:
+    ...     results = index.query(query_texts=[question], n_results=5)
+    """
+
+    def __init__(self, shards, name, embedding_function=None, max_workers=None):
+        if not shards:
+            raise ValueError("A sharded index needs at least one shard")
+        self.shards = list(shards)
+        self.name = name
+        self.embedding_function = embedding_function
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards),
+            thread_name_prefix=f"{name}-shard",
+        )
+
+    def close(self):
+        """Shut down the fan-out threads. The index cannot be used afterwards."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    def _map(self, function, *iterables):
+        return list(self._executor.map(function, *iterables))
+
+    def count(self):
+        return sum(self._map(lambda shard: shard.count(), self.shards))
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        """
+        Partition chunks by the hash of their ``doc_id`` metadata and add
+        each partition to its shard concurrently.
+        """
+        if metadatas is None:
+            raise ValueError("Sharded indexes need a doc_id in every metadata")
+
+        partitions = [[] for _ in self.shards]
+        for position, metadata in enumerate(metadatas):
+            partitions[shard_for(metadata["doc_id"], self.num_shards)].append(position)
+
+        def add_partition(shard, positions):
+            if not positions:
+                return
+            kwargs = {
+                "ids": [ids[i] for i in positions],
+                "metadatas": [metadatas[i] for i in positions],
+            }
+            if documents is not None:
+                kwargs["documents"] = [documents[i] for i in positions]
+            if embeddings is not None:
+                kwargs["embeddings"] = [embeddings[i] for i in positions]
+            shard.add(**kwargs)
+
+        self._map(add_partition, self.shards, partitions)
+        bump_collection_version(self)
+        logger.info(
+            f"Added {len(ids)} chunks to {self.name} across {self.num_shards} shards"
+        )
+
+    def query(
+        self,
+        query_texts=None,
+        query_embeddings=None,
+        n_results=10,
+        where=None,
+        include=DEFAULT_INCLUDE,
+    ):
+        """
+        Query every shard concurrently and merge the per-shard top-k hits.
+
+        Takes the same arguments as ``chromadb.Collection.query`` and returns
+        results in the same shape: a dict of lists with one entry per query,
+        each ordered by increasing distance.
+        """
+        if (query_texts is None) == (query_embeddings is None):
+            raise ValueError("Pass exactly one of query_texts or query_embeddings")
+
+        if query_texts is not None and self.embedding_function is not None:
+            # Embed once rather than once per shard
+            query_embeddings = self.embedding_function(query_texts)
+            query_texts = None
+
+        include = list(include)
+        if "distances" not in include:
+            include.append("distances")
+
+        def query_shard(shard):
+            return shard.query(
+                query_texts=query_texts,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                include=include,
+            )
+
+        shard_results = self._map(query_shard, self.shards)
+        return merge_results(shard_results, n_results, include)
+
+
+def merge_results(shard_results, n_results, include=DEFAULT_INCLUDE):
+    """
+    Merge Chroma query results from several shards into one top-k result.
+
+    Parameters
+    ----------
+    shard_results : list of dict
+        The ``Collection.query`` result of each shard, including distances.
+    n_results : int
+        The number of hits to keep per query.
+    include : sequence of str
+        The result fields to merge besides ``ids`` and ``distances``.
+
+    Returns
+    -------
+    dict
+        A Chroma-shaped result with the `n_results` nearest hits per query.
+    """
+    fields = ["ids", "distances"] + [field for field in include if field != "distances"]
+    num_queries = len(shard_results[0]["ids"])
+    merged = {field: [] for field in fields}
+
+    for query in range(num_queries):
+        hits = heapq.nsmallest(
+            n_results,
+            (
+                (distance, shard, rank)
+                for shard, result in enumerate(shard_results)
+                for rank, distance in enumerate(result["distances"][query])
+            ),
+        )
+        for field in fields:
+            merged[field].append(
+                [shard_results[shard][field][query][rank] for _, shard, rank in hits]
+            )
+
+    return merged
+
+
+def _shard_name(index_name, shard):
+    return f"{index_name}-shard-{shard}"
+
+
+def _clients_for(client, num_shards):
+    clients = client if isinstance(client, (list, tuple)) else [client] * num_shards
+    if len(clients) != num_shards:
+        raise ValueError(f"Expected {num_shards} clients, got {len(clients)}")
+    return clients
+
+
+def create_sharded_index(
+    client,
+    index_name,
+    embedding_function,
+    num_shards=4,
+    metadata={"hnsw:space": "cosine"},
+    max_workers=None,
+    **hnsw_parameters,
+):
+    """
+    Create a sharded index of `num_shards` collections.
+
+    Parameters
+    ----------
+    client : chromadb.Client or list of chromadb.Client
+        The client to create every shard in, or one client per shard (e.g.
+        `PersistentClient` instances with separate paths, to spread the
+        index files across disks).
+    index_name : str
+        The name of the index. Shards are named ``{index_name}-shard-{i}``.
+    embedding_function : callable
+        The embedding function of every shard.
+    num_shards : int
+        The number of shards.
+    metadata : dict
+        The collection metadata of every shard.
+    max_workers : int, optional
+        The number of threads used for fan-out. Defaults to one per shard.
+    **hnsw_parameters
+        HNSW parameters of every shard (``construction_ef``, ``search_ef``,
+        ``M``, ``num_threads``), passed to `rag.retrieval.create_index`.
+
+    Returns
+    -------
+    ShardedIndex
+        The new index.
+    """
+    clients = _clients_for(client, num_shards)
+    shards = [
+        create_index(
+            shard_client,
+            _shard_name(index_name, shard),
+            embedding_function,
+            metadata,
+            **hnsw_parameters,
+        )
+        for shard, shard_client in enumerate(clients)
+    ]
+    return ShardedIndex(shards, index_name, embedding_function, max_workers)
+
+
+def get_sharded_index(
+    client, index_name, embedding_function, num_shards=4, max_workers=None
+):
+    """Open an existing sharded index (see `create_sharded_index`)."""
+    clients = _clients_for(client, num_shards)
+    shards = [
+        shard_client.get_collection(
+            name=_shard_name(index_name, shard),
+            embedding_function=embedding_function,
+        )
+        for shard, shard_client in enumerate(clients)
+    ]
+    return ShardedIndex(shards, index_name, embedding_function, max_workers)
@@ -0,0 +1,71 @@
+import pytest
+from rag.augmentation import construct_packed_prompt, contruct_prompt, pack_context
+from rag.chunking import chunk_string_with_offsets
+
+
+def word_count(text):
+    return len(text.split())
+
+
+@pytest.fixture
+def setup_hits():
+    article = " ".join(f"word{i}" for i in range(100))
+    chunks = chunk_string_with_offsets(article, chunk_length=40, overlap=10)
+    hits = [
+        {"text": text, "doc_id": "doc-1", "start": start, "end": end}
+        for text, start, end in chunks
+    ]
+    return article, hits
+
+
+def test_chunk_string_with_offsets(setup_hits):
+    article, hits = setup_hits
+    words = article.split()
+    for hit in hits:
+        assert hit["text"] == " ".join(words[hit["start"] : hit["end"]])
+
+
+def test_pack_context_merges_overlapping_hits(setup_hits):
+    article, hits = setup_hits
+    packed = pack_context(hits[::-1], token_budget=1000, token_counter=word_count)
+    assert packed == [article]
+
+
+def test_pack_context_merges_hits_without_offsets(setup_hits):
+    article, hits = setup_hits
+    texts = [hit["text"] for hit in hits]
+    packed = pack_context(texts, token_budget=1000, token_counter=word_count)
+    assert packed == [article]
+
+
+def test_pack_context_drops_duplicates():
+    text = "the quick brown fox jumps over the lazy dog " * 5
+    hits = [
+        {"text": text, "doc_id": "a", "start": None, "end": None},
+        {"text": text.upper(), "doc_id": "b", "start": None, "end": None},
+        {"text": text + "again", "doc_id": "c", "start": None, "end": None},
+    ]
+    packed = pack_context(hits, token_budget=1000, token_counter=word_count)
+    assert packed == [text.strip()]
+
+
+def test_pack_context_respects_budget_and_order():
+    hits = [
+        {"text": f"doc{i} " * 30, "doc_id": f"doc{i}", "start": 0, "end": 30}
+        for i in range(5)
+    ]
+    packed = pack_context(hits, token_budget=70, token_counter=word_count)
+    assert [passage.split()[0] for passage in packed] == ["doc0", "doc1"]
+
+
+def test_packed_prompt_is_shorter(setup_hits):
+    _, hits = setup_hits
+    texts = [hit["text"] for hit in hits]
+    unpacked = construct_packed_prompt(texts, "question?")
+    packed = construct_packed_prompt(
+        pack_context(hits, token_budget=1000, token_counter=word_count), "question?"
+    )
+    assert word_count(packed) < word_count(unpacked)
+    assert "\n\n".join(texts) in unpacked
+    # Existing experiments interpolate the list of chunks unchanged
+    assert str(texts) in contruct_prompt(texts, "question?")
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+import rag.cache as cache_module
+from rag.cache import SemanticCache, bump_collection_version, collection_fingerprint
+
+VOCABULARY = ["aspirin", "fever", "dose", "heart", "blood", "pressure", "child"]
+
+
+def bag_of_words(texts):
+    return [
+        [text.split().count(word) + 0.01 * i for i, word in enumerate(VOCABULARY)]
+        for text in texts
+    ]
+
+
+class FakeCollection:
+    def __init__(self, name="papers", size=10):
+        self.name = name
+        self.size = size
+
+    def count(self):
+        return self.size
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def setup_data(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    monkeypatch.setattr(cache_module, "_collection_versions", {})
+    return clock
+
+
+def test_lookup_by_similarity_and_model(setup_data):
+    cache = SemanticCache(bag_of_words, threshold=0.9)
+    cache.store("aspirin fever dose", ["ctx"], "answer", model="gpt-4")
+    entry = cache.lookup("aspirin dose fever", model="gpt-4")
+    assert entry["answer"] == "answer" and entry["similarity"] > 0.99
+    assert cache.lookup("heart blood pressure", model="gpt-4") is None
+    assert cache.lookup("aspirin fever dose", model="gpt-35-turbo") is None
+    assert cache.stats == {
+        "hits": 1,
+        "misses": 2,
+        "evictions": 0,
+        "expirations": 0,
+        "invalidations": 0,
+        "entries": 1,
+        "hit_rate": 1 / 3,
+    }
+
+
+def test_lru_eviction(setup_data):
+    cache = SemanticCache(bag_of_words, threshold=0.99, max_entries=2)
+    cache.store("aspirin", [], "a")
+    cache.store("fever", [], "b")
+    assert cache.lookup("aspirin")["answer"] == "a"
+    cache.store("heart", [], "c")
+    assert cache.lookup("fever") is None
+    assert cache.lookup("aspirin")["answer"] == "a"
+    assert cache.lookup("heart")["answer"] == "c"
+    assert cache.stats["evictions"] == 1 and cache.stats["entries"] == 2
+
+
+def test_ttl_expiry_is_swept(setup_data):
+    clock = setup_data
+    cache = SemanticCache(bag_of_words, threshold=0.99, ttl=60)
+    cache.store("aspirin", [], "a")
+    cache.store("fever", [], "b")
+    clock.now += 30
+    cache.store("heart", [], "c")
+    assert cache.lookup("aspirin")["answer"] == "a"
+
+    clock.now += 45
+    cache.store("blood", [], "d")
+    assert cache.stats["expirations"] == 2
+    assert cache.stats["entries"] == 2
+    assert cache.lookup("aspirin") is None
+    assert cache.lookup("heart")["answer"] == "c"
+
+
+def test_invalidation_on_writes(setup_data):
+    cache = SemanticCache(bag_of_words, threshold=0.99)
+    collection = FakeCollection()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ["ctx"], f"answer {len(calls)}"
+
+    assert cache.get_or_compute("aspirin", compute, collection)[1] == "answer 1"
+    assert cache.get_or_compute("aspirin", compute, collection)[1] == "answer 1"
+
+    # An update or upsert leaves the count unchanged
+    fingerprint = collection_fingerprint(collection)
+    bump_collection_version(collection)
+    assert collection_fingerprint(collection) != fingerprint
+    assert cache.get_or_compute("aspirin", compute, collection)[1] == "answer 2"
+
+    collection.size += 1
+    assert cache.get_or_compute("aspirin", compute, collection)[1] == "answer 3"
+    assert cache.stats["invalidations"] == 2
+
+    # Failed generations are not cached
+    assert cache.get_or_compute("fever", lambda: ([], None), collection) == ([], None)
+    assert cache.lookup("fever") is None
+
+
+def test_zero_embedding_is_never_a_hit(setup_data):
+    cache = SemanticCache(lambda texts: [[0.0] * 3 for _ in texts], threshold=0.5)
+    embedding = cache.embed("anything")
+    assert not np.isnan(embedding).any()
+    cache.store("anything", ["context"], "answer", embedding=embedding)
+    assert cache.lookup("anything else") is None
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from rag.compression import (
+    CompressedIndex,
+    PCAReducer,
+    dequantize,
+    exact_search,
+    quantize,
+    recall_at_k,
+    recall_report,
+)
+
+
+@pytest.fixture
+def setup_data():
+    rng = np.random.default_rng(0)
+    # Low-rank structure plus noise, like real embeddings
+    basis = rng.normal(size=(32, 256))
+    embeddings = rng.normal(size=(2000, 32)) @ basis + 0.1 * rng.normal(
+        size=(2000, 256)
+    )
+    queries = embeddings[:50] + 0.5 * rng.normal(size=(50, 256))
+    return embeddings.astype(np.float32), queries.astype(np.float32)
+
+
+def test_quantize_round_trip(setup_data):
+    embeddings, _ = setup_data
+    codes, scales = quantize(embeddings, "int8")
+    assert codes.dtype == np.int8
+    error = np.abs(dequantize(codes, scales) - embeddings).max(axis=1)
+    assert np.all(error <= scales / 2 + 1e-6)
+
+
+def test_compressed_search_recall(setup_data):
+    embeddings, queries = setup_data
+    expected, expected_scores = exact_search(embeddings, queries, k=10)
+
+    index = CompressedIndex(embeddings, PCAReducer(64), dtype="int8")
+    assert index.nbytes * 12 < embeddings.nbytes
+    found, scores = index.search(queries, k=10)
+    assert recall_at_k(found, expected) > 0.95
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+    full, full_scores = CompressedIndex(embeddings, dtype="float32").search(queries, 10)
+    assert recall_at_k(full, expected) == 1
+    assert np.allclose(full_scores, expected_scores, atol=1e-5)
+
+
+def test_blockwise_search_matches_a_single_block(setup_data):
+    embeddings, queries = setup_data
+    single = CompressedIndex(embeddings, dtype="int8", rescore=False)
+    blocked = CompressedIndex(embeddings, dtype="int8", rescore=False, block_size=64)
+    found, scores = single.search(queries, k=10)
+    blocked_found, blocked_scores = blocked.search(queries, k=10)
+    np.testing.assert_allclose(blocked_scores, scores, rtol=1e-5)
+    assert recall_at_k(blocked_found, found) == 1
+    assert blocked.search(queries[:2], k=5000)[0].shape == (2, 2000)
+
+
+def test_recall_report(setup_data):
+    embeddings, queries = setup_data
+    report = recall_report(embeddings, queries, k=5, dimensions=(None, 64))
+    assert len(report) == 6
+    assert report["compression"].max() == pytest.approx(256 * 4 / (64 + 4))
+    assert (report["recall@5"] > 0.9).all()
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from helper.tokenization import sentences, whitespace_spans, words
+from rag.chunking import (
+    chunk_sentences,
+    chunk_string_with_offsets,
+    chunk_string_with_overlap,
+    chunk_tokens,
+)
+from rag.corpus import CorpusIndex
+from topic.processing import _calculate_topic_densities
+from topic.vector_processing import split_and_reconstitute
+
+
+@pytest.fixture
+def setup_data(tmp_path):
+    rng = np.random.default_rng(0)
+    vocabulary = ["fever", "aspirin", "dose", "the", "patients", "5,984", "fig ."]
+    documents = []
+    for i in range(5):
+        text = " .\n".join(
+            " ".join(rng.choice(vocabulary, size=rng.integers(3, 20)))
+            for _ in range(rng.integers(1, 15))
+        )
+        documents.append((f"doc{i}", text))
+    documents.append(("empty", ""))
+    documents.append(("doc0", "a duplicate"))
+    # tiktoken needs its encoding files, so whitespace tokens stand in here
+    corpus = CorpusIndex.build(
+        str(tmp_path / "corpus"), documents, tokenizers={"tokens": whitespace_spans}
+    )
+    return corpus, dict(documents[:-1])
+
+
+def test_corpus_spans_match_tokenizers(setup_data):
+    corpus, documents = setup_data
+    assert len(corpus) == 6
+    assert corpus.kinds == ("sentences", "words", "whitespace", "tokens")
+    for doc_id, text in documents.items():
+        assert corpus.get(doc_id) == text
+        assert corpus.sentences(doc_id) == sentences(text)
+        assert corpus.words(doc_id) == words(text)
+        np.testing.assert_array_equal(
+            corpus.spans(doc_id, "whitespace"), whitespace_spans(text).reshape(-1, 2)
+        )
+
+    reopened = CorpusIndex(corpus.path)
+    assert reopened.words("doc3") == corpus.words("doc3")
+    with pytest.raises(ValueError):
+        CorpusIndex.build(corpus.path + "2", [], kinds=["letters"])
+
+
+def test_chunkers_from_stored_spans(setup_data):
+    corpus, documents = setup_data
+    for doc_id, text in documents.items():
+        assert corpus.chunk(doc_id, "words", 12, 3) == chunk_string_with_offsets(
+            text, 12, 3
+        )
+        assert corpus.chunk(doc_id, "sentences", 25, 1) == chunk_sentences(text, 25, 1)
+        assert corpus.chunk(doc_id, "tokens", 12, 3) == chunk_tokens(
+            text, 12, 3, token_offsets=whitespace_spans(text)
+        )
+        assert chunk_string_with_overlap(
+            text, 12, 3, word_offsets=corpus.spans(doc_id, "whitespace")
+        ) == chunk_string_with_overlap(text, 12, 3)
+
+    chunked = corpus.chunk_corpus("words", 12, 3)
+    assert list(chunked.columns) == ["doc_id", "chunk_id", "chunks", "start", "end"]
+    assert chunked["chunk_id"].is_unique
+    with pytest.raises(ValueError):
+        corpus.chunk("doc1", "paragraphs", 10)
+
+
+def test_legacy_chunkers_from_stored_spans(setup_data):
+    corpus, documents = setup_data
+    topics = {"medicine": ["aspirin", "dose", "fever"]}
+    text = documents["doc1"]
+    direct = _calculate_topic_densities(text, topics, doc_id="doc1", tokenizer=words)
+    stored = _calculate_topic_densities(
+        None, topics, doc_id="doc1", words=corpus.words("doc1")
+    )
+    columns = ["substring_start", "substring_end", "l2_norm"]
+    assert [s[columns].tolist() for s in direct] == [
+        s[columns].tolist() for s in stored
+    ]
+
+    strings = [documents["doc1"], documents["doc2"]]
+    direct = split_and_reconstitute(strings, 1, 3, 1, tokenizer=sentences)
+    stored = split_and_reconstitute(
+        strings, 1, 3, 1, sentences=[corpus.sentences("doc1"), corpus.sentences("doc2")]
+    )
+    assert direct["string"].tolist() == stored["string"].tolist()
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from rag.dedup import deduplicate_chunks, minhash_signatures, near_duplicate_clusters
+
+
+@pytest.fixture
+def setup_data():
+    base = " ".join(f"token{i}" for i in range(200))
+    near = base.replace("token100", "changed")
+    other = " ".join(f"other{i}" for i in range(200))
+    return [base, other, near, base, "short text"], ["a", "b", "c", "d", "e"]
+
+
+def test_minhash_signatures_shape_and_determinism(setup_data):
+    texts, _ = setup_data
+    first = minhash_signatures(texts, num_perm=64, max_shingles_per_batch=300)
+    second = minhash_signatures(texts, num_perm=64)
+    assert first.shape == (len(texts), 64)
+    assert np.array_equal(first, second)
+    assert np.array_equal(first[0], first[3])
+
+
+def test_near_duplicate_clusters(setup_data):
+    texts, _ = setup_data
+    representatives = near_duplicate_clusters(texts, threshold=0.8)
+    assert representatives.tolist() == [0, 1, 0, 0, 4]
+
+
+def test_deduplicate_chunks_keeps_source_doc_ids(setup_data):
+    texts, doc_ids = setup_data
+    keep, source_doc_ids = deduplicate_chunks(texts, doc_ids, threshold=0.8)
+    assert keep.tolist() == [0, 1, 4]
+    assert source_doc_ids == [["a", "c", "d"], ["b"], ["e"]]
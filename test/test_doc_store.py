@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import rag.doc_store as doc_store
+from helper.tokenization import sentence_spans
+from rag.chunking import chunk_string_with_offsets
+from rag.doc_store import (
+    DocStore,
+    add_child_chunks,
+    child_spans,
+    expand_hits,
+    parent_span,
+)
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.calls = []
+
+    def add(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+@pytest.fixture
+def setup_data(tmp_path):
+    article = "\n".join(
+        " ".join(f"w{p}_{i}" for i in range(30)) + " ." for p in range(5)
+    )
+    documents = [("a", article), ("b", "café naïve ünïcode text"), ("a", "dup")]
+    return DocStore.build(str(tmp_path / "store"), documents), article
+
+
+def test_doc_store_round_trip(setup_data):
+    store, article = setup_data
+    assert len(store) == 2
+    assert store.get("a") == article
+    assert store.get("b") == "café naïve ünïcode text"
+    assert store.slice("b", 5, 10) == "naïve"
+    assert "b" in store and "c" not in store
+
+
+def test_child_spans_match_word_chunks(setup_data):
+    _, article = setup_data
+    spans = child_spans(article, chunk_length=20, overlap=5)
+    chunks = chunk_string_with_offsets(article, chunk_length=20, overlap=5)
+    assert len(spans) == len(chunks)
+    for (char_start, char_end, start, end), (text, w_start, w_end) in zip(
+        spans.tolist(), chunks
+    ):
+        assert " ".join(article[char_start:char_end].split()) == text
+        assert (start, end) == (w_start, w_end)
+    assert len(child_spans("too short", chunk_length=20, overlap=5)) == 1
+
+
+def test_parent_expansion(setup_data):
+    store, article = setup_data
+    start = article.index("w2_10")
+    end = start + len("w2_10")
+    assert article[slice(*parent_span(article, start, end, "paragraph"))] == (
+        article.split("\n")[2]
+    )
+    assert parent_span(article, start, end, "document") == (0, len(article))
+    low, high = parent_span(article, start, end, "window", window_chars=50)
+    assert low <= start and high >= end
+
+    hits = [
+        {"doc_id": "a", "char_start": start, "char_end": end, "distance": 0.1},
+        {"doc_id": "b", "char_start": 0, "char_end": 4, "distance": 0.2},
+        {
+            "doc_id": "a",
+            "char_start": start + 10,
+            "char_end": end + 10,
+            "distance": 0.3,
+        },
+    ]
+    parents = expand_hits(hits, store, mode="paragraph")
+    assert [parent["doc_id"] for parent in parents] == ["a", "b"]
+    assert parents[0]["text"] == article.split("\n")[2]
+    assert parents[0]["distance"] == 0.1
+
+
+def test_window_expansion_splits_each_document_once(setup_data, monkeypatch):
+    store, article = setup_data
+    calls = []
+
+    def counting_spans(text):
+        calls.append(len(text))
+        return sentence_spans(text)
+
+    monkeypatch.setattr(doc_store, "sentence_spans", counting_spans)
+    hits = [
+        {"doc_id": "a", "char_start": 40 * i, "char_end": 40 * i + 20, "distance": i}
+        for i in range(4)
+    ]
+    parents = expand_hits(hits, store, mode="window", window_chars=50)
+    assert calls == [len(article)]
+    for parent in parents:
+        assert parent["text"] == article[parent["char_start"] : parent["char_end"]]
+    for hit in hits:
+        low, high = parent_span(
+            article, hit["char_start"], hit["char_end"], "window", window_chars=50
+        )
+        assert any(
+            parent["char_start"] <= low and high <= parent["char_end"]
+            for parent in parents
+        )
+
+
+def test_add_child_chunks_without_text(setup_data):
+    store, _ = setup_data
+    index = RecordingIndex()
+
+    def embed(texts):
+        return np.ones((len(texts), 3)).tolist()
+
+    added = add_child_chunks(
+        index,
+        store,
+        chunk_length=20,
+        overlap=5,
+        embedding_function=embed,
+        store_text=False,
+        batch_size=4,
+    )
+    assert added == sum(len(call["ids"]) for call in index.calls)
+    assert all("documents" not in call for call in index.calls)
+    metadata = index.calls[0]["metadatas"][0]
+    assert store.slice("a", metadata["char_start"], metadata["char_end"]).startswith(
+        "w0_0"
+    )
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import rag.embedding as embedding
+from rag.embedding import LocalEmbedder, length_buckets
+
+
+class FakeEncoder:
+    """One token per word; embeds a text as (words, 2 * words)."""
+
+    max_seq_length = 6
+
+    def __init__(self):
+        self.batches = []
+
+    def tokenizer(
+        self, texts, add_special_tokens=True, truncation=False, max_length=None
+    ):
+        if truncation:
+            return {"input_ids": [text.split()[:max_length] for text in texts]}
+        return {"input_ids": [text.split() for text in texts]}
+
+    def encode_batch(self, texts):
+        self.batches.append(len(texts))
+        words = np.array([len(text.split()) for text in texts], dtype=np.float32)
+        return np.column_stack([words, 2 * words])
+
+
+@pytest.fixture
+def setup_data(monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setitem(embedding._model_cache, ("fake", "torch", "cpu"), encoder)
+    texts = [" ".join(["word"] * n) for n in (5, 1, 9, 2, 2, 7, 1, 3)]
+    return encoder, texts
+
+
+def test_length_buckets():
+    lengths = [5, 1, 9, 2, 2, 7, 1, 3, 30]
+    batches = length_buckets(lengths, max_tokens_per_batch=12, max_batch_size=3)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+        assert len(batch) <= 3
+        assert len(batch) == 1 or len(batch) * longest <= 12
+    # Items are grouped in length order, so each batch is shorter than the next
+    assert [max(lengths[i] for i in batch) for batch in batches] == sorted(
+        max(lengths[i] for i in batch) for batch in batches
+    )
+    # An item longer than the budget still gets a batch of its own
+    assert batches[-1].tolist() == [8]
+    assert length_buckets([]) == []
+
+
+def test_local_embedder_encodes_in_input_order(setup_data, tmp_path):
+    encoder, texts = setup_data
+    embedder = LocalEmbedder("fake", max_tokens_per_batch=8, max_batch_size=4)
+    vectors = embedder.encode(texts)
+    # Token lengths are truncated to the model's max_seq_length
+    assert embedder.token_lengths(texts).max() == 6
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors[:, 0], [len(t.split()) for t in texts])
+    assert max(encoder.batches) <= 4 and len(encoder.batches) > 1
+
+    memmap = embedder.encode_to_memmap(texts, str(tmp_path / "vectors.npy"))
+    np.testing.assert_array_equal(np.load(tmp_path / "vectors.npy"), vectors)
+    assert isinstance(memmap, np.memmap)
+    assert embedder(texts[:2]) == vectors[:2].tolist()
+    assert embedder.encode([]).shape == (0, 0)
+
+
+def test_local_embedder_normalises_only_when_asked(setup_data):
+    _, texts = setup_data
+    raw = LocalEmbedder("fake").encode(texts)
+    assert not np.allclose(np.linalg.norm(raw, axis=1), 1)
+
+    normalised = LocalEmbedder("fake", normalize_embeddings=True).encode(texts)
+    np.testing.assert_allclose(np.linalg.norm(normalised, axis=1), 1, rtol=1e-6)
+    np.testing.assert_allclose(
+        normalised, raw / np.linalg.norm(raw, axis=1, keepdims=True), rtol=1e-6
+    )
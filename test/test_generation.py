@@ -0,0 +1,138 @@
+import json
+import re
+import threading
+from types import SimpleNamespace
+import pytest
+from rag.generation import context_window, generate_answers, plan_batch
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class FakeClient:
+    """Answers batched requests as JSON and single prompts as plain text."""
+
+    def __init__(self, drop=(), fail_batches=0):
+        self.drop = set(drop)
+        self.fail_batches = fail_batches
+        self.requests = []
+        self.max_tokens = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, temperature, max_tokens=None):
+        with self.lock:
+            self.requests.append(messages)
+            if len(messages) == 2:
+                self.max_tokens.append(max_tokens)
+                if self.fail_batches:
+                    self.fail_batches -= 1
+                    return SimpleNamespace(
+                        choices=[
+                            SimpleNamespace(
+                                message=SimpleNamespace(content="not json"),
+                                finish_reason="stop",
+                            )
+                        ]
+                    )
+        if len(messages) == 1:
+            question = messages[0]["content"].split("QUESTION:")[1].split()[0]
+            content = f"single {question}"
+        else:
+            items = re.findall(
+                r"### Question (\d+)\n.*?QUESTION:\n(\S+)", messages[1]["content"], re.S
+            )
+            content = json.dumps(
+                [
+                    {"id": item_id, "answer": f"batched {question}"}
+                    for item_id, question in items
+                    if question not in self.drop
+                ]
+            )
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")]
+        )
+
+
+@pytest.fixture
+def setup_data():
+    questions = [f"q{i}" for i in range(40)]
+    contexts = [[f"context for q{i} " * 20, "another passage"] for i in range(40)]
+    return questions, contexts
+
+
+def test_batched_answers_match_questions(setup_data):
+    questions, contexts = setup_data
+    client = FakeClient()
+    answers, stats = generate_answers(
+        questions, contexts, client, "gpt-4", max_batch_size=8, token_counter=word_count
+    )
+    assert answers == [f"batched {q}" for q in questions]
+    assert stats["requests"] == stats["batches"] == 5
+    assert stats["fallbacks"] == 0
+    assert stats["prompt_tokens"] < stats["unbatched_prompt_tokens"]
+
+
+def test_failed_items_fall_back_and_batches_shrink(setup_data):
+    questions, contexts = setup_data
+    client = FakeClient(drop={"q3", "q17"})
+    answers, stats = generate_answers(
+        questions,
+        contexts,
+        client,
+        "gpt-4",
+        max_batch_size=8,
+        max_in_flight=1,
+        token_counter=word_count,
+    )
+    assert answers[3] == "single q3" and answers[17] == "single q17"
+    assert answers[4] == "batched q4"
+    assert stats["fallbacks"] == 2
+    # The batch after a failure is half the size
+    batch_sizes = [
+        messages[1]["content"].count("### Question")
+        for messages in client.requests
+        if len(messages) == 2
+    ]
+    assert batch_sizes[:2] == [8, 4]
+
+
+def test_batch_size_recovers_after_failures(setup_data):
+    questions, contexts = setup_data
+    questions, contexts = questions * 2, contexts * 2
+    client = FakeClient(fail_batches=3)
+    answers, stats = generate_answers(
+        questions,
+        contexts,
+        client,
+        "gpt-4",
+        max_batch_size=8,
+        max_in_flight=1,
+        max_answer_tokens=100,
+        token_counter=word_count,
+    )
+    assert all(answer is not None for answer in answers)
+    batch_sizes = [
+        messages[1]["content"].count("### Question")
+        for messages in client.requests
+        if len(messages) == 2
+    ]
+    # Halved to the floor of two, then grown back by one per clean batch
+    assert batch_sizes[:6] == [8, 4, 2, 2, 3, 4]
+    assert stats["fallbacks"] == 14
+    assert stats["singles"] == stats["fallbacks"]
+    assert client.max_tokens[:2] == [800, 400]
+
+
+def test_batches_fit_the_context_window():
+    item_tokens = [100] * 10
+    assert plan_batch(item_tokens, 0, 1000, 100, 4096, 16) == 5
+    assert plan_batch(item_tokens, 0, 1000, 100, 300, 16) == 3
+    assert plan_batch([5000], 0, 1000, 100, 4096, 16) == 1
+    assert context_window("gpt-35-turbo-16k") == 16_384
+    assert context_window("gpt-35-turbo-0613") == 4_096
+    assert context_window("gpt-35-turbo-1106") == 16_385
+    assert context_window("gpt-4-32k-0613") == 32_768
+    assert context_window("my-deployment", default=4096) == 4096
@@ -0,0 +1,80 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from rag.hnsw_tuning import build_hnswlib, exact_neighbours, pareto_front, tune_hnsw
+from rag.retrieval import create_index
+
+
+class RecordingClient:
+    def create_collection(self, **kwargs):
+        return kwargs
+
+
+def approximate_builder(embeddings, space, M, construction_ef):
+    """Exact search that loses neighbours at low search_ef and small M."""
+    rng = np.random.default_rng(M)
+
+    def search(queries, k, search_ef):
+        time.sleep(search_ef * 1e-5)
+        found = exact_neighbours(embeddings, queries, k, space)
+        missed = int(k * min(1, 8 / (search_ef * M**0.5)))
+        if missed:
+            found[:, k - missed :] = rng.integers(
+                0, len(embeddings), (len(found), missed)
+            )
+        return found
+
+    return search
+
+
+@pytest.fixture
+def setup_data():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(500, 16)).astype(np.float32)
+
+
+def test_create_index_sets_hnsw_metadata():
+    collection = create_index(RecordingClient(), "test", None, search_ef=64, M=32)
+    assert collection["metadata"] == {
+        "hnsw:space": "cosine",
+        "hnsw:search_ef": 64,
+        "hnsw:M": 32,
+    }
+
+
+def test_pareto_front():
+    results = pd.DataFrame(
+        {"recall": [0.9, 0.95, 0.95, 0.8], "query_ms": [1.0, 2.0, 3.0, 1.5]}
+    )
+    assert pareto_front(results).tolist() == [True, True, False, False]
+
+
+def test_tune_hnsw_picks_fastest_setting_meeting_target(setup_data):
+    results, best = tune_hnsw(
+        setup_data,
+        target_recall=0.9,
+        M_values=(4, 16),
+        construction_efs=(32,),
+        search_efs=(2, 8, 64),
+        num_queries=20,
+        build_fn=approximate_builder,
+    )
+    assert len(results) == 6
+    assert results[results["M"] == 16]["recall"].is_monotonic_increasing
+    chosen = results[
+        (results["M"] == best["M"]) & (results["search_ef"] == best["search_ef"])
+    ].iloc[0]
+    assert chosen["meets_target"] and chosen["pareto"]
+    assert chosen["query_ms"] == results[results["meets_target"]]["query_ms"].min()
+
+
+def test_build_hnswlib_finds_neighbours(setup_data):
+    pytest.importorskip("hnswlib")
+    embeddings, queries = setup_data[50:], setup_data[:50]
+    search = build_hnswlib(embeddings, "cosine", M=16, construction_ef=200)
+    found = search(queries, 10, 200)
+    assert found.shape == (50, 10)
+    exact = exact_neighbours(embeddings, queries, 10, "cosine")
+    hits = sum(len(set(a) & set(b)) for a, b in zip(found.tolist(), exact.tolist()))
+    assert hits / exact.size >= 0.95
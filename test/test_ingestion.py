@@ -0,0 +1,111 @@
+import time
+import pandas as pd
+import pytest
+from rag.ingestion import ingest, load_checkpoint
+
+
+class RecordingIndex:
+    def __init__(self, delay=0.0):
+        self.rows, self.writes, self.delay = {}, [], delay
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        time.sleep(self.delay)
+        self.writes.append(len(ids))
+        for row in zip(ids, documents, metadatas, embeddings):
+            self.rows[row[0]] = row
+
+
+def embed(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def setup_data():
+    docs = pd.DataFrame(
+        {
+            "doc_id": [f"doc{i}" for i in range(40)],
+            "article": [" ".join(f"w{j}" for j in range(100)) for i in range(40)],
+        }
+    )
+    return [docs.iloc[i : i + 10] for i in range(0, 40, 10)]
+
+
+def test_ingest_writes_every_chunk_in_bounded_batches(setup_data):
+    index = RecordingIndex()
+    stats = ingest(
+        setup_data,
+        index,
+        embed,
+        chunk_length=40,
+        overlap=10,
+        embed_batch_size=7,
+        write_batch_size=25,
+        embed_workers=3,
+        queue_size=2,
+    )
+    # 100 words in windows of 40 with overlap 10 give 3 chunks per document
+    assert stats["documents"] == 40 and stats["chunks"] == 120
+    assert len(index.rows) == 120
+    assert max(index.writes) <= 25
+    _, text, metadata, embedding = index.rows["doc3-2"]
+    assert metadata == {"doc_id": "doc3", "start": 30, "end": 70}
+    assert embedding == [float(len(text)), 1.0]
+
+
+def test_ingest_resumes_from_checkpoint(setup_data, tmp_path):
+    checkpoint = str(tmp_path / "ingest.checkpoint")
+    calls = []
+
+    def flaky_embed(texts):
+        calls.append(len(texts))
+        if len(calls) > 5:
+            raise RuntimeError("embedding service down")
+        return embed(texts)
+
+    index = RecordingIndex()
+    with pytest.raises(RuntimeError, match="service down"):
+        ingest(
+            setup_data,
+            index,
+            flaky_embed,
+            chunk_length=40,
+            overlap=10,
+            embed_batch_size=6,
+            write_batch_size=6,
+            embed_workers=1,
+            checkpoint_path=checkpoint,
+        )
+    done = load_checkpoint(checkpoint)
+    assert 0 < len(done) < 40
+    assert all(f"{doc_id}-3" in index.rows for doc_id in done)
+
+    stats = ingest(
+        setup_data,
+        index,
+        embed,
+        chunk_length=40,
+        overlap=10,
+        checkpoint_path=checkpoint,
+    )
+    assert stats["skipped"] == len(done)
+    assert stats["documents"] == 40 - len(done)
+    assert len(index.rows) == 120
+    assert len(load_checkpoint(checkpoint)) == 40
+
+
+def test_ingest_overlaps_stages(setup_data):
+    def slow_embed(texts):
+        time.sleep(0.02)
+        return embed(texts)
+
+    stats = ingest(
+        setup_data,
+        RecordingIndex(delay=0.02),
+        slow_embed,
+        chunk_length=40,
+        overlap=10,
+        embed_batch_size=10,
+        write_batch_size=10,
+        embed_workers=1,
+    )
+    assert stats["elapsed_s"] < 0.8 * (stats["embed_s"] + stats["write_s"])
@@ -0,0 +1,104 @@
+import json
+import re
+from types import SimpleNamespace
+import pytest
+import topic.labels as labels
+from topic.labels import label_topics_batched
+
+
+class FakeClient:
+    """Labels every topic in a batched prompt, or fails when told to."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, temperature):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        if self.fail:
+            content = "not json"
+        else:
+            indices = re.findall(r"^\s*(\d+): ", prompt, re.M)
+            content = json.dumps({index: f"label {index}" for index in indices})
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")]
+        )
+
+
+@pytest.fixture
+def setup_data(monkeypatch):
+    monkeypatch.setattr(labels, "_label_cache", {})
+    return [["fever", "aspirin", "dose"], ["heart", "blood", "pressure"]]
+
+
+def test_labels_are_cached(setup_data):
+    topics = setup_data
+    client = FakeClient()
+    first = label_topics_batched(topics, client=client, model="gpt")
+    assert first == {"label_0": topics[0], "label_1": topics[1]}
+    assert len(client.prompts) == 1
+
+    second = label_topics_batched(topics, client=client, model="gpt")
+    assert second == first
+    assert len(client.prompts) == 1
+
+
+def test_label_cache_round_trip(setup_data, tmp_path, monkeypatch):
+    topics = setup_data
+    cache_path = str(tmp_path / "labels.json")
+    label_topics_batched(
+        topics, client=FakeClient(), model="gpt", cache_path=cache_path
+    )
+
+    # A new process starts with an empty in-memory cache
+    monkeypatch.setattr(labels, "_label_cache", {})
+    client = FakeClient(fail=True)
+    reloaded = label_topics_batched(
+        topics, client=client, model="gpt", cache_path=cache_path
+    )
+    assert reloaded == {"label_0": topics[0], "label_1": topics[1]}
+    assert client.prompts == []
+
+
+def test_fallback_labels_are_not_cached(setup_data, tmp_path):
+    topics = setup_data
+    cache_path = str(tmp_path / "labels.json")
+    failed = label_topics_batched(
+        topics, client=FakeClient(fail=True), model="gpt", cache_path=cache_path
+    )
+    assert failed == {"fever_aspirin": topics[0], "heart_blood": topics[1]}
+    with open(cache_path) as f:
+        assert json.load(f) == {}
+
+    client = FakeClient()
+    retried = label_topics_batched(
+        topics, client=client, model="gpt", cache_path=cache_path
+    )
+    assert len(client.prompts) == 1
+    assert retried == {"label_0": topics[0], "label_1": topics[1]}
+
+
+def test_client_and_model_are_lazy(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(labels, "get_client", lambda: client)
+    monkeypatch.setenv("LABELLING_MODEL", "labeller")
+    assert labels.client is client
+    assert labels.labelling_model == "labeller"
+    with pytest.raises(AttributeError):
+        labels.not_an_attribute
+
+
+def test_labels_are_cached_per_model_and_prompt(setup_data, monkeypatch):
+    topics = setup_data
+    label_topics_batched(topics, client=FakeClient(), model="gpt")
+
+    client = FakeClient()
+    label_topics_batched(topics, client=client, model="gpt-4")
+    assert len(client.prompts) == 1
+
+    monkeypatch.setattr(labels, "LABEL_PROMPT_VERSION", labels.LABEL_PROMPT_VERSION + 1)
+    label_topics_batched(topics, client=client, model="gpt-4")
+    assert len(client.prompts) == 2
@@ -0,0 +1,66 @@
+import time
+import numpy as np
+import pytest
+from openai import AzureOpenAI
+from eval.load_test import make_rag_query, run_load_test, saturation_curve, summarise
+from helper.openai_stub import StubConfig, hashed_embedding, start_stub_server
+
+
+class HashedIndex:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.embeddings = np.array([hashed_embedding(chunk, 64) for chunk in chunks])
+
+    def query(self, query_embeddings, n_results):
+        scores = self.embeddings @ np.asarray(query_embeddings).T
+        top = np.argsort(-scores[:, 0])[:n_results]
+        return {"documents": [[self.chunks[i] for i in top]]}
+
+
+@pytest.fixture
+def setup_data():
+    server, url = start_stub_server(StubConfig(latency_median_ms=20, latency_sigma=0))
+    client = AzureOpenAI(azure_endpoint=url, api_key="stub", api_version="2024-02-01")
+    index = HashedIndex([f"chunk about topic {i}" for i in range(50)])
+
+    def embed(texts):
+        return [hashed_embedding(text, 64) for text in texts]
+
+    yield make_rag_query(index, client, "gpt", embed, top_k=3)
+    server.shutdown()
+
+
+def test_run_load_test_against_stub(setup_data):
+    questions = [f"what about topic {i}?" for i in range(10)]
+    results = run_load_test(questions, setup_data, concurrency=4, num_requests=20)
+    assert len(results) == 20
+    assert results["error"].isna().all()
+    assert (results["generate"] >= 0.02).all()
+
+    summary = summarise(results)
+    assert summary.loc["generate", "share"] > 0.5
+    assert summary.attrs["throughput_rps"] > 4 / (results["service"].max() * 2)
+
+
+def test_open_loop_and_errors():
+    def query(question):
+        if question == "bad":
+            raise RuntimeError("boom")
+        time.sleep(0.01)
+        return {"generate": 0.01}
+
+    results = run_load_test(
+        ["ok", "bad"], query, concurrency=2, rate=200, num_requests=40
+    )
+    assert len(results) == 40
+    assert results["error"].notna().sum() == 20
+    assert summarise(results).attrs["error_rate"] == 0.5
+
+
+def test_saturation_curve():
+    def query(question):
+        time.sleep(0.01)
+        return {"generate": 0.01}
+
+    curve = saturation_curve(["q"], query, concurrencies=(1, 4), num_requests=16)
+    assert curve["throughput_rps"].iloc[1] > 2 * curve["throughput_rps"].iloc[0]
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rag.loading import iter_chunks, iter_record_batches, reservoir_sample
+
+
+@pytest.fixture
+def setup_data(tmp_path):
+    df = pd.DataFrame(
+        {
+            "doc_id": [f"doc{i}" for i in range(100)],
+            "article": [" ".join(["word"] * (i + 1)) for i in range(100)],
+        }
+    )
+    df.to_csv(tmp_path / "docs.csv", index=False)
+    df.to_json(tmp_path / "docs.jsonl", orient="records", lines=True)
+    df.to_parquet(tmp_path / "docs.parquet", index=False)
+    return df, tmp_path
+
+
+@pytest.mark.parametrize("name", ["docs.csv", "docs.jsonl", "docs.parquet"])
+def test_iter_record_batches(setup_data, name):
+    df, tmp_path = setup_data
+    batches = list(iter_record_batches(str(tmp_path / name), batch_size=30))
+    assert [len(batch) for batch in batches] == [30, 30, 30, 10]
+    assert pd.concat(batches)["doc_id"].tolist() == df["doc_id"].tolist()
+
+
+def test_reservoir_sample(setup_data):
+    df, tmp_path = setup_data
+    path = str(tmp_path / "docs.csv")
+    first = reservoir_sample(iter_record_batches(path, batch_size=7), 10, seed=42)
+    second = reservoir_sample(iter_record_batches(path, batch_size=7), 10, seed=42)
+    assert len(first) == 10
+    assert first["doc_id"].is_unique
+    assert first["doc_id"].tolist() == second["doc_id"].tolist()
+    assert len(reservoir_sample(iter_record_batches(path), 500, seed=1)) == 100
+
+
+def test_reservoir_sample_is_uniform():
+    batches = [pd.DataFrame({"x": np.arange(i, i + 10)}) for i in range(0, 50, 10)]
+    counts = np.zeros(50)
+    for seed in range(2000):
+        counts[reservoir_sample(batches, 5, seed=seed)["x"].to_numpy()] += 1
+    # Each record is expected in 2000 * 5 / 50 = 200 samples
+    assert np.all(np.abs(counts - 200) < 60)
+
+
+def test_reservoir_sample_matches_sequential_algorithm():
+    # Small reservoirs over a long batch pick the same slot many times
+    n, k = 1000, 3
+    for seed in range(20):
+        slots = np.random.default_rng(seed).integers(0, np.arange(k, n) + 1)
+        expected = list(range(k))
+        for position, slot in zip(range(k, n), slots):
+            if slot < k:
+                expected[slot] = position
+        batch = pd.DataFrame({"x": np.arange(n)})
+        sample = reservoir_sample([batch], k, seed=seed)
+        assert sample["x"].tolist() == sorted(expected)
+
+
+def test_iter_chunks(setup_data):
+    _, tmp_path = setup_data
+    batches = iter_record_batches(str(tmp_path / "docs.csv"), batch_size=50)
+    chunked = list(iter_chunks(batches, chunk_length=40, overlap=10))
+    assert len(chunked) == 2
+    last = chunked[-1]
+    assert last[last["doc_id"] == "doc99"]["chunk_id"].tolist() == [
+        "doc99-1",
+        "doc99-2",
+        "doc99-3",
+    ]
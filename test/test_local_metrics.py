@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+from eval.local_metrics import (
+    EmbeddingCache,
+    _lcs_length,
+    local_evaluate,
+    rouge_l,
+    token_f1,
+)
+from helper.openai_stub import hashed_embedding
+
+
+@pytest.fixture
+def setup_data():
+    calls = []
+
+    def embedding_function(texts):
+        calls.append(list(texts))
+        return [hashed_embedding(text, 64) for text in texts]
+
+    df = pd.DataFrame(
+        {
+            "question": ["q1", "q2", "q3"],
+            "ground_truth": [
+                "the cat sat on the mat",
+                "aspirin reduces fever",
+                "the cat sat on the mat",
+            ],
+            "answer": ["the cat sat on the mat", "it lowers blood pressure", ""],
+            "contexts": [
+                ["a cat sat there", "on the mat"],
+                "['aspirin is a drug', 'fever is common']",
+                [],
+            ],
+        }
+    )
+    return df, embedding_function, calls
+
+
+def _lcs_reference(a, b):
+    table = np.zeros((len(a) + 1, len(b) + 1), dtype=int)
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            table[i + 1, j + 1] = (
+                table[i, j] + 1 if x == y else max(table[i, j + 1], table[i + 1, j])
+            )
+    return table[-1, -1]
+
+
+def test_lexical_metrics():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        a = rng.integers(0, 4, rng.integers(0, 80)).tolist()
+        b = rng.integers(0, 4, rng.integers(0, 80)).tolist()
+        assert _lcs_length(a, b) == _lcs_reference(a, b)
+
+    assert rouge_l(["the cat sat"], ["the cat sat"])[0] == 1
+    # LCS "the sat" of 3 and 4 tokens
+    assert rouge_l(["the dog sat"], ["the cat has sat"])[0] == pytest.approx(
+        2 * (2 / 3) * (2 / 4) / (2 / 3 + 2 / 4)
+    )
+    assert token_f1(["The Cat, sat!"], ["the cat sat"])[0] == 1
+    assert token_f1(["blue"], ["red"])[0] == 0
+    assert rouge_l([""], ["anything"])[0] == 0
+
+
+def test_local_evaluate(setup_data, tmp_path):
+    df, embedding_function, calls = setup_data
+    cache = EmbeddingCache(embedding_function, path=str(tmp_path / "cache.npz"))
+    scores = local_evaluate(df, embedding_cache=cache)
+
+    assert scores["answer_similarity"][0] == pytest.approx(1, abs=1e-5)
+    assert scores["rouge_l"].tolist()[0] == 1
+    assert scores["context_token_recall"][0] == pytest.approx(1)
+    assert scores["context_token_recall"][1] == pytest.approx(2 / 3)
+    assert np.isnan(scores["answer_grounding"][2])
+    assert np.isnan(scores["context_similarity"][2])
+    assert scores["context_similarity"][1] > 0
+
+    # Every distinct text is embedded once, in a single bulk call per metric
+    embedded = [text for call in calls for text in call]
+    assert len(embedded) == len(set(embedded))
+    assert len(calls) == 2
+
+    cache.save()
+    reloaded = EmbeddingCache(embedding_function, path=cache.path)
+    local_evaluate(df, embedding_cache=reloaded)
+    assert len(calls) == 2
+    assert len(reloaded) == len(cache)
+
+
+def test_local_evaluate_without_embeddings(setup_data):
+    df, _, _ = setup_data
+    scores = local_evaluate(df)
+    assert "answer_similarity" not in scores.columns
+    assert scores["token_f1"].tolist()[2] == 0
+
+    with pytest.raises(ValueError):
+        local_evaluate(df, metrics=["answer_similarity"])
+    with pytest.raises(ValueError):
+        local_evaluate(df.drop(columns="contexts"))
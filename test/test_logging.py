@@ -0,0 +1,110 @@
+import logging
+import multiprocessing
+import threading
+import pytest
+from helper.logging import (
+    LOG_FORMAT,
+    RateLimitFilter,
+    SamplingFilter,
+    configure_logging,
+    get_logger,
+    shutdown_logging,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class ThreadName:
+    """Formats as the name of the thread that formats it."""
+
+    def __str__(self):
+        return threading.current_thread().name
+
+
+@pytest.fixture
+def setup_data():
+    handler = ListHandler()
+    configure_logging([handler], force=True)
+    yield handler
+    shutdown_logging()
+
+
+def _log_in_child(name):
+    get_logger(name).info("from the child %s", "process")
+
+
+def test_records_are_formatted_off_the_calling_thread(setup_data):
+    handler = setup_data
+    logger = get_logger("test_logging.lazy")
+    logger.info("formatted in %s", ThreadName())
+    shutdown_logging()
+
+    assert len(handler.messages) == 1
+    assert handler.messages[0] != f"formatted in {threading.current_thread().name}"
+    assert handler.messages[0].startswith("formatted in ")
+
+
+def test_sampling_and_rate_limiting(setup_data):
+    handler = setup_data
+    sampled = get_logger("test_logging.sampled", sample_every=10)
+    for i in range(25):
+        sampled.info("item %d", i)
+    limited = get_logger("test_logging.limited", max_per_second=1e-3)
+    for i in range(5):
+        limited.info("item %d", i)
+    limited.warning("always passes")
+    shutdown_logging()
+
+    assert handler.messages == [
+        "item 0",
+        "item 10",
+        "item 20",
+        "item 0",
+        "always passes",
+    ]
+
+    # Asking again replaces the filters rather than stacking them
+    get_logger("test_logging.sampled", sample_every=2)
+    assert len(logging.getLogger("test_logging.sampled").filters) == 1
+
+    limiter = RateLimitFilter(per_second=1e-3, burst=1)
+    records = [
+        logging.LogRecord("x", logging.INFO, "", 0, "message", None, None)
+        for _ in range(3)
+    ]
+    assert [limiter.filter(record) for record in records] == [True, False, False]
+    limiter._tokens = 1
+    assert limiter.filter(records[0])
+    assert records[0].getMessage() == "message (2 similar messages suppressed)"
+
+    with pytest.raises(ValueError):
+        SamplingFilter(0)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork"
+)
+def test_forked_workers_keep_logging(tmp_path):
+    path = tmp_path / "log.txt"
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    configure_logging([handler], force=True)
+    try:
+        get_logger("test_logging.parent").info("from the parent")
+        with multiprocessing.get_context("fork").Pool(2) as pool:
+            pool.map(_log_in_child, ["test_logging.child"] * 4)
+            pool.close()
+            pool.join()
+    finally:
+        shutdown_logging()
+
+    lines = path.read_text().splitlines()
+    assert sum("from the parent" in line for line in lines) == 1
+    assert sum("from the child process" in line for line in lines) == 4
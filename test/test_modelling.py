@@ -0,0 +1,140 @@
+import pickle
+import sys
+from types import ModuleType
+import numpy as np
+import pytest
+import rag.embedding as embedding
+import topic.modelling as modelling
+from rag.embedding import LocalEmbedder
+from topic.modelling import (
+    create_online_topic_model,
+    embed_documents,
+    partial_fit_topic_model,
+)
+
+
+class BaseEmbedder:
+    """Stands in for bertopic.backend.BaseEmbedder."""
+
+
+class FakeEmbedder:
+    model_name = "fake"
+    backend = "numpy"
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, documents, show_progress_bar=False):
+        self.calls += 1
+        return np.array([[len(doc), 1.0] for doc in documents], dtype=np.float32)
+
+
+class FakeEncoder:
+    """Stands in for a loaded encoder: one token per word, two dimensions."""
+
+    max_seq_length = 128
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenizer(
+        self, texts, add_special_tokens=True, truncation=False, max_length=None
+    ):
+        return {"input_ids": [text.split()[:max_length] for text in texts]}
+
+    def encode_batch(self, texts):
+        self.calls += 1
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+class BERTopic:
+    """Stands in for bertopic.BERTopic, giving each document its batch number."""
+
+    def __init__(self, **components):
+        self.components = components
+        self.topics_ = None
+        self.batches = 0
+
+    def partial_fit(self, documents, embeddings=None):
+        self.embeddings = embeddings
+        self.topics_ = [self.batches] * len(documents)
+        self.batches += 1
+        return self
+
+
+class OnlineCountVectorizer:
+    def __init__(self, stop_words=None, decay=None):
+        self.decay = decay
+
+
+@pytest.fixture
+def setup_data(monkeypatch):
+    backend = ModuleType("bertopic.backend")
+    backend.BaseEmbedder = BaseEmbedder
+    bertopic = ModuleType("bertopic")
+    bertopic.BERTopic = BERTopic
+    vectorizers = ModuleType("bertopic.vectorizers")
+    vectorizers.OnlineCountVectorizer = OnlineCountVectorizer
+    monkeypatch.setitem(sys.modules, "bertopic", bertopic)
+    monkeypatch.setitem(sys.modules, "bertopic.backend", backend)
+    monkeypatch.setitem(sys.modules, "bertopic.vectorizers", vectorizers)
+    monkeypatch.setattr(modelling, "_LocalEmbedderBackend", None)
+    return ["fever and aspirin", "blood pressure", "a dose"]
+
+
+def test_backend_is_built_once_and_pickles(setup_data):
+    docs = setup_data
+    backend_class = modelling._local_embedder_backend()
+    assert modelling._local_embedder_backend() is backend_class
+    assert modelling._LocalEmbedderBackend is backend_class
+
+    backend = pickle.loads(pickle.dumps(backend_class(FakeEmbedder())))
+    assert isinstance(backend, backend_class)
+    np.testing.assert_array_equal(backend.embed(docs), FakeEmbedder().encode(docs))
+
+
+def test_embed_documents_is_cached(setup_data, tmp_path, monkeypatch):
+    docs = setup_data
+    encoder = FakeEncoder()
+    monkeypatch.setitem(embedding._model_cache, ("fake", "torch", "cpu"), encoder)
+    embedder = LocalEmbedder("fake")
+
+    first = embed_documents(docs, embedder=embedder, cache_dir=str(tmp_path))
+    calls = encoder.calls
+    second = embed_documents(docs, embedder=embedder, cache_dir=str(tmp_path))
+    assert encoder.calls == calls
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(second, encoder.encode_batch(docs))
+
+    embed_documents(docs[:2], embedder=embedder, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("embeddings-*.npy"))) == 2
+
+
+def test_online_topic_model(setup_data):
+    docs = setup_data
+    embedder = FakeEmbedder()
+    topic_model = create_online_topic_model(
+        n_components=2, n_clusters=3, decay=0.5, embedder=embedder
+    )
+    components = topic_model.components
+    assert components["umap_model"].n_components == 2
+    assert components["hdbscan_model"].n_clusters == 3
+    assert components["vectorizer_model"].decay == 0.5
+    assert components["embedding_model"].embedder is embedder
+
+    batches = [docs, docs[:2], docs[1:]]
+    embeddings = [embedder.encode(batch) for batch in batches]
+    fitted, topics = partial_fit_topic_model(topic_model, batches, embeddings)
+    assert fitted is topic_model
+    assert topics == [0, 0, 0, 1, 1, 2, 2]
+    # BERTopic's own state is left describing the last batch
+    assert topic_model.topics_ == [2, 2]
+    np.testing.assert_array_equal(topic_model.embeddings, embeddings[-1])
+
+    _, topics = partial_fit_topic_model(topic_model, [docs])
+    assert topics == [3, 3, 3]
+    assert topic_model.embeddings is None
+
+    with pytest.raises(ValueError, match="batch 1"):
+        partial_fit_topic_model(topic_model, batches, embeddings[:1])
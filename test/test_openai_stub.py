@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from openai import AzureOpenAI, RateLimitError
+from helper.openai_stub import StubConfig, hashed_embedding, start_stub_server
+from helper.openai_utils import (
+    ContentFilterError,
+    StreamMetrics,
+    collect_stream,
+    general_prompt,
+    stream_prompt,
+)
+
+
+@pytest.fixture
+def setup_data():
+    servers = []
+
+    def client(**config):
+        server, url = start_stub_server(StubConfig(**config))
+        servers.append(server)
+        return AzureOpenAI(
+            azure_endpoint=url, api_key="stub", api_version="2024-02-01", max_retries=0
+        )
+
+    yield client
+    for server in servers:
+        server.shutdown()
+
+
+def test_hashed_embedding():
+    first = hashed_embedding("the heart rate was high", 64)
+    assert np.allclose(first, hashed_embedding("The heart rate was high.", 64))
+    assert np.linalg.norm(first) == pytest.approx(1)
+    related = hashed_embedding("the heart rate", 64) @ first
+    unrelated = hashed_embedding("tokyo area population", 64) @ first
+    assert related > unrelated
+
+
+def test_stub_chat_and_embeddings(setup_data):
+    client = setup_data(completion="A canned answer.")
+    assert general_prompt(client, "question", model="gpt") == "A canned answer."
+
+    metrics = StreamMetrics(model="gpt")
+    stream = stream_prompt(client, "question", model="gpt", metrics=metrics)
+    assert collect_stream(stream) == "A canned answer."
+    assert metrics.tokens == 3
+
+    response = client.embeddings.create(model="ada", input=["one", "two"])
+    assert [len(item.embedding) for item in response.data] == [1536, 1536]
+
+
+def test_stub_injected_errors(setup_data):
+    client = setup_data()
+    with pytest.raises(ContentFilterError):
+        collect_stream(stream_prompt(client, "TRIGGER_CONTENT_FILTER", model="gpt"))
+
+    limited = setup_data(rate_limit_rate=1.0)
+    with pytest.raises(RateLimitError):
+        limited.embeddings.create(model="ada", input="text")
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+import pytest
+from helper.openai_utils import (
+    ContentFilterError,
+    EmptyResponseError,
+    GenerationError,
+    StreamMetrics,
+    collect_stream,
+    stream_prompt,
+)
+
+
+def chunk(content=None, finish_reason=None):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)],
+        usage=None,
+    )
+
+
+class FakeClient:
+    def __init__(self, chunks=None, error=None):
+        self.chunks, self.error = chunks, error
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        if self.error is not None:
+            raise self.error
+        return iter(self.chunks)
+
+
+@pytest.fixture
+def setup_data():
+    prompt_filter = SimpleNamespace(choices=[], usage=None)
+    return [prompt_filter, chunk("Hello"), chunk(" world"), chunk(None, "stop")]
+
+
+def test_stream_prompt_yields_tokens_and_records_metrics(setup_data):
+    metrics = StreamMetrics(model="gpt")
+    stream = stream_prompt(FakeClient(setup_data), "hi", "gpt", metrics=metrics)
+    assert next(stream) == "Hello"
+    assert metrics.ttft_s is not None and metrics.latency_s is None
+    assert collect_stream(stream) == " world"
+    assert metrics.tokens == 2
+    assert metrics.finish_reason == "stop"
+    assert metrics.latency_s >= metrics.ttft_s
+
+
+def test_stream_prompt_typed_errors(setup_data):
+    filtered = setup_data[:2] + [chunk(None, "content_filter")]
+    stream = stream_prompt(FakeClient(filtered), "hi", "gpt")
+    assert next(stream) == "Hello"
+    with pytest.raises(ContentFilterError):
+        next(stream)
+
+    with pytest.raises(EmptyResponseError):
+        collect_stream(stream_prompt(FakeClient([chunk(None, "stop")]), "hi", "gpt"))
+
+    with pytest.raises(GenerationError, match="boom"):
+        collect_stream(stream_prompt(FakeClient(error=OSError("boom")), "hi", "gpt"))
@@ -0,0 +1,71 @@
+from helper.general import convert_to_dict
+from helper.parsing import parse_json_items, parse_qa_pairs
+
+
+def test_parse_json_items_array():
+    items, rejected = parse_json_items('[{"a": 1}, {"a": 2}]')
+    assert items == [{"a": 1}, {"a": 2}]
+    assert rejected == []
+
+
+def test_parse_json_items_wrapped_and_fenced():
+    text = '```json\n{\n  [\n    {"a": 1},\n    {"a": 2}\n  ]\n}\n```'
+    items, rejected = parse_json_items(text)
+    assert items == [{"a": 1}, {"a": 2}]
+    assert rejected == []
+
+
+def test_parse_json_items_quarantines_malformed_item():
+    text = '[{"a": 1}, {"a": oops}, {"a": 3}]'
+    items, rejected = parse_json_items(text)
+    assert items == [{"a": 1}, {"a": 3}]
+    assert len(rejected) == 1
+
+
+def test_parse_json_items_resyncs_at_top_level_items():
+    text = (
+        '[{"a": oops, "b": {"c": 2}, "d": "}, {"}, {"a": 3}, nonsense,'
+        ' {"a": [1, {"x": 1}], "b": bad}, {"a": 4}]'
+    )
+    items, rejected = parse_json_items(text)
+    assert items == [{"a": 3}, {"a": 4}]
+    assert [item["fragment"] for item in rejected] == [
+        '{"a": oops, "b": {"c": 2}, "d": "}, {"}',
+        "nonsense",
+        '{"a": [1, {"x": 1}], "b": bad}',
+    ]
+
+    items, rejected = parse_json_items('{"a": 1} {"a": {"b": oops}} {"a": 2}')
+    assert items == [{"a": 1}, {"a": 2}]
+    assert len(rejected) == 1
+
+
+def test_parse_json_items_does_not_evaluate_code():
+    items, rejected = parse_json_items("__import__('os').getcwd()")
+    assert items == []
+    assert len(rejected) == 1
+
+
+def test_parse_qa_pairs_validates_items():
+    text = (
+        '[{"question": "Q1?", "answer": "A1"}, {"question": "Q2?"},'
+        ' {"question": " ", "answer": "A3"}]'
+    )
+    pairs, rejected = parse_qa_pairs(text)
+    assert pairs == [{"question": "Q1?", "answer": "A1"}]
+    assert len(rejected) == 2
+
+
+def test_parse_qa_pairs_no_content():
+    pairs, rejected = parse_qa_pairs(None)
+    assert pairs == []
+    assert len(rejected) == 1
+
+
+def test_convert_to_dict_accepts_python_literals():
+    results = [
+        "[{\"a\": 1}, {'a': 2, 'b': None}, {\"a\": oops}]",
+        "[{'a': 4}]",
+        None,
+    ]
+    assert convert_to_dict(results) == [{"a": 1}, {"a": 2, "b": None}, {"a": 4}]
@@ -0,0 +1,113 @@
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+from rag.qa_synthesis import export_qa_pairs, synthesise_qa_pairs
+
+
+class FakeClient:
+    """Returns two pairs per article; "bad" ones are malformed, "failing" ones raise."""
+
+    def __init__(self):
+        self.articles = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, temperature):
+        article = messages[1]["content"].split("Article:\n\n")[1]
+        with self.lock:
+            self.articles.append(article)
+        if article.startswith("failing"):
+            raise ConnectionError("service unavailable")
+        if article.startswith("bad"):
+            content = f'[{{"question": "{article}?", "answer": oops}}]'
+        else:
+            content = json.dumps(
+                [
+                    {"question": f"{article} {i}?", "answer": f"answer {i}"}
+                    for i in range(2)
+                ]
+            )
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")]
+        )
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def setup_data(tmp_path):
+    articles = [(f"doc{i}", f"article {i}") for i in range(6)]
+    articles.append(("doc6", "bad article"))
+    paths = {
+        "output_path": str(tmp_path / "pairs.jsonl"),
+        "quarantine_path": str(tmp_path / "quarantine.jsonl"),
+    }
+    return articles, paths
+
+
+def test_malformed_responses_are_quarantined(setup_data, tmp_path):
+    articles, paths = setup_data
+    stats = synthesise_qa_pairs(articles, FakeClient(), "gpt", max_in_flight=3, **paths)
+    assert stats == {"articles": 7, "skipped": 0, "pairs": 12, "rejected": 1}
+
+    rows = read_jsonl(paths["output_path"])
+    assert sorted({row["doc_id"] for row in rows}) == [f"doc{i}" for i in range(6)]
+    assert {
+        "doc_id": "doc2",
+        "question": "article 2 1?",
+        "ground_truth": "answer 1",
+    } in rows
+
+    (quarantined,) = read_jsonl(paths["quarantine_path"])
+    assert quarantined["doc_id"] == "doc6"
+    assert "oops" in quarantined["raw"]
+
+    exported = export_qa_pairs(paths["output_path"], str(tmp_path / "pairs.csv"))
+    assert list(exported.columns) == ["question", "ground_truth"]
+    assert len(exported) == 12
+
+
+def test_failed_requests_are_quarantined_with_the_error(setup_data):
+    _, paths = setup_data
+    articles = [("doc0", "article 0"), ("doc1", "failing article")]
+    stats = synthesise_qa_pairs(articles, FakeClient(), "gpt", **paths)
+    assert stats == {"articles": 2, "skipped": 0, "pairs": 2, "rejected": 1}
+
+    (quarantined,) = read_jsonl(paths["quarantine_path"])
+    assert quarantined["doc_id"] == "doc1"
+    assert "service unavailable" in quarantined["error"]
+    assert quarantined["raw"] is None
+
+
+def test_resumed_run_skips_completed_articles(setup_data):
+    articles, paths = setup_data
+    synthesise_qa_pairs(articles[:3], FakeClient(), "gpt", **paths)
+    # An interrupted run can leave a torn final line
+    with open(paths["output_path"], "a") as f:
+        f.write('{"doc_id": "doc3", "quest')
+
+    client = FakeClient()
+    stats = synthesise_qa_pairs(articles, client, "gpt", **paths)
+    assert stats["skipped"] == 3
+    assert sorted(client.articles) == [
+        "article 3",
+        "article 4",
+        "article 5",
+        "bad article",
+    ]
+    with open(paths["output_path"]) as f:
+        lines = f.read().splitlines()
+    rows = [json.loads(line) for line in lines if not line.endswith('"quest')]
+    assert len(rows) == 12
+    assert [row["doc_id"] for row in rows].count("doc3") == 2
+
+    # Articles that only produced rejects are retried
+    client = FakeClient()
+    stats = synthesise_qa_pairs(articles, client, "gpt", **paths)
+    assert stats["skipped"] == 6
+    assert client.articles == ["bad article"]
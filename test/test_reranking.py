@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from rag.reranking import CrossEncoderReranker, get_reranked_context
+
+
+class WordOverlapModel:
+    """Scores a pair by the number of question words in the passage."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs):
+        self.calls.append(len(pairs))
+        return np.array(
+            [
+                len(set(question.split()) & set(passage.split()))
+                for question, passage in pairs
+            ],
+            dtype=np.float32,
+        )
+
+
+class FakeIndex:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def query(self, query_texts, n_results):
+        return {"documents": [self.documents[:n_results]]}
+
+
+@pytest.fixture
+def setup_data():
+    passages = [
+        "unrelated text about weather",
+        "aspirin lowers fever",
+        "aspirin lowers fever in children quickly",
+        "fever is common",
+    ] + [f"filler passage {i}" for i in range(16)]
+    return passages, CrossEncoderReranker(model=WordOverlapModel(), max_batch_size=8)
+
+
+def test_rerank_orders_and_caches(setup_data):
+    passages, reranker = setup_data
+    question = "does aspirin lower fever in children"
+    top = reranker.rerank(question, passages, top_n=3)
+    assert [passage for passage, _ in top] == [passages[2], passages[1], passages[3]]
+    assert reranker.model.calls and max(reranker.model.calls) <= 8
+
+    calls = len(reranker.model.calls)
+    reranker.rerank(question, passages, top_n=3)
+    assert len(reranker.model.calls) == calls
+    assert reranker.stats["hits"] == len(passages)
+
+    reranker.cache_size = 5
+    reranker.rerank("another question", passages)
+    assert len(reranker._cache) == 5
+
+
+def test_get_reranked_context(setup_data):
+    passages, reranker = setup_data
+    index = FakeIndex(passages)
+    context = get_reranked_context(
+        "aspirin fever children", index, reranker, candidates=10, top_n=2
+    )
+    assert context == [passages[2], passages[1]]
+
+    many = reranker.rerank_many(
+        ["aspirin fever children", "weather"], [passages[:4], passages[:4]], top_n=1
+    )
+    assert many == [[passages[2]], [passages[0]]]
@@ -0,0 +1,98 @@
+import pytest
+import helper.resources as resources
+import rag.retrieval as retrieval
+from helper.resources import (
+    check_offline_resources,
+    ensure_nltk_resources,
+    missing_nltk_resources,
+    offline_mode,
+)
+
+
+@pytest.fixture
+def setup_data(monkeypatch):
+    import nltk
+
+    installed = set()
+    downloads = []
+
+    def find(path):
+        if path not in installed:
+            raise LookupError(path)
+
+    def download(name, quiet=False):
+        downloads.append(name)
+        installed.add(resources.NLTK_RESOURCES[name])
+
+    monkeypatch.setattr(nltk.data, "find", find)
+    monkeypatch.setattr(nltk, "download", download)
+    ensure_nltk_resources.cache_clear()
+    yield installed, downloads
+    ensure_nltk_resources.cache_clear()
+
+
+def test_offline_mode(monkeypatch):
+    monkeypatch.delenv("OFFLINE_MODE", raising=False)
+    assert not offline_mode()
+    for value in ("1", "true", "YES"):
+        monkeypatch.setenv("OFFLINE_MODE", value)
+        assert offline_mode()
+
+
+def test_ensure_nltk_resources_downloads_once(setup_data, monkeypatch):
+    installed, downloads = setup_data
+    monkeypatch.setenv("OFFLINE_MODE", "FALSE")
+    assert missing_nltk_resources() == ["punkt", "stopwords"]
+
+    ensure_nltk_resources("punkt")
+    ensure_nltk_resources("punkt")
+    assert downloads == ["punkt"]
+    assert missing_nltk_resources() == ["stopwords"]
+
+
+def test_ensure_nltk_resources_offline(setup_data, monkeypatch):
+    installed, downloads = setup_data
+    monkeypatch.setenv("OFFLINE_MODE", "TRUE")
+    with pytest.raises(LookupError, match="punkt"):
+        ensure_nltk_resources("punkt")
+    assert downloads == []
+
+    installed.add(resources.NLTK_RESOURCES["punkt"])
+    ensure_nltk_resources.cache_clear()
+    ensure_nltk_resources("punkt")
+
+
+def test_check_offline_resources(setup_data, monkeypatch):
+    installed, _ = setup_data
+    for name in resources.REQUIRED_ENV_VARS:
+        monkeypatch.setenv(name, "set")
+    monkeypatch.delenv("OPENAI_API_VERSION")
+    report = check_offline_resources()
+    assert report == {
+        "nltk": ["punkt", "stopwords"],
+        "env": ["OPENAI_API_VERSION"],
+        "ok": False,
+    }
+
+    installed.update(resources.NLTK_RESOURCES.values())
+    monkeypatch.setenv("OPENAI_API_VERSION", "set")
+    assert check_offline_resources()["ok"]
+
+
+def test_retrieval_embedding_function_is_lazy(monkeypatch):
+    sentinel = object()
+    monkeypatch.setattr(retrieval, "get_openai_embedding_function", lambda: sentinel)
+    assert retrieval.openai_ef is sentinel
+    with pytest.raises(AttributeError):
+        retrieval.not_an_attribute
+
+
+def test_nltk_tokenizers_check_their_data(setup_data, monkeypatch):
+    from topic.processing import _calculate_topic_densities
+    from topic.vector_processing import split_and_reconstitute
+
+    monkeypatch.setenv("OFFLINE_MODE", "TRUE")
+    with pytest.raises(LookupError, match="python -m helper.resources"):
+        _calculate_topic_densities("some text", {"topic": ["text"]})
+    with pytest.raises(LookupError, match="python -m helper.resources"):
+        split_and_reconstitute(["some text"], 1, 2, 1)
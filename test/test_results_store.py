@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+import eval.results_store as results_store
+from eval.results_store import ResultsStore
+
+
+@pytest.fixture
+def setup_data(tmp_path):
+    rng = np.random.default_rng(0)
+    questions = [f"question {i}" for i in range(60)]
+    base = rng.uniform(0.3, 0.7, size=60)
+
+    def results(shift):
+        return pd.DataFrame(
+            {
+                "question": questions,
+                "answer": "an answer",
+                "faithfulness": np.clip(base + shift + rng.normal(0, 0.02, 60), 0, 1),
+                "answer_similarity": base + rng.normal(0, 0.02, 60),
+            }
+        )
+
+    store = ResultsStore(str(tmp_path / "results"))
+    baseline = store.append_run(results(0), {"chunk_size": 400}, "baseline")
+    better = store.append_run(results(0.2), {"chunk_size": 1500}, "recursive")
+    worse = results(-0.1)
+    worse.loc[:9, "faithfulness"] = np.nan
+    worse = store.append_run(worse, {"chunk_size": 100}, "small")
+    return store, baseline, better, worse
+
+
+def test_append_and_read_runs(setup_data):
+    store, baseline, better, worse = setup_data
+    runs = store.runs()
+    assert runs["run_name"].tolist() == ["baseline", "recursive", "small"]
+    assert runs["chunk_size"].tolist() == [400, 1500, 100]
+
+    scores = store.scores(run_ids=[better], metrics=["faithfulness"])
+    assert len(scores) == 60
+    assert set(scores["run_id"]) == {better}
+    assert store.score_matrix("answer_similarity").shape == (60, 3)
+
+
+def test_numeric_run_ids_are_read_as_strings(tmp_path, monkeypatch):
+    store = ResultsStore(str(tmp_path / "results"))
+    monkeypatch.setattr(
+        results_store.uuid, "uuid4", lambda: SimpleNamespace(hex="0000000000420000")
+    )
+    frame = pd.DataFrame({"question": ["question 0"], "faithfulness": [0.5]})
+    run_id = store.append_run(frame, run_name="numeric")
+    assert run_id == "000000000042"
+
+    assert store.runs()["run_id"].tolist() == [run_id]
+    assert store.scores(run_ids=[run_id])["run_id"].tolist() == [run_id]
+
+
+def test_compare_ranks_runs(setup_data):
+    store, baseline, better, worse = setup_data
+    comparison = store.compare(baseline, n_bootstrap=2000)
+    faithfulness = comparison[comparison["metric"] == "faithfulness"]
+    assert faithfulness["run_name"].tolist() == ["recursive", "small"]
+    assert faithfulness["n"].tolist() == [60, 50]
+    assert faithfulness["significant"].all()
+    assert (faithfulness["p_value"] < 0.001).all()
+
+    top = faithfulness.iloc[0]
+    assert top["ci_low"] < top["difference"] < top["ci_high"]
+    assert top["difference"] == pytest.approx(0.2, abs=0.02)
+
+    similarity = comparison[comparison["metric"] == "answer_similarity"]
+    assert not similarity["significant"].any()
+
+
+def test_bootstrap_in_chunks(setup_data, monkeypatch):
+    store, baseline, better, worse = setup_data
+    whole = store.compare(baseline, n_bootstrap=500, seed=3)
+    monkeypatch.setattr(results_store, "BOOTSTRAP_CHUNK_SIZE", 60 * 7)
+    chunked = store.compare(baseline, n_bootstrap=500, seed=3)
+    pd.testing.assert_frame_equal(whole, chunked)
+
+
+def test_duplicate_questions_are_rejected(setup_data):
+    store, baseline, better, worse = setup_data
+    results = pd.DataFrame(
+        {"question": ["q1", "q2", "q1"], "faithfulness": [0.1, 0.2, 0.3]}
+    )
+    with pytest.raises(ValueError, match="q1"):
+        store.append_run(results)
+
+    # Runs stored before duplicates were rejected
+    scores = store.scores(run_ids=[better], metrics=["faithfulness"])
+    scores.iloc[:1].drop(columns="run_id").to_parquet(
+        f"{store.scores_path}/run_id={better}/part-1.parquet", index=False
+    )
+    with pytest.raises(ValueError, match="more than one score"):
+        store.score_matrix("faithfulness")
+    with pytest.raises(ValueError, match="more than one score"):
+        store.compare(baseline, n_bootstrap=10)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import numpy as np
+import pytest
+from rag.server import RetrievalServer
+
+
+class BatchIndex:
+    """Answers each query with the query's own number, recording batch sizes."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def query(self, query_embeddings, n_results):
+        self.batch_sizes.append(len(query_embeddings))
+        rows = [
+            [f"{int(e[0])}-{rank}" for rank in range(n_results)]
+            for e in query_embeddings
+        ]
+        return {
+            "ids": rows,
+            "documents": rows,
+            "metadatas": [[{}] * n_results for _ in rows],
+            "distances": [list(range(n_results)) for _ in rows],
+        }
+
+
+def embed(questions):
+    return np.array([[float(question)] for question in questions])
+
+
+async def request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+@pytest.fixture
+def setup_data():
+    index = BatchIndex()
+    return index, RetrievalServer(index, embed, port=0, batch_window=0.05)
+
+
+def test_server_batches_concurrent_queries(setup_data):
+    index, server = setup_data
+
+    async def scenario():
+        await server.start()
+        try:
+            responses = await asyncio.gather(
+                *[
+                    request(
+                        server.port,
+                        "POST",
+                        "/query",
+                        {"question": str(i), "top_k": 1 + i % 3},
+                    )
+                    for i in range(20)
+                ]
+            )
+            health = await request(server.port, "GET", "/health")
+            stats = await request(server.port, "GET", "/stats")
+            bad = await request(server.port, "POST", "/query", {"top_k": 2})
+            missing = await request(server.port, "GET", "/nope")
+        finally:
+            await server.stop()
+        return responses, health, stats, bad, missing
+
+    responses, health, stats, bad, missing = asyncio.run(scenario())
+    for i, (status, body) in enumerate(responses):
+        assert status == 200
+        assert body["ids"] == [f"{i}-{rank}" for rank in range(1 + i % 3)]
+    assert sum(index.batch_sizes) == 20
+    assert len(index.batch_sizes) < 20
+    assert health == (200, {"status": "ok"})
+    assert stats[1]["requests"] == 20
+    assert stats[1]["mean_batch_size"] > 1
+    assert bad[0] == 400
+    assert missing[0] == 404
+
+
+class FlakyIndex(BatchIndex):
+    """Returns results without distances for its first batch."""
+
+    def query(self, query_embeddings, n_results):
+        results = super().query(query_embeddings, n_results)
+        if len(self.batch_sizes) == 1:
+            del results["distances"]
+        return results
+
+
+def test_server_fails_bad_batches_and_stops_cleanly():
+    index = FlakyIndex()
+    server = RetrievalServer(index, embed, port=0, batch_window=0.05)
+
+    async def scenario():
+        await server.start()
+        try:
+            failed = await asyncio.gather(
+                *[
+                    request(server.port, "POST", "/query", {"question": str(i)})
+                    for i in range(3)
+                ]
+            )
+            recovered = await request(
+                server.port, "POST", "/query", {"question": "7", "top_k": 1}
+            )
+        finally:
+            await server.stop()
+        return failed, recovered
+
+    failed, recovered = asyncio.run(scenario())
+    assert len(index.batch_sizes) >= 2
+    first_batch = index.batch_sizes[0]
+    errors = [body["error"] for status, body in failed if status == 500]
+    assert len(errors) == first_batch
+    assert all("distances" in error for error in errors)
+    assert recovered == (
+        200,
+        {"contexts": ["7-0"], "ids": ["7-0"], "metadatas": [{}], "distances": [0]},
+    )
+    assert server._batcher.cancelled()
+    assert server.stats()["errors"] == first_batch
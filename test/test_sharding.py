@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from rag.retrieval import add_documents
+from rag.sharding import ShardedIndex, shard_for
+
+
+class InMemoryCollection:
+    """A brute-force stand-in for a Chroma collection."""
+
+    def __init__(self):
+        self.ids, self.embeddings, self.metadatas, self.documents = [], [], [], []
+
+    def count(self):
+        return len(self.ids)
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self.ids += ids
+        self.embeddings += list(embeddings)
+        self.metadatas += metadatas
+        self.documents += documents
+
+    def query(self, query_texts, query_embeddings, n_results, where, include):
+        distances = np.linalg.norm(
+            np.asarray(query_embeddings)[:, None] - np.asarray(self.embeddings), axis=2
+        )
+        order = np.argsort(distances, axis=1)[:, :n_results]
+        fields = {"ids": self.ids, "metadatas": self.metadatas}
+        fields["documents"] = self.documents
+        result = {
+            field: [[values[i] for i in row] for row in order]
+            for field, values in fields.items()
+        }
+        result["distances"] = np.take_along_axis(distances, order, axis=1).tolist()
+        return result
+
+
+@pytest.fixture
+def setup_data():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(200, 8))
+    doc_ids = [f"doc{i // 4}" for i in range(200)]
+    chunk_ids = [f"chunk{i}" for i in range(200)]
+    chunks = [f"text {i}" for i in range(200)]
+    return embeddings, doc_ids, chunk_ids, chunks
+
+
+def test_shard_for_is_stable():
+    assert shard_for("doc1", 8) == shard_for("doc1", 8)
+    assert {shard_for(f"doc{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_sharded_query_matches_single_index(setup_data):
+    embeddings, doc_ids, chunk_ids, chunks = setup_data
+    single = InMemoryCollection()
+    sharded = ShardedIndex([InMemoryCollection() for _ in range(4)], "test")
+    for index in (single, sharded):
+        add_documents(index, chunks, chunk_ids, doc_ids, embeddings=embeddings)
+
+    assert sharded.count() == 200
+    for number, shard in enumerate(sharded.shards):
+        assert {shard_for(m["doc_id"], 4) for m in shard.metadatas} == {number}
+
+    queries = embeddings[:3] + 0.1
+    expected = single.query(None, queries, 5, None, None)
+    result = sharded.query(query_embeddings=queries, n_results=5)
+    assert result["ids"] == expected["ids"]
+    assert result["documents"] == expected["documents"]
+    assert np.allclose(result["distances"], expected["distances"])
+    sharded.close()
+
+
+def test_sharded_index_closes_its_threads(setup_data):
+    embeddings, doc_ids, chunk_ids, chunks = setup_data
+    with ShardedIndex([InMemoryCollection() for _ in range(2)], "test") as index:
+        add_documents(index, chunks, chunk_ids, doc_ids, embeddings=embeddings)
+        assert index.count() == 200
+    with pytest.raises(RuntimeError):
+        index.count()
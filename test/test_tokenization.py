@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from nltk.tokenize import TreebankWordTokenizer
+from helper.tokenization import (
+    sentence_spans,
+    sentences,
+    whitespace_spans,
+    word_spans,
+    words,
+)
+from rag.chunking import chunk_sentences
+
+
+@pytest.fixture
+def setup_data():
+    prose = "This is a sentence about sample text. Isn't it a test? It is!"
+    pubmed = (
+        "the participants were 5,984 male employees ( see fig . 1 ) .\n"
+        "smith et al . reported a 85% increase vs . controls , e.g. in 11.1 mmol / l .\n"
+        "among these men ,\n335 were excluded ( no . 2 ) ."
+    )
+    return prose, pubmed
+
+
+def test_sentences_prose(setup_data):
+    prose, _ = setup_data
+    assert sentences(prose) == [
+        "This is a sentence about sample text.",
+        "Isn't it a test?",
+        "It is!",
+    ]
+
+
+def test_sentences_pubmed_abbreviations(setup_data):
+    _, pubmed = setup_data
+    result = sentences(pubmed)
+    assert len(result) == 3
+    assert result[0].endswith("( see fig . 1 ) .")
+    assert result[1].startswith("smith et al . reported")
+    assert result[2].startswith("among these men ,\n335")
+
+
+def test_sentences_blank_line():
+    assert sentences("first para\n\nsecond para") == ["first para", "second para"]
+
+
+def test_words_match_treebank(setup_data):
+    prose, pubmed = setup_data
+    treebank = TreebankWordTokenizer()
+    for sentence in sentences(prose) + sentences(pubmed):
+        assert words(sentence) == treebank.tokenize(sentence)
+
+
+def test_spans_are_offsets(setup_data):
+    _, pubmed = setup_data
+    for spans in (sentence_spans(pubmed), word_spans(pubmed)):
+        assert spans.dtype == np.int64
+        assert spans.shape[1] == 2
+        assert np.all(spans[:, 1] > spans[:, 0])
+        assert np.all(spans[1:, 0] >= spans[:-1, 1])
+
+
+def test_whitespace_spans_match_split(setup_data):
+    _, pubmed = setup_data
+    spans = whitespace_spans(pubmed)
+    assert [pubmed[start:end] for start, end in spans] == pubmed.split()
+
+
+def test_chunk_sentences():
+    text = "a b c. d e. f g h i. j. k l m n o p q r s."
+    assert chunk_sentences(text, 5) == [
+        "a b c. d e.",
+        "f g h i. j.",
+        "k l m n o p q r s.",
+    ]
+    assert chunk_sentences("a. b. c. d.", 2, overlap=1) == ["a. b.", "b. c.", "c. d."]